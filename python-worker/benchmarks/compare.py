@@ -0,0 +1,85 @@
+# compare.py
+"""
+Compare two endpoints.py result files, scenario by scenario.
+
+    python benchmarks/compare.py before.json after.json
+    python benchmarks/compare.py before.json after.json --json > diff.json
+
+Changes are after relative to before; for latency, tokens, calls and memory
+lower is better, for throughput higher is.
+"""
+import argparse
+import json
+from typing import Dict, Optional, Tuple
+
+parser = argparse.ArgumentParser()
+parser.add_argument("before")
+parser.add_argument("after")
+parser.add_argument("--json", action="store_true", help="print the comparison as JSON")
+args = parser.parse_args()
+
+# (label, path into a result)
+FIELDS = [
+    ("p50_ms", ("latency_ms", "p50")),
+    ("p95_ms", ("latency_ms", "p95")),
+    ("p99_ms", ("latency_ms", "p99")),
+    ("first_event_p50_ms", ("first_event_ms", "p50")),
+    ("throughput_rps", ("throughput_rps",)),
+    ("prompt_tokens", ("tokens_per_request", "prompt")),
+    ("completion_tokens", ("tokens_per_request", "completion")),
+    ("model_calls", ("model_calls_per_request",)),
+    ("github_calls", ("github_calls_per_request",)),
+    ("github_bytes", ("github_bytes_per_request",)),
+    ("peak_rss_mb", ("rss_mb", "peak")),
+]
+
+
+def load(path: str) -> Dict[Tuple[str, int], dict]:
+    with open(path) as f:
+        report = json.load(f)
+    return {(result["scenario"], result["concurrency"]): result for result in report["results"]}
+
+
+def lookup(result: dict, path: Tuple[str, ...]) -> Optional[float]:
+    value = result
+    for key in path:
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    if before is None or after is None or before == 0:
+        return None
+    return round((after - before) / before * 100, 1)
+
+
+def main():
+    before, after = load(args.before), load(args.after)
+    rows = []
+    for key in [key for key in before if key in after]:
+        row = {"scenario": key[0], "concurrency": key[1]}
+        for label, path in FIELDS:
+            old, new = lookup(before[key], path), lookup(after[key], path)
+            row[label] = {"before": old, "after": new, "change_pct": change(old, new)}
+        rows.append(row)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    shown = ["p50_ms", "p95_ms", "p99_ms", "throughput_rps", "prompt_tokens", "github_calls", "peak_rss_mb"]
+    print(f"{'scenario':<20} {'c':>3}  " + "  ".join(f"{label:>16}" for label in shown))
+    for row in rows:
+        cells = []
+        for label in shown:
+            value = row[label]
+            pct = f"{value['change_pct']:+.1f}%" if value["change_pct"] is not None else "-"
+            cells.append(f"{value['after'] if value['after'] is not None else '-':>8} {pct:>7}")
+        print(f"{row['scenario']:<20} {row['concurrency']:>3}  " + "  ".join(cells))
+    missing = sorted(set(before) ^ set(after))
+    if missing:
+        print("only in one run: " + ", ".join(f"{name}@c={c}" for name, c in missing))
+
+
+if __name__ == "__main__":
+    main()
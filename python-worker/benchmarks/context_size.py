@@ -0,0 +1,79 @@
+# context_size.py
+"""
+README prompt size before and after context compaction, for a local checkout.
+
+    python benchmarks/context_size.py /path/to/repo
+
+"before" rebuilds the old prompt inputs (full root file list, raw user input
+dict and the first 800 characters of up to 8 root source files). "same files"
+compacts exactly those files; "ranked tree" is what the worker now sends,
+picked from the whole tree.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from llm.tokens import count_tokens  # noqa: E402
+from readme.context_compactor import (  # noqa: E402
+    CONTEXT_MAX_FILES,
+    README_CONTEXT_TOKENS,
+    compact_sources,
+    format_file_listing,
+    format_sources,
+    format_user_input,
+    rank_files,
+)
+
+OLD_EXTENSIONS = ['.py', '.js', '.ts', '.java', '.cpp', '.c', '.go', '.rs', '.php', '.rb', '.json', '.yaml', '.yml']
+
+parser = argparse.ArgumentParser()
+parser.add_argument("repo", nargs="?", default=os.path.join(os.path.dirname(__file__), ".."))
+args = parser.parse_args()
+
+
+def read(path: str) -> str:
+    with open(os.path.join(args.repo, path), "rb") as f:
+        data = f.read()
+    if data.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return data.decode("utf-16")
+    return data.decode("utf-8", errors="replace")
+
+
+def walk(root: str):
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "node_modules"]
+        for name in filenames:
+            yield os.path.relpath(os.path.join(directory, name), root).replace(os.sep, "/")
+
+
+def main():
+    tree = list(walk(args.repo))
+    root_files = [path for path in tree if "/" not in path]
+    user_input = {"description": "", "features": "Fast, small"}
+
+    old_snippets = {}
+    for path in [f for f in root_files if any(f.endswith(ext) for ext in OLD_EXTENSIONS)][:8]:
+        content = read(path)
+        if content.strip() and not content.strip().startswith("#"):
+            old_snippets[path] = content[:800]
+    before = f"{root_files}\n{user_input}\n{old_snippets}"
+
+    def compacted_prompt(paths):
+        compacted = compact_sources({path: read(path) for path in paths}, README_CONTEXT_TOKENS)
+        text = f"{format_file_listing(root_files)}\n{format_user_input(user_input)}\n{format_sources(compacted)}"
+        return text, compacted
+
+    same, same_files = compacted_prompt(old_snippets)
+    ranked, ranked_files = compacted_prompt(rank_files(tree)[:CONTEXT_MAX_FILES])
+
+    print(f"before:      {count_tokens(before):6d} tokens, {len(old_snippets)} files (leading bytes)")
+    print(f"same files:  {count_tokens(same):6d} tokens, {len(same_files)} files (summaries)")
+    print(f"ranked tree: {count_tokens(ranked):6d} tokens, {len(ranked_files)} files (summaries, budget {README_CONTEXT_TOKENS})")
+    for path in ranked_files:
+        print(f"  {path}")
+
+
+if __name__ == "__main__":
+    main()
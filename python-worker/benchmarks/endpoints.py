@@ -0,0 +1,527 @@
+# endpoints.py
+"""
+Latency, throughput, memory and token use of each worker endpoint, offline.
+
+    python benchmarks/endpoints.py --output before.json
+    python benchmarks/endpoints.py --scenarios readme,readme_stream --concurrency 1,8,32 --requests 64
+    python benchmarks/endpoints.py --env README_GENERATION=sections --output sections.json
+    python benchmarks/compare.py before.json sections.json
+
+The worker runs as a uvicorn subprocess pointed (GITHUB_API_URL and
+OPENAI_BASE_URL) at fake_github.py and fake_openai.py, which run in this
+process and replay the recorded fixtures in benchmarks/fixtures with
+seeded latency and jitter. Each scenario is driven at every --concurrency
+level by that many clients issuing --requests requests in total.
+
+--cache cold (the default) gives every request a new HEAD commit and skips
+the response cache, so each one collects its repository and calls the
+model; --cache warm keeps HEAD fixed and lets caches and in-flight
+coalescing work. The worker's LLM_RPM / LLM_TPM pacing is off unless set
+with --env, since the fake model has no account limits. --worker-dir runs another checkout (e.g. a git worktree
+of an older commit) against the same fixtures.
+
+--workers N runs N uvicorn worker processes sharing state through a
+SQLite SHARED_STATE (and job store) in a fresh temporary directory;
+override SHARED_STATE with --env, e.g. against fake_redis.py. Memory is
+then summed over the processes, and stage times come from whichever
+worker answered /metrics.
+
+Per request it reports model tokens and calls (counted by the fake model
+server), GitHub calls and bytes, and mean time per pipeline stage when
+the worker serves /metrics; the worker's resident memory is sampled from
+/proc while each level runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+WORKER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, WORKER_DIR)
+
+SCENARIO_NAMES = [
+    "readme",
+    "readme_sections",
+    "readme_analysis",
+    "readme_stream",
+    "readme_batch",
+    "readme_job",
+    "repository_analysis",
+    "ideas",
+    "ideas_stream",
+    "stack",
+    "competitive",
+    "github_rate_limit",
+    "llm_scheduler",
+    "metrics",
+]
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--scenarios", default=",".join(SCENARIO_NAMES))
+parser.add_argument("--concurrency", default="1,4,16", help="comma-separated client counts")
+parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+parser.add_argument("--warmup", type=int, default=2, help="unmeasured requests before each scenario")
+parser.add_argument("--cache", choices=("cold", "warm"), default="cold")
+parser.add_argument("--github-delay", type=float, default=0.05)
+parser.add_argument("--github-jitter", type=float, default=0.02)
+parser.add_argument("--model-delay", type=float, default=0.5)
+parser.add_argument("--model-jitter", type=float, default=0.15)
+parser.add_argument("--seed", type=int, default=1)
+parser.add_argument("--env", action="append", default=[], help="KEY=VALUE for the worker, repeatable")
+parser.add_argument("--worker-dir", default=WORKER_DIR)
+parser.add_argument("--workers", type=int, default=1, help="worker processes")
+parser.add_argument("--port", type=int, default=8780, help="worker port; the fakes use the next two")
+parser.add_argument("--timeout", type=float, default=300)
+parser.add_argument("--label", default="")
+parser.add_argument("--output", help="write the results as JSON")
+args = parser.parse_args()
+
+GITHUB_PORT = args.port + 1
+OPENAI_PORT = args.port + 2
+
+# The fakes read their settings at import
+os.environ.update(
+    FAKE_GITHUB_DELAY=str(args.github_delay),
+    FAKE_GITHUB_JITTER=str(args.github_jitter),
+    FAKE_GITHUB_SEED=str(args.seed),
+    FAKE_GITHUB_UNIQUE_HEAD="1" if args.cache == "cold" else "0",
+    FAKE_OPENAI_DELAY=str(args.model_delay),
+    FAKE_OPENAI_JITTER=str(args.model_jitter),
+    FAKE_OPENAI_SEED=str(args.seed),
+)
+
+import httpx  # noqa: E402
+
+from benchmarks import fake_github, fake_openai  # noqa: E402
+from benchmarks.fake_openai import FakeServer  # noqa: E402
+
+API_KEY = "benchmark"
+HEADERS = {"X-API-Key": API_KEY, "X-User-Credits": "100000000"}
+USE_CACHE = args.cache == "warm"
+
+# (outcome, seconds to the first content event for streams); outcome is "ok" or an error
+Outcome = Tuple[str, Optional[float]]
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable[[httpx.AsyncClient, int], Awaitable[Outcome]]
+
+
+def repo_urls() -> List[str]:
+    return [f"https://github.com/{repo.owner}/{repo.repo}" for repo in fake_github.fixtures.values()]
+
+
+def readme_request(i: int, **fields) -> dict:
+    urls = repo_urls()
+    return {
+        "github_repo": urls[i % len(urls)],
+        "user_input": {"description": "", "features": "Fast, small"},
+        "shard_id": f"shard-{i}",
+        "metadata": {"user_id": "benchmark", "project_name": "benchmark"},
+        **fields,
+    }
+
+
+def status_outcome(res: httpx.Response) -> str:
+    return "ok" if res.status_code < 400 else str(res.status_code)
+
+
+def get(path: str):
+    async def run(client: httpx.AsyncClient, i: int) -> Outcome:
+        return status_outcome(await client.get(path)), None
+    return run
+
+
+def posting(path: str, body: Callable[[int], dict]):
+    async def run(client: httpx.AsyncClient, i: int) -> Outcome:
+        return status_outcome(await client.post(path, json=body(i))), None
+    return run
+
+
+async def read_events(res: httpx.Response, start: float, done_event: str = "done") -> Outcome:
+    """Read a server-sent event stream to the end; the first event other than stage/status counts as content"""
+    if res.status_code >= 400:
+        await res.aread()
+        return str(res.status_code), None
+    first, outcome, event = None, "incomplete", None
+    async for line in res.aiter_lines():
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+            if first is None and event not in ("stage", "status"):
+                first = time.perf_counter() - start
+            if event == "error":
+                outcome = "stream_error"
+        elif line.startswith("data: ") and event == done_event and outcome != "stream_error":
+            data = json.loads(line[len("data: "):])
+            outcome = "failed" if data.get("status") == "failed" else "ok"
+    return outcome, first
+
+
+def streaming(path: str, body: Callable[[int], dict]):
+    async def run(client: httpx.AsyncClient, i: int) -> Outcome:
+        start = time.perf_counter()
+        async with client.stream("POST", path, json=body(i)) as res:
+            return await read_events(res, start)
+    return run
+
+
+async def readme_batch(client: httpx.AsyncClient, i: int) -> Outcome:
+    start = time.perf_counter()
+    requests = [readme_request(i * 100 + n) for n in range(len(repo_urls()))]
+    async with client.stream("POST", "/readme-builder/batch", json={"requests": requests}) as res:
+        if res.status_code >= 400:
+            await res.aread()
+            return str(res.status_code), None
+        first, outcome = None, "incomplete"
+        async for line in res.aiter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("summary"):
+                outcome = "ok" if not data["failed"] else "repo_failed"
+            elif first is None:
+                first = time.perf_counter() - start
+    return outcome, first
+
+
+async def readme_job(client: httpx.AsyncClient, i: int) -> Outcome:
+    """Submit, follow the job's events until done, then fetch the result"""
+    start = time.perf_counter()
+    res = await client.post("/jobs/readme-builder", json=readme_request(i))
+    if res.status_code >= 400:
+        return str(res.status_code), None
+    job_id = res.json()["job_id"]
+    async with client.stream("GET", f"/jobs/{job_id}/events") as events:
+        outcome, _ = await read_events(events, start)
+    if outcome != "ok":
+        return outcome, None
+    return status_outcome(await client.get(f"/jobs/{job_id}/result")), None
+
+
+def idea_request(i: int) -> dict:
+    return {"topic": "developer tools", "skills": "python, react", "complexity": "intermediate", "use_cache": USE_CACHE}
+
+
+SCENARIOS = {
+    "readme": Scenario("readme", posting("/readme-builder", readme_request)),
+    "readme_sections": Scenario("readme_sections", posting("/readme-builder", lambda i: readme_request(i, readme_mode="sections"))),
+    "readme_analysis": Scenario("readme_analysis", posting("/readme-builder", lambda i: readme_request(i, include_analysis=True))),
+    "readme_stream": Scenario("readme_stream", streaming("/readme-builder/stream", readme_request)),
+    "readme_batch": Scenario("readme_batch", readme_batch),
+    "readme_job": Scenario("readme_job", readme_job),
+    "repository_analysis": Scenario("repository_analysis", posting("/repository-analysis", readme_request)),
+    "ideas": Scenario("ideas", posting("/idea-generator", idea_request)),
+    "ideas_stream": Scenario("ideas_stream", streaming("/idea-generator/stream", idea_request)),
+    "stack": Scenario("stack", posting("/stack-generator", lambda i: {
+        "project_type": "web application",
+        "requirements": "user accounts, realtime updates",
+        "preferences": "python backend",
+        "use_cache": USE_CACHE,
+    })),
+    "competitive": Scenario("competitive", posting("/competitive-analysis", lambda i: {
+        "project_description": "A platform for showcasing GitHub projects with AI-written READMEs",
+        "use_cache": USE_CACHE,
+    })),
+    "github_rate_limit": Scenario("github_rate_limit", get("/github/rate-limit")),
+    "llm_scheduler": Scenario("llm_scheduler", get("/llm/scheduler")),
+    "metrics": Scenario("metrics", get("/metrics")),
+}
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear interpolation between closest ranks, q in [0, 100]"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize_ms(seconds: List[float]) -> Optional[Dict[str, float]]:
+    if not seconds:
+        return None
+    ms = [s * 1000 for s in seconds]
+    return {
+        "mean": round(sum(ms) / len(ms), 2),
+        "p50": round(percentile(ms, 50), 2),
+        "p95": round(percentile(ms, 95), 2),
+        "p99": round(percentile(ms, 99), 2),
+        "max": round(max(ms), 2),
+    }
+
+
+def process_tree(pid: int) -> List[int]:
+    """The process and its descendants, from /proc"""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            for child in f.read().split():
+                pids += process_tree(int(child))
+    except OSError:
+        pass
+    return pids
+
+
+def rss_mb(pid: int, field: str = "VmRSS") -> Optional[float]:
+    """Resident (or, with VmHWM, peak) memory of a process and its children from /proc; None elsewhere"""
+    total = None
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith(field + ":"):
+                        total = (total or 0) + int(line.split()[1])
+        except OSError:
+            pass
+    return round(total / 1024, 1) if total is not None else None
+
+
+def parse_metrics(text: str) -> Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]:
+    """Prometheus text format into {(name, sorted label pairs): value}"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, _, value = line.rpartition(" ")
+        name, _, labels = series.partition("{")
+        pairs = []
+        for pair in labels.rstrip("}").split('",') if labels else []:
+            key, _, raw = pair.partition("=")
+            pairs.append((key, raw.strip('"')))
+        samples[(name, tuple(sorted(pairs)))] = float(value)
+    return samples
+
+
+async def scrape(client: httpx.AsyncClient) -> Optional[dict]:
+    res = await client.get("/metrics")
+    return parse_metrics(res.text) if res.status_code == 200 else None
+
+
+def stage_means(before: Optional[dict], after: Optional[dict]) -> Optional[Dict[str, float]]:
+    """Mean milliseconds per pipeline stage between two scrapes"""
+    if before is None or after is None:
+        return None
+    totals: Dict[str, List[float]] = {}
+    for (name, labels), value in after.items():
+        if name not in ("worker_stage_duration_seconds_sum", "worker_stage_duration_seconds_count"):
+            continue
+        stage = dict(labels).get("stage", "")
+        delta = value - before.get((name, labels), 0)
+        index = 0 if name.endswith("_sum") else 1
+        totals.setdefault(stage, [0.0, 0.0])[index] += delta
+    return {stage: round(total / count * 1000, 2) for stage, (total, count) in sorted(totals.items()) if count}
+
+
+def fake_counters() -> Dict[str, float]:
+    return {
+        "model_calls": fake_openai.fake_stats["calls"],
+        "prompt_tokens": fake_openai.fake_stats["prompt_tokens"],
+        "completion_tokens": fake_openai.fake_stats["completion_tokens"],
+        "github_calls": fake_github.fake_stats["requests"],
+        "github_not_modified": fake_github.fake_stats["not_modified"],
+        "github_bytes": fake_github.fake_stats["bytes"],
+    }
+
+
+async def sample_memory(pid: int, samples: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        value = rss_mb(pid)
+        if value is not None:
+            samples.append(value)
+        try:
+            await asyncio.wait_for(stop.wait(), 0.05)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_level(client: httpx.AsyncClient, scenario: Scenario, concurrency: int, pid: int) -> dict:
+    counters_before = fake_counters()
+    metrics_before = await scrape(client)
+    latencies: List[float] = []
+    first_events: List[float] = []
+    outcomes: Dict[str, int] = {}
+    next_index = iter(range(args.requests))
+
+    async def client_loop():
+        for i in next_index:
+            start = time.perf_counter()
+            try:
+                outcome, first = await scenario.run(client, i)
+            except httpx.HTTPError as e:
+                outcome, first = type(e).__name__, None
+            latencies.append(time.perf_counter() - start)
+            if first is not None:
+                first_events.append(first)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    memory: List[float] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_memory(pid, memory, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    stop.set()
+    await sampler
+
+    counters_after = fake_counters()
+    delta = {key: counters_after[key] - counters_before[key] for key in counters_after}
+    per_request = lambda key: round(delta[key] / args.requests, 2)  # noqa: E731
+    return {
+        "scenario": scenario.name,
+        "concurrency": concurrency,
+        "requests": args.requests,
+        "ok": outcomes.get("ok", 0),
+        "errors": {key: count for key, count in outcomes.items() if key != "ok"},
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(args.requests / wall, 2),
+        "latency_ms": summarize_ms(latencies),
+        "first_event_ms": summarize_ms(first_events),
+        "tokens_per_request": {"prompt": per_request("prompt_tokens"), "completion": per_request("completion_tokens")},
+        "model_calls_per_request": per_request("model_calls"),
+        "github_calls_per_request": per_request("github_calls"),
+        "github_not_modified_per_request": per_request("github_not_modified"),
+        "github_bytes_per_request": per_request("github_bytes"),
+        "stages_ms": stage_means(metrics_before, await scrape(client)),
+        "rss_mb": {
+            "start": memory[0] if memory else None,
+            "peak": max(memory) if memory else None,
+            "end": memory[-1] if memory else None,
+        },
+    }
+
+
+def start_worker(state_dir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "WORKER_API_KEY": API_KEY,
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{OPENAI_PORT}/v1",
+        "GITHUB_API_URL": f"http://127.0.0.1:{GITHUB_PORT}",
+        "GITHUB_TOKEN": "benchmark",
+        "LOG_LEVEL": "WARNING",
+        # The fake model has no account limits; pacing to the real ones would
+        # make every scenario after the first wait on the token budget
+        "LLM_RPM": "0",
+        "LLM_TPM": "0",
+    }
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"]
+    if args.workers > 1:
+        command += ["--workers", str(args.workers)]
+        env.update({
+            "WEB_CONCURRENCY": str(args.workers),
+            "SHARED_STATE": "sqlite",
+            "SHARED_STATE_PATH": os.path.join(state_dir, "shared_state.sqlite3"),
+            "JOB_STORE": "sqlite",
+            "JOB_STORE_PATH": os.path.join(state_dir, "jobs.sqlite3"),
+        })
+    for pair in args.env:
+        key, _, value = pair.partition("=")
+        env[key] = value
+    return subprocess.Popen(
+        command,
+        cwd=args.worker_dir,
+        env=env,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, worker: subprocess.Popen) -> None:
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if worker.poll() is not None:
+            raise SystemExit(f"worker exited with {worker.returncode}")
+        try:
+            if (await client.get("/openapi.json")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise SystemExit("worker did not start within 60s")
+
+
+def git_commit(directory: str) -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "-C", directory, "rev-parse", "HEAD"], capture_output=True, check=True, text=True)
+        dirty = subprocess.run(["git", "-C", directory, "status", "--porcelain", "--", "."], capture_output=True, text=True).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_row(result: dict) -> None:
+    latency = result["latency_ms"] or {}
+    errors = sum(result["errors"].values())
+    print(
+        f"{result['scenario']:<20} c={result['concurrency']:<3d} "
+        f"p50 {latency.get('p50', 0):9.1f}  p95 {latency.get('p95', 0):9.1f}  p99 {latency.get('p99', 0):9.1f} ms  "
+        f"{result['throughput_rps']:7.2f} req/s  "
+        f"tokens {result['tokens_per_request']['prompt']:7.0f}+{result['tokens_per_request']['completion']:<5.0f} "
+        f"gh {result['github_calls_per_request']:5.1f}  "
+        f"rss {result['rss_mb']['peak'] or 0:6.1f} MB"
+        + (f"  errors {errors}" if errors else ""),
+        flush=True,
+    )
+
+
+async def main():
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIO_NAMES)})")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    state_dir = tempfile.mkdtemp(prefix="endpoints-state-")
+    worker = start_worker(state_dir)
+    results = []
+    try:
+        limits = httpx.Limits(max_connections=max(levels) * 2, max_keepalive_connections=max(levels) * 2)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", headers=HEADERS, timeout=args.timeout, limits=limits) as client:
+            await wait_ready(client, worker)
+            for name in names:
+                scenario = SCENARIOS[name]
+                for i in range(args.warmup):
+                    await scenario.run(client, args.requests + i)
+                for concurrency in levels:
+                    result = await run_level(client, scenario, concurrency, worker.pid)
+                    results.append(result)
+                    print_row(result)
+        peak = rss_mb(worker.pid, "VmHWM")
+    finally:
+        worker.terminate()
+        worker.wait()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "label": args.label,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_commit": git_commit(args.worker_dir),
+            "worker_dir": os.path.abspath(args.worker_dir),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+            "fixtures": sorted(fake_github.fixtures),
+            "worker_peak_rss_mb": peak,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    with FakeServer(fake_github.fake_app, port=GITHUB_PORT), FakeServer(fake_openai.fake_app, port=OPENAI_PORT):
+        asyncio.run(main())
@@ -0,0 +1,229 @@
+# fake_github.py
+"""
+GitHub REST API stand-in serving recorded repositories (see record_fixture.py).
+
+Covers the calls the worker makes: repository metadata, commits/HEAD, the
+recursive tree, raw blobs and contents, and tarballs. Responses carry ETags
+(with 304s for If-None-Match) and X-RateLimit-* headers like the real API.
+Point the worker at it with GITHUB_API_URL.
+"""
+import asyncio
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import random
+import tarfile
+import time
+import uuid
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "github")
+
+FAKE_GITHUB_FIXTURES = os.getenv("FAKE_GITHUB_FIXTURES", FIXTURES_DIR)
+# Per-response latency: a normal draw around DELAY with JITTER standard deviation
+FAKE_GITHUB_DELAY = float(os.getenv("FAKE_GITHUB_DELAY", "0.05"))
+FAKE_GITHUB_JITTER = float(os.getenv("FAKE_GITHUB_JITTER", "0"))
+FAKE_GITHUB_SEED = int(os.getenv("FAKE_GITHUB_SEED", "0"))
+# Answer commits/HEAD with a new SHA every time, so no request reuses
+# another's cached or in-flight repository context
+FAKE_GITHUB_UNIQUE_HEAD = os.getenv("FAKE_GITHUB_UNIQUE_HEAD", "0").lower() in ("1", "true", "yes")
+
+RAW_ACCEPT = "application/vnd.github.raw"
+
+# Counters the benchmarks read back
+fake_stats = {"requests": 0, "not_modified": 0, "bytes": 0}
+
+fake_app = FastAPI()
+
+_random = random.Random(FAKE_GITHUB_SEED)
+
+
+def git_blob_sha(data: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class FixtureRepo:
+    """One recorded repository: metadata, HEAD, tree entries and file bodies"""
+
+    def __init__(self, data: dict):
+        self.owner = data["owner"]
+        self.repo = data["repo"]
+        self.metadata = data["metadata"]
+        self.head_sha = data["head_sha"]
+        self.tree_sha = data.get("tree_sha") or hashlib.sha1(self.head_sha.encode()).hexdigest()
+        self.tree = data["tree"]
+        self.files: Dict[str, bytes] = {path: text.encode("utf-8") for path, text in data["files"].items()}
+        self.blobs: Dict[str, bytes] = {entry["sha"]: self.files[entry["path"]] for entry in self.tree if entry["path"] in self.files}
+        self._tarball: Optional[bytes] = None
+
+    def tarball(self) -> bytes:
+        """gzip'd tar of the recorded files under GitHub's "<owner>-<repo>-<sha>/" prefix"""
+        if self._tarball is None:
+            prefix = f"{self.owner}-{self.repo}-{self.head_sha[:7]}"
+            buffer = io.BytesIO()
+            with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+                for path, data in self.files.items():
+                    info = tarfile.TarInfo(f"{prefix}/{path}")
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+            self._tarball = buffer.getvalue()
+        return self._tarball
+
+
+def load_fixtures(directory: str = FAKE_GITHUB_FIXTURES) -> Dict[str, FixtureRepo]:
+    """{"owner/repo": FixtureRepo} for every .json / .json.gz file in the directory"""
+    repos = {}
+    if not os.path.isdir(directory):
+        return repos
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith(".json.gz"):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        elif name.endswith(".json"):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        else:
+            continue
+        repo = FixtureRepo(data)
+        repos[f"{repo.owner}/{repo.repo}".lower()] = repo
+    return repos
+
+
+fixtures = load_fixtures()
+
+
+async def _latency() -> None:
+    delay = max(_random.gauss(FAKE_GITHUB_DELAY, FAKE_GITHUB_JITTER), 0) if FAKE_GITHUB_JITTER else FAKE_GITHUB_DELAY
+    if delay:
+        await asyncio.sleep(delay)
+
+
+def _headers(extra: Optional[dict] = None) -> dict:
+    headers = {
+        "X-RateLimit-Limit": "5000",
+        "X-RateLimit-Remaining": "4999",
+        "X-RateLimit-Reset": str(int(time.time()) + 3600),
+        "X-RateLimit-Resource": "core",
+    }
+    headers.update(extra or {})
+    return headers
+
+
+def _respond(request: Request, body: bytes, media_type: str) -> Response:
+    """Body with an ETag, or a 304 when the client already has it"""
+    fake_stats["requests"] += 1
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    if request.headers.get("If-None-Match") == etag:
+        fake_stats["not_modified"] += 1
+        return Response(status_code=304, headers=_headers({"ETag": etag}))
+    fake_stats["bytes"] += len(body)
+    return Response(body, media_type=media_type, headers=_headers({"ETag": etag}))
+
+
+def _json(request: Request, data) -> Response:
+    return _respond(request, json.dumps(data).encode(), "application/json")
+
+
+def _not_found() -> JSONResponse:
+    fake_stats["requests"] += 1
+    return JSONResponse(status_code=404, headers=_headers(), content={"message": "Not Found"})
+
+
+def _raw_or_json(request: Request, path: str, sha: str, data: bytes) -> Response:
+    if request.headers.get("Accept", "").startswith(RAW_ACCEPT):
+        return _respond(request, data, "application/octet-stream")
+    return _json(request, {
+        "name": path.rsplit("/", 1)[-1],
+        "path": path,
+        "sha": sha,
+        "size": len(data),
+        "type": "file",
+        "encoding": "base64",
+        "content": base64.b64encode(data).decode(),
+    })
+
+
+@fake_app.get("/rate_limit")
+async def rate_limit():
+    core = {"limit": 5000, "remaining": 4999, "reset": int(time.time()) + 3600, "used": 1}
+    return JSONResponse({"resources": {"core": core}, "rate": core}, headers=_headers())
+
+
+@fake_app.get("/repos/{owner}/{repo}")
+async def repository(owner: str, repo: str, request: Request):
+    await _latency()
+    fixture = fixtures.get(f"{owner}/{repo}".lower())
+    return _json(request, fixture.metadata) if fixture else _not_found()
+
+
+@fake_app.get("/repos/{owner}/{repo}/commits/{ref}")
+async def commit(owner: str, repo: str, ref: str, request: Request):
+    await _latency()
+    fixture = fixtures.get(f"{owner}/{repo}".lower())
+    if fixture is None:
+        return _not_found()
+    sha = hashlib.sha1(uuid.uuid4().bytes).hexdigest() if FAKE_GITHUB_UNIQUE_HEAD else fixture.head_sha
+    if request.headers.get("Accept") == "application/vnd.github.sha":
+        return _respond(request, sha.encode(), "application/vnd.github.sha")
+    return _json(request, {"sha": sha, "commit": {"tree": {"sha": fixture.tree_sha}}})
+
+
+@fake_app.get("/repos/{owner}/{repo}/git/trees/{ref}")
+async def tree(owner: str, repo: str, ref: str, request: Request):
+    await _latency()
+    fixture = fixtures.get(f"{owner}/{repo}".lower())
+    if fixture is None:
+        return _not_found()
+    entries = [
+        {"path": entry["path"], "mode": "100644", "type": "blob", "sha": entry["sha"], "size": entry["size"]}
+        for entry in fixture.tree
+    ]
+    return _json(request, {"sha": fixture.tree_sha, "tree": entries, "truncated": False})
+
+
+@fake_app.get("/repos/{owner}/{repo}/git/blobs/{sha}")
+async def blob(owner: str, repo: str, sha: str, request: Request):
+    await _latency()
+    fixture = fixtures.get(f"{owner}/{repo}".lower())
+    data = fixture.blobs.get(sha) if fixture else None
+    return _raw_or_json(request, sha, sha, data) if data is not None else _not_found()
+
+
+@fake_app.get("/repos/{owner}/{repo}/contents")
+async def root_contents(owner: str, repo: str, request: Request):
+    await _latency()
+    fixture = fixtures.get(f"{owner}/{repo}".lower())
+    if fixture is None:
+        return _not_found()
+    listing, dirs = [], set()
+    for entry in fixture.tree:
+        name, slash, _ = entry["path"].partition("/")
+        if slash:
+            if name not in dirs:
+                dirs.add(name)
+                listing.append({"name": name, "path": name, "type": "dir", "size": 0})
+        else:
+            listing.append({"name": name, "path": name, "type": "file", "size": entry["size"], "sha": entry["sha"]})
+    return _json(request, listing)
+
+
+@fake_app.get("/repos/{owner}/{repo}/contents/{path:path}")
+async def contents(owner: str, repo: str, path: str, request: Request):
+    await _latency()
+    fixture = fixtures.get(f"{owner}/{repo}".lower())
+    data = fixture.files.get(path) if fixture else None
+    return _raw_or_json(request, path, git_blob_sha(data), data) if data is not None else _not_found()
+
+
+@fake_app.get("/repos/{owner}/{repo}/tarball/{ref}")
+async def tarball(owner: str, repo: str, ref: str, request: Request):
+    await _latency()
+    fixture = fixtures.get(f"{owner}/{repo}".lower())
+    return _respond(request, fixture.tarball(), "application/x-gzip") if fixture else _not_found()
@@ -0,0 +1,166 @@
+# fake_openai.py
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from llm.tokens import count_message_tokens, count_tokens
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "openai.json")
+
+FAKE_DELAY = float(os.getenv("FAKE_OPENAI_DELAY", "0.5"))
+# Standard deviation of a normal draw around FAKE_DELAY for each response (0 = fixed)
+FAKE_JITTER = float(os.getenv("FAKE_OPENAI_JITTER", "0"))
+FAKE_SEED = int(os.getenv("FAKE_OPENAI_SEED", "0"))
+# Recorded completions, picked by a substring of the prompt (see fixtures/openai.json)
+FAKE_FIXTURES = os.getenv("FAKE_OPENAI_FIXTURES", FIXTURES_PATH)
+# Streamed responses are split into this many chunks spread over FAKE_DELAY
+FAKE_STREAM_CHUNKS = int(os.getenv("FAKE_OPENAI_STREAM_CHUNKS", "20"))
+# Requests beyond this many in flight get a 429, like an overloaded account (0 = off)
+FAKE_MAX_CONCURRENCY = int(os.getenv("FAKE_OPENAI_MAX_CONCURRENCY", "0"))
+FAKE_RETRY_AFTER_MS = int(os.getenv("FAKE_OPENAI_RETRY_AFTER_MS", "200"))
+
+# Counters the load benchmarks read back
+fake_stats = {"in_flight": 0, "completed": 0, "throttled": 0, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+fake_app = FastAPI()
+
+_random = random.Random(FAKE_SEED)
+
+# Section prompts name the one section to write
+_SECTION_TITLE = re.compile(r'Write \*\*only\*\* the "(.+?)" section')
+
+
+def load_completions(path: str = FAKE_FIXTURES) -> list:
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["completions"]
+
+
+completions = load_completions()
+
+
+def fake_delay() -> float:
+    return max(_random.gauss(FAKE_DELAY, FAKE_JITTER), 0) if FAKE_JITTER else FAKE_DELAY
+
+
+def _usage(messages: list, content: str, model: str) -> dict:
+    prompt_tokens = count_message_tokens(messages, model)
+    completion_tokens = count_tokens(content, model)
+    fake_stats["calls"] += 1
+    fake_stats["prompt_tokens"] += prompt_tokens
+    fake_stats["completion_tokens"] += completion_tokens
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+def _completion_body(content: str, model: str, usage: dict) -> dict:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": usage,
+    }
+
+
+def _chunk_event(model: str, delta: dict, finish_reason=None, usage=None) -> str:
+    chunk = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+        "usage": usage,
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+async def _stream(content: str, model: str, usage: dict):
+    size = max(1, len(content) // FAKE_STREAM_CHUNKS)
+    delay = fake_delay()
+    yield _chunk_event(model, {"role": "assistant", "content": ""})
+    for i in range(0, len(content), size):
+        await asyncio.sleep(delay / FAKE_STREAM_CHUNKS)
+        yield _chunk_event(model, {"content": content[i:i + size]})
+    yield _chunk_event(model, {}, finish_reason="stop")
+    yield _chunk_event(model, {}, usage=usage)
+    yield "data: [DONE]\n\n"
+
+
+def fake_content(messages: list) -> str:
+    """Pick the recorded answer for the calling feature, or a generic one"""
+    prompt = "\n".join(message.get("content") or "" for message in messages)
+    for completion in completions:
+        if completion["match"] in prompt:
+            content = completion["content"]
+            content = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+            section = _SECTION_TITLE.search(prompt)
+            return content.replace("{section}", section.group(1)) if section else content
+    return json.dumps({"ideas": [{"title": "Fake idea", "description": "Benchmark payload", "estimatedTime": "1 week"}]})
+
+
+def _throttled() -> JSONResponse:
+    fake_stats["throttled"] += 1
+    return JSONResponse(
+        status_code=429,
+        headers={"retry-after-ms": str(FAKE_RETRY_AFTER_MS)},
+        content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+    )
+
+
+@fake_app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-4o-mini")
+    messages = body.get("messages", [])
+    content = fake_content(messages)
+    if FAKE_MAX_CONCURRENCY and fake_stats["in_flight"] >= FAKE_MAX_CONCURRENCY:
+        return _throttled()
+    usage = _usage(messages, content, model)
+    if body.get("stream"):
+        return StreamingResponse(_stream(content, model, usage), media_type="text/event-stream")
+    fake_stats["in_flight"] += 1
+    try:
+        await asyncio.sleep(fake_delay())
+    finally:
+        fake_stats["in_flight"] -= 1
+    fake_stats["completed"] += 1
+    return _completion_body(content, model, usage)
+
+
+class FakeServer:
+    """Run an ASGI app with uvicorn on a background thread"""
+
+    def __init__(self, app=fake_app, port: int = 8765):
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
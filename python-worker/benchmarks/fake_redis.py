@@ -0,0 +1,227 @@
+# fake_redis.py
+"""
+In-process Redis stand-in for SHARED_STATE=redis, speaking RESP2 over TCP
+or a Unix socket.
+
+    python benchmarks/fake_redis.py --port 6390
+    SHARED_STATE=redis SHARED_STATE_URL=redis://127.0.0.1:6390/0 python main.py
+
+Covers what core/redis_state.py uses through redis-py: GET, SET
+(EX/PX/NX/XX), DEL, EXISTS, SCAN, WATCH/MULTI/EXEC, plus PING, AUTH,
+SELECT, DBSIZE and FLUSHDB. Other commands, such as the CLIENT SETINFO
+redis-py sends on connect, get an error reply. Expiry is lazy; WATCH
+fails an EXEC when a watched key was written, deleted or expired since.
+"""
+import argparse
+import asyncio
+import fnmatch
+import itertools
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Counters the benchmarks read back
+fake_stats = {"commands": 0, "conflicts": 0}
+
+
+class Error(Exception):
+    """Sent to the client as an error reply"""
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        # Bumped on every write, for WATCH
+        self.versions: Dict[bytes, int] = {}
+        self._clock = itertools.count(1)
+
+    def _live(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        return value
+
+    def _remove(self, key: bytes) -> bool:
+        if self.data.pop(key, None) is None:
+            return False
+        self.versions[key] = next(self._clock)
+        return True
+
+    def version(self, key: bytes) -> int:
+        self._live(key)
+        return self.versions.get(key, 0)
+
+    def run(self, args: List[bytes]) -> Any:
+        fake_stats["commands"] += 1
+        name, args = args[0].upper().decode(), args[1:]
+        if name == "PING":
+            return "PONG"
+        if name in ("AUTH", "SELECT"):
+            return "OK"
+        if name == "GET":
+            return self._live(args[0])
+        if name == "SET":
+            return self._set(args)
+        if name == "DEL":
+            return sum(self._remove(key) for key in args if self._live(key) is not None)
+        if name == "EXISTS":
+            return sum(self._live(key) is not None for key in args)
+        if name == "SCAN":
+            return self._scan(args)
+        if name == "DBSIZE":
+            return sum(self._live(key) is not None for key in list(self.data))
+        if name == "FLUSHDB":
+            for key in list(self.data):
+                self._remove(key)
+            return "OK"
+        raise Error(f"ERR unknown command '{name}'")
+
+    def _set(self, args: List[bytes]) -> Any:
+        key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+        expires_at = None
+        if b"EX" in options:
+            expires_at = time.monotonic() + float(args[2 + options.index(b"EX") + 1])
+        if b"PX" in options:
+            expires_at = time.monotonic() + float(args[2 + options.index(b"PX") + 1]) / 1000
+        exists = self._live(key) is not None
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return None
+        self.data[key] = (value, expires_at)
+        self.versions[key] = next(self._clock)
+        return "OK"
+
+    def _scan(self, args: List[bytes]) -> Any:
+        pattern = "*"
+        upper = [arg.upper() for arg in args]
+        if b"MATCH" in upper:
+            pattern = args[upper.index(b"MATCH") + 1].decode()
+        # Everything in one pass; cursor 0 ends the iteration
+        keys = [key for key in list(self.data) if self._live(key) is not None and fnmatch.fnmatchcase(key.decode(), pattern)]
+        return [b"0", keys]
+
+
+class Connection:
+    """Per-client transaction state"""
+
+    def __init__(self, server: FakeRedis):
+        self.server = server
+        self.watched: Dict[bytes, int] = {}
+        self.queued: Optional[List[List[bytes]]] = None
+
+    def handle(self, args: List[bytes]) -> Any:
+        name = args[0].upper()
+        if name == b"MULTI":
+            self.queued = []
+            return "OK"
+        if name == b"DISCARD":
+            self.queued, self.watched = None, {}
+            return "OK"
+        if name == b"EXEC":
+            queued, self.queued = self.queued, None
+            if queued is None:
+                raise Error("ERR EXEC without MULTI")
+            stale = any(self.server.version(key) != version for key, version in self.watched.items())
+            self.watched = {}
+            if stale:
+                fake_stats["conflicts"] += 1
+                return NULL_ARRAY
+            return [self._run(command) for command in queued]
+        if self.queued is not None:
+            self.queued.append(args)
+            return "QUEUED"
+        if name == b"WATCH":
+            for key in args[1:]:
+                self.watched[key] = self.server.version(key)
+            return "OK"
+        if name == b"UNWATCH":
+            self.watched = {}
+            return "OK"
+        return self.server.run(args)
+
+    def _run(self, args: List[bytes]) -> Any:
+        try:
+            return self.server.run(args)
+        except Error as e:
+            return e
+
+
+NULL_ARRAY = object()
+
+
+def encode(value: Any) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if value is NULL_ARRAY:
+        return b"*-1\r\n"
+    if isinstance(value, Exception):
+        return b"-%s\r\n" % str(value).encode()
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode(item) for item in value)
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, e.g. from telnet
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+def serve(server: FakeRedis):
+    async def client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = Connection(server)
+        try:
+            while True:
+                args = await read_command(reader)
+                if not args:
+                    break
+                try:
+                    reply = connection.handle(args)
+                except Error as e:
+                    reply = e
+                except (IndexError, ValueError):
+                    reply = Error("ERR syntax error")
+                writer.write(encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return client
+
+
+async def main(host: str, port: int, unix: Optional[str]) -> None:
+    handler = serve(FakeRedis())
+    if unix:
+        listener = await asyncio.start_unix_server(handler, path=unix)
+    else:
+        listener = await asyncio.start_server(handler, host, port)
+    print(f"fake redis listening on {unix or f'{host}:{port}'}", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--unix", help="listen on this Unix socket instead")
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.port, args.unix))
@@ -0,0 +1,61 @@
+# llm_concurrency.py
+"""
+Concurrent throughput of the old blocking OpenAI calls vs. llm.gateway.
+
+    python benchmarks/llm_concurrency.py --requests 50 --delay 0.5
+
+Both runs issue the same number of completions from inside async handlers
+against a local fake OpenAI server, so no API key or network is needed.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--requests", type=int, default=50)
+parser.add_argument("--delay", type=float, default=0.5)
+parser.add_argument("--port", type=int, default=8765)
+args = parser.parse_args()
+
+os.environ["FAKE_OPENAI_DELAY"] = str(args.delay)
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from openai import OpenAI  # noqa: E402
+
+from benchmarks.fake_openai import FakeServer  # noqa: E402
+from llm.gateway import chat_completion, close_llm_client  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "benchmark"}]
+
+
+async def blocking_handler(client: OpenAI):
+    # What every endpoint did before: a sync call inside an async def
+    return client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+
+
+async def gateway_handler():
+    return await chat_completion(messages=MESSAGES)
+
+
+async def run(label: str, make_call):
+    start = time.perf_counter()
+    await asyncio.gather(*(make_call() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {args.requests} requests in {elapsed:6.2f}s  ->  {args.requests / elapsed:7.2f} req/s")
+
+
+async def main():
+    sync_client = OpenAI()
+    await run("blocking", lambda: blocking_handler(sync_client))
+    await run("gateway", gateway_handler)
+    await close_llm_client()
+
+
+if __name__ == "__main__":
+    with FakeServer(port=args.port):
+        asyncio.run(main())
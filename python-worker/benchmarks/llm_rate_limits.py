@@ -0,0 +1,92 @@
+# llm_rate_limits.py
+"""
+Simulated load against a fake OpenAI server that answers 429 once more than
+--capacity requests are in flight.
+
+    python benchmarks/llm_rate_limits.py --readmes 60 --ideas 20 --capacity 8
+
+"unscheduled" calls the API directly with no retries, as every endpoint did
+before; "scheduled" goes through llm.gateway, so calls are retried with
+backoff, concurrency adapts to the 429s and idea requests (interactive) are
+admitted ahead of READMEs (background).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--readmes", type=int, default=60)
+parser.add_argument("--ideas", type=int, default=20)
+parser.add_argument("--capacity", type=int, default=8)
+parser.add_argument("--delay", type=float, default=0.2)
+parser.add_argument("--port", type=int, default=8766)
+args = parser.parse_args()
+
+os.environ["FAKE_OPENAI_DELAY"] = str(args.delay)
+os.environ["FAKE_OPENAI_MAX_CONCURRENCY"] = str(args.capacity)
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from openai import AsyncOpenAI, RateLimitError  # noqa: E402
+
+from benchmarks.fake_openai import FakeServer, fake_stats  # noqa: E402
+from llm.gateway import chat_completion, close_llm_client  # noqa: E402
+from llm.scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, ModelBusyError, get_llm_scheduler  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "benchmark"}]
+
+
+async def timed(make_call):
+    start = time.perf_counter()
+    try:
+        await make_call()
+        return time.perf_counter() - start
+    except (RateLimitError, ModelBusyError):
+        return None
+
+
+def report(label: str, latencies):
+    done = [t for t in latencies if t is not None]
+    p50 = statistics.median(done) if done else float("nan")
+    p95 = sorted(done)[int(len(done) * 0.95) - 1] if done else float("nan")
+    print(f"  {label:<8} {len(done):3d}/{len(latencies):<3d} ok   p50 {p50:6.2f}s   p95 {p95:6.2f}s")
+
+
+async def run(label: str, readme_call, idea_call):
+    fake_stats.update(completed=0, throttled=0)
+    start = time.perf_counter()
+    readmes = [asyncio.create_task(timed(readme_call)) for _ in range(args.readmes)]
+    # Users asking for ideas arrive while the README backlog is queued
+    await asyncio.sleep(args.delay)
+    ideas = [asyncio.create_task(timed(idea_call)) for _ in range(args.ideas)]
+    readme_times = await asyncio.gather(*readmes)
+    idea_times = await asyncio.gather(*ideas)
+    print(f"{label}: {time.perf_counter() - start:.2f}s, {fake_stats['throttled']} responses were 429")
+    report("readme", readme_times)
+    report("ideas", idea_times)
+
+
+async def main():
+    raw = AsyncOpenAI(max_retries=0)
+    direct = lambda: raw.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)  # noqa: E731
+    await run("unscheduled", direct, direct)
+
+    await run(
+        "scheduled",
+        lambda: chat_completion(MESSAGES, priority=PRIORITY_BACKGROUND),
+        lambda: chat_completion(MESSAGES, priority=PRIORITY_INTERACTIVE),
+    )
+    for lane in get_llm_scheduler().stats():
+        print(f"  {lane}")
+    await raw.close()
+    await close_llm_client()
+
+
+if __name__ == "__main__":
+    with FakeServer(port=args.port):
+        asyncio.run(main())
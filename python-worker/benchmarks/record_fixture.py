@@ -0,0 +1,160 @@
+# record_fixture.py
+"""
+Record a repository as a fake_github.py fixture.
+
+    python benchmarks/record_fixture.py --repo tiangolo/typer
+    python benchmarks/record_fixture.py --from-dir ~/src/app --name acme/app --language TypeScript
+
+--repo records metadata, HEAD, the tree and file bodies from the live API
+(GITHUB_TOKEN is used when set). --from-dir builds the same responses from a
+local checkout, offline; a git checkout contributes its tracked files only.
+Bodies are stored up to the worker's per-file read budget, highest ranked
+files first, and written as gzip'd JSON to
+benchmarks/fixtures/github/<owner>__<repo>.json.gz.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx  # noqa: E402
+
+from benchmarks.fake_github import FIXTURES_DIR, git_blob_sha  # noqa: E402
+from readme.context_compactor import rank_files  # noqa: E402
+from readme.raw_content import GITHUB_CONTENT_READ_BYTES, GITHUB_CONTENT_SKIP_BYTES, decode_text  # noqa: E402
+
+SKIPPED_DIRS = {".git", "node_modules", "__pycache__", ".next", ".venv", "venv", "dist", "build"}
+
+parser = argparse.ArgumentParser()
+source = parser.add_mutually_exclusive_group(required=True)
+source.add_argument("--repo", help="owner/repo to record from api.github.com")
+source.add_argument("--from-dir", help="local checkout to record instead")
+parser.add_argument("--name", help="owner/repo for a --from-dir fixture")
+parser.add_argument("--description", default="")
+parser.add_argument("--language", default="")
+parser.add_argument("--date", default="2025-01-01T00:00:00Z", help="created/updated date for --from-dir metadata")
+parser.add_argument("--max-files", type=int, default=200, help="file bodies to store")
+parser.add_argument("--max-bytes", type=int, default=GITHUB_CONTENT_READ_BYTES, help="bytes stored per file")
+parser.add_argument("--output-dir", default=FIXTURES_DIR)
+args = parser.parse_args()
+
+
+def pick_files(paths, read):
+    """Text bodies of the best ranked files, cut to --max-bytes"""
+    files = {}
+    for path in rank_files(paths):
+        if len(files) >= args.max_files:
+            break
+        data = read(path)
+        text = decode_text(data[: args.max_bytes]) if data is not None else None
+        if text:
+            files[path] = text
+    return files
+
+
+def record_api(full_name: str) -> dict:
+    headers = {"Accept": "application/vnd.github+json", "User-Agent": "shards-python-worker-benchmarks"}
+    if os.getenv("GITHUB_TOKEN"):
+        headers["Authorization"] = f"Bearer {os.getenv('GITHUB_TOKEN')}"
+    with httpx.Client(base_url="https://api.github.com", headers=headers, timeout=30) as client:
+        metadata = client.get(f"/repos/{full_name}").raise_for_status().json()
+        head_sha = client.get(f"/repos/{full_name}/commits/HEAD", headers={"Accept": "application/vnd.github.sha"}).raise_for_status().text.strip()
+        tree = client.get(f"/repos/{full_name}/git/trees/{head_sha}", params={"recursive": "1"}).raise_for_status().json()
+        blobs = [item for item in tree["tree"] if item["type"] == "blob"]
+        sizes = {item["path"]: item.get("size", 0) for item in blobs}
+        shas = {item["path"]: item["sha"] for item in blobs}
+
+        def read(path):
+            if sizes[path] > GITHUB_CONTENT_SKIP_BYTES:
+                return None
+            res = client.get(f"/repos/{full_name}/git/blobs/{shas[path]}", headers={"Accept": "application/vnd.github.raw"})
+            return res.content if res.status_code == 200 else None
+
+        files = pick_files(list(shas), read)
+    return {
+        "owner": metadata["owner"]["login"],
+        "repo": metadata["name"],
+        "metadata": metadata,
+        "head_sha": head_sha,
+        "tree_sha": tree["sha"],
+        "tree": [{"path": path, "sha": shas[path], "size": sizes[path]} for path in shas],
+        "files": files,
+    }
+
+
+def list_files(root: str):
+    """Tracked files of a git checkout, or every file outside build and cache directories"""
+    try:
+        out = subprocess.run(["git", "-C", root, "ls-files", "-z"], capture_output=True, check=True).stdout
+        return sorted(path for path in out.decode("utf-8").split("\0") if path and os.path.isfile(os.path.join(root, path)))
+    except (OSError, subprocess.CalledProcessError):
+        return list(walk(root))
+
+
+def walk(root: str):
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIPPED_DIRS)
+        for name in sorted(filenames):
+            yield os.path.relpath(os.path.join(directory, name), root).replace(os.sep, "/")
+
+
+def record_dir(root: str, full_name: str) -> dict:
+    owner, repo = full_name.split("/", 1)
+    paths = list_files(root)
+
+    def read(path):
+        full = os.path.join(root, path)
+        if os.path.getsize(full) > GITHUB_CONTENT_SKIP_BYTES:
+            return None
+        with open(full, "rb") as f:
+            return f.read()
+
+    files = pick_files(paths, read)
+    tree = []
+    for path in paths:
+        # Recorded bodies are served as the blob; the rest only need a stable SHA
+        sha = git_blob_sha(files[path].encode("utf-8")) if path in files else hashlib.sha1(path.encode()).hexdigest()
+        tree.append({"path": path, "sha": sha, "size": os.path.getsize(os.path.join(root, path))})
+    head_sha = hashlib.sha1(json.dumps(tree, sort_keys=True).encode()).hexdigest()
+    metadata = {
+        "name": repo,
+        "full_name": full_name,
+        "owner": {"login": owner},
+        "description": args.description,
+        "language": args.language,
+        "default_branch": "main",
+        "stargazers_count": 0,
+        "forks_count": 0,
+        "topics": [],
+        "license": None,
+        "created_at": args.date,
+        "updated_at": args.date,
+        "html_url": f"https://github.com/{full_name}",
+        "clone_url": f"https://github.com/{full_name}.git",
+        "private": False,
+    }
+    return {"owner": owner, "repo": repo, "metadata": metadata, "head_sha": head_sha, "tree": tree, "files": files}
+
+
+def main():
+    if args.repo:
+        fixture = record_api(args.repo)
+    else:
+        if not args.name:
+            parser.error("--from-dir needs --name owner/repo")
+        fixture = record_dir(os.path.abspath(args.from_dir), args.name)
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"{fixture['owner']}__{fixture['repo']}.json.gz")
+    # mtime=0 keeps re-recordings of an unchanged repository byte-identical
+    with open(path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+        f.write(json.dumps(fixture, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    print(f"{path}: {len(fixture['tree'])} files in the tree, {len(fixture['files'])} bodies recorded")
+
+
+if __name__ == "__main__":
+    main()
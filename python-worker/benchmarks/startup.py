@@ -0,0 +1,79 @@
+# startup.py
+"""
+Worker startup cost, each measured in a fresh interpreter: time to import
+main, time until the app has started (lifespan done, so it would accept
+requests), time until the OpenAI client is built, and peak memory.
+
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --features readme,jobs --features ideas
+    python benchmarks/startup.py --worker-dir /tmp/old-checkout/python-worker
+
+Each --features value is run as its own WORKER_FEATURES set; with none the
+default (every feature) is measured. --worker-dir points at another checkout
+(e.g. a git worktree of an older commit) to compare against.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+WORKER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Runs in the child: import the app, run its lifespan, report the timings
+PROBE = """
+import asyncio, json, resource, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+openai_at_import = "openai" in sys.modules
+
+async def started():
+    from llm.gateway import get_llm_client
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        await get_llm_client()
+        return ready, time.perf_counter()
+
+ready, llm_ready = asyncio.run(started())
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "startup_ms": (ready - start) * 1000,
+    "llm_client_ms": (llm_ready - start) * 1000,
+    # ru_maxrss is KiB on Linux
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "openai_at_import": openai_at_import,
+}))
+"""
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--runs", type=int, default=5)
+parser.add_argument("--features", action="append", help="comma-separated WORKER_FEATURES; repeatable")
+parser.add_argument("--worker-dir", default=WORKER_DIR)
+args = parser.parse_args()
+
+
+def measure(features):
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-benchmark"), "JOB_STORE": "memory"}
+    if features:
+        env["WORKER_FEATURES"] = features
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=args.worker_dir, env=env, capture_output=True, text=True, check=True
+    )
+    # The last line is the probe's report; anything before it is worker logging
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    for features in args.features or [None]:
+        runs = [measure(features) for _ in range(args.runs)]
+        print(f"{features or 'all features'}:")
+        for field in ("import_ms", "startup_ms", "llm_client_ms", "max_rss_mb"):
+            values = [run[field] for run in runs]
+            print(f"  {field:<13} median {statistics.median(values):7.1f}   min {min(values):7.1f}   max {max(values):7.1f}")
+        print(f"  openai imported by main: {'yes' if runs[0]['openai_at_import'] else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
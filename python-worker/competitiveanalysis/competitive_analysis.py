@@ -1,17 +1,15 @@
-import os
-import openai
-from typing import List, Dict, Any
+import json
+from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
-
-# set the api key globally
-openai.api_key = os.getenv("OPENAI_API_KEY")
-if not openai.api_key:
-    raise ValueError("OPENAI_API_KEY environment variable is required")
+from llm.response_cache import cached_chat_completion, is_cache_hit
+from llm.scheduler import PRIORITY_INTERACTIVE, ModelBusyError
+from llm.tokens import CreditBudget
 
 class CompetitiveAnalysisRequest(BaseModel):
     project_description: str
     competitors: str = ""
     target_audience: str = ""
+    use_cache: bool = True
 
 class CompetitiveAnalysisResponse(BaseModel):
     unique_value_proposition: List[str]
@@ -19,11 +17,39 @@ class CompetitiveAnalysisResponse(BaseModel):
     target_audience_alignment: str
     recommended_positioning: str
 
+# Static prompt parts, built once at import; requests only fill in the fields
+COMPETITIVE_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a strategic business analyst specializing in competitive positioning and market analysis. Provide clear, actionable insights in JSON format."
+}
+
+COMPETITIVE_PROMPT_HEADER = """
+Analyze the competitive positioning for the following project and provide a comprehensive analysis in JSON format with these exact keys:
+- unique_value_proposition (array of strings)
+- competitive_advantages (array of strings)
+- target_audience_alignment (string)
+- recommended_positioning (string)
+
+Project Description: {project_description}
+"""
+
+COMPETITIVE_PROMPT_INSTRUCTIONS = """
+        
+Please provide:
+1. 3-5 unique value propositions that differentiate this project
+2. 3-5 competitive advantages compared to existing solutions
+3. How the project aligns with and serves the target audience
+4. Recommended market positioning strategy
+
+Return only valid JSON without any additional text.
+"""
+
+_competitive_analyzer: Optional["CompetitiveAnalyzer"] = None
+
 class CompetitiveAnalyzer:
-    def __init__(self):
-        self.client = openai  # using openai module directly
+    """Stateless; one instance serves every request (see get_competitive_analyzer)"""
 
-    def generate_analysis(self, request: CompetitiveAnalysisRequest) -> Dict[str, Any]:
+    async def generate_analysis(self, request: CompetitiveAnalysisRequest, user_credits: Optional[int] = None) -> Dict[str, Any]:
         """Generate competitive analysis using OpenAI API"""
         
         prompt = self._build_prompt(
@@ -31,48 +57,52 @@ class CompetitiveAnalyzer:
             request.competitors,
             request.target_audience
         )
+        messages = [
+            COMPETITIVE_SYSTEM_MESSAGE,
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+        reservation = CreditBudget(user_credits).reserve("competitive", messages)
         
         try:
-            response = self.client.chat.completions.create(
+            response = await cached_chat_completion(
                 model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a strategic business analyst specializing in competitive positioning and market analysis. Provide clear, actionable insights in JSON format."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
+                priority=PRIORITY_INTERACTIVE,
+                messages=messages,
                 response_format={"type": "json_object"},
                 temperature=0.7,
+                use_cache=request.use_cache,
+                **reservation.as_kwargs()
             )
             
+            if response.choices[0].finish_reason == "length":
+                return {
+                    "error": "insufficient_credits",
+                    "used_tokens": response.usage.total_tokens if response.usage else 0
+                }
+            
             analysis_data = response.choices[0].message.content
             parsed_response = self._parse_response(analysis_data)
             
             # Return both the analysis and token usage
             return {
                 "analysis": parsed_response,
-                "used_tokens": response.usage.total_tokens if response.usage else 0
+                "used_tokens": response.usage.total_tokens if response.usage else 0,
+                "cache_hit": is_cache_hit(response)
             }
             
+        except ModelBusyError:
+            # Still throttled after the scheduler's retries; answered with a 503
+            raise
         except Exception as e:
             raise Exception(f"OpenAI API error: {str(e)}")
     
     def _build_prompt(self, project_description: str, competitors: str, target_audience: str) -> str:
         """Build the prompt for competitive analysis"""
         
-        prompt = f"""
-Analyze the competitive positioning for the following project and provide a comprehensive analysis in JSON format with these exact keys:
-- unique_value_proposition (array of strings)
-- competitive_advantages (array of strings)
-- target_audience_alignment (string)
-- recommended_positioning (string)
-
-Project Description: {project_description}
-"""
+        prompt = COMPETITIVE_PROMPT_HEADER.format(project_description=project_description)
         
         if competitors:
             prompt += f"\nCompetitors: {competitors}"
@@ -80,23 +110,12 @@ Project Description: {project_description}
         if target_audience:
             prompt += f"\nTarget Audience: {target_audience}"
         
-        prompt += """
-        
-Please provide:
-1. 3-5 unique value propositions that differentiate this project
-2. 3-5 competitive advantages compared to existing solutions
-3. How the project aligns with and serves the target audience
-4. Recommended market positioning strategy
-
-Return only valid JSON without any additional text.
-"""
+        prompt += COMPETITIVE_PROMPT_INSTRUCTIONS
         
         return prompt
     
     def _parse_response(self, response_text: str) -> CompetitiveAnalysisResponse:
         """Parse the OpenAI response into the structured format"""
-        import json
-        
         try:
             data = json.loads(response_text)
             return CompetitiveAnalysisResponse(
@@ -109,3 +128,9 @@ Return only valid JSON without any additional text.
             raise Exception(f"Failed to parse OpenAI response: {str(e)}")
         except Exception as e:
             raise Exception(f"Error parsing response: {str(e)}")
+
+def get_competitive_analyzer() -> CompetitiveAnalyzer:
+    global _competitive_analyzer
+    if _competitive_analyzer is None:
+        _competitive_analyzer = CompetitiveAnalyzer()
+    return _competitive_analyzer
@@ -0,0 +1,58 @@
+# routes.py
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from competitiveanalysis.competitive_analysis import CompetitiveAnalysisRequest, CompetitiveAnalyzer, get_competitive_analyzer
+from core.api import insufficient_credits_response, model_busy_response, service, truncated_response, verify_api_key
+from llm.scheduler import ModelBusyError
+from llm.tokens import InsufficientCreditsError
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.post("/competitive-analysis")
+async def competitive_analysis(
+    req: CompetitiveAnalysisRequest,
+    request: Request,
+    analyzer: CompetitiveAnalyzer = Depends(service(get_competitive_analyzer)),
+    auth=Depends(verify_api_key)
+):
+    try:
+        user_credits = int(request.headers.get("X-User-Credits", 0))
+        
+        if user_credits <= 0:
+            return JSONResponse(
+                status_code=402,
+                content={
+                    "error": "insufficient_credits",
+                    "message": "Not enough AI credits"
+                }
+            )
+        
+        result = await analyzer.generate_analysis(req, user_credits)
+        
+        used_credits = result["used_tokens"]
+        
+        if result.get("error") == "insufficient_credits" or used_credits > user_credits:
+            return truncated_response(used_credits)
+            
+        analysis = result["analysis"]
+        return {
+            "uniqueValueProposition": analysis.unique_value_proposition,
+            "competitiveAdvantages": analysis.competitive_advantages,
+            "targetAudienceAlignment": analysis.target_audience_alignment,
+            "recommendedPositioning": analysis.recommended_positioning,
+            "used_credits": used_credits,
+            "cache_hit": result.get("cache_hit", False),
+            "success": True
+        }
+    except InsufficientCreditsError as e:
+        return insufficient_credits_response(e)
+    except ModelBusyError as e:
+        return model_busy_response(e)
+    except Exception as e:
+        logger.exception("Error in competitive analysis")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,65 @@
+# api.py
+import os
+from typing import Callable, TypeVar
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from llm.scheduler import ModelBusyError
+from llm.tokens import InsufficientCreditsError
+
+API_KEY = os.getenv("WORKER_API_KEY")
+
+T = TypeVar("T")
+
+
+# Dependencies are async: FastAPI runs plain def dependencies in its
+# threadpool, a hop that costs more than the work they do
+async def verify_api_key(request: Request):
+    key = request.headers.get("X-API-Key")
+    if not key or key != API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return True
+
+
+def insufficient_credits_response(e: InsufficientCreditsError):
+    """402 for a request rejected before any model call"""
+    return JSONResponse(
+        status_code=402,
+        content={
+            "error": "insufficient_credits",
+            "message": "Not enough AI credits",
+            "required_credits": e.required
+        }
+    )
+
+
+def truncated_response(used_credits: int):
+    """402 for a completion cut off at the user's credit limit; the tokens it used are still billed"""
+    return JSONResponse(
+        status_code=402,
+        content={
+            "error": "insufficient_credits",
+            "message": "Not enough AI credits to complete generation",
+            "used_credits": used_credits
+        }
+    )
+
+
+def model_busy_response(e: ModelBusyError):
+    """503 when OpenAI kept rate limiting after the scheduler's retries"""
+    return JSONResponse(
+        status_code=503,
+        content={
+            "error": "model_busy",
+            "message": "The AI service is busy, please try again shortly"
+        },
+        headers={"Retry-After": str(max(int(e.retry_after or 0), 1))}
+    )
+
+
+def service(get: Callable[[], T]) -> Callable[[], T]:
+    """Depends() provider for an app-wide service returned by a get_*() accessor"""
+    async def provide() -> T:
+        return get()
+    return provide
@@ -0,0 +1,340 @@
+# cache.py
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from core.metrics import counter
+
+# A hit only rewrites a row's LRU timestamp once it is this old, so reads
+# rarely take SQLite's write lock
+SQLITE_CACHE_TOUCH_INTERVAL = float(os.getenv("SQLITE_CACHE_TOUCH_INTERVAL", "60"))
+
+CACHE_LOOKUPS = counter("cache_lookups_total", "Cache reads by cache and result (hit or miss)", ("cache", "result"))
+
+
+class CacheBackend(ABC):
+    """
+    Minimal key/value cache interface; values must be JSON-serializable.
+
+    Coroutines use aget/aset/adelete, which run the blocking methods in a
+    worker thread unless the backend keeps everything in memory.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        await asyncio.to_thread(self.set, key, value, ttl, size)
+
+    async def adelete(self, key: str) -> None:
+        await asyncio.to_thread(self.delete, key)
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate payload size in bytes, used for size-based eviction"""
+    return len(json.dumps(value, default=str))
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU with per-entry TTL and entry/byte limits"""
+
+    def __init__(self, max_entries: int = 256, max_bytes: Optional[int] = None, default_ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[float], int]]" = OrderedDict()
+        self._bytes = 0
+        # Reentrant so subclasses can build atomic updates out of get and set
+        self._lock = threading.RLock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        if size is None:
+            size = estimate_size(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl if ttl else None
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    # In memory, so there is nothing to move off the event loop
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        self.set(key, value, ttl=ttl, size=size)
+
+    async def adelete(self, key: str) -> None:
+        self.delete(key)
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    On-disk cache that survives restarts; evicts least recently used rows past
+    max_bytes. Recency is tracked to SQLITE_CACHE_TOUCH_INTERVAL.
+    """
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None, default_ttl: Optional[float] = None, table: str = "cache"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.table = table
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at, accessed_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at, accessed_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            if now - accessed_at >= SQLITE_CACHE_TOUCH_INTERVAL:
+                self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        payload = json.dumps(value, default=str)
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), expires_at, now),
+            )
+            self._evict(now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        if not self.max_bytes:
+            return
+        total = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            f"SELECT key, size FROM {self.table} ORDER BY accessed_at ASC"
+        ).fetchall():
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+class TieredCache(CacheBackend):
+    """Memory in front of a persistent backend; disk hits are promoted to memory"""
+
+    def __init__(self, front: CacheBackend, back: CacheBackend):
+        self.front = front
+        self.back = back
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.front.get(key)
+        if value is None:
+            value = self.back.get(key)
+            if value is not None:
+                self.front.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        self.front.set(key, value, ttl=ttl, size=size)
+        self.back.set(key, value, ttl=ttl, size=size)
+
+    def delete(self, key: str) -> None:
+        self.front.delete(key)
+        self.back.delete(key)
+
+    def clear(self) -> None:
+        self.front.clear()
+        self.back.clear()
+
+    async def aget(self, key: str) -> Optional[Any]:
+        value = await self.front.aget(key)
+        if value is None:
+            value = await self.back.aget(key)
+            if value is not None:
+                await self.front.aset(key, value)
+        return value
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        await self.front.aset(key, value, ttl=ttl, size=size)
+        await self.back.aset(key, value, ttl=ttl, size=size)
+
+    async def adelete(self, key: str) -> None:
+        await self.front.adelete(key)
+        await self.back.adelete(key)
+
+
+class NullCache(CacheBackend):
+    def get(self, key: str) -> Optional[Any]:
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return None
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        pass
+
+    async def adelete(self, key: str) -> None:
+        pass
+
+
+class MeteredCache(CacheBackend):
+    """Counts hits and misses of the wrapped cache in cache_lookups_total"""
+
+    def __init__(self, name: str, cache: CacheBackend):
+        self.name = name
+        self._cache = cache
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._cache.get(key)
+        CACHE_LOOKUPS.inc(cache=self.name, result="miss" if value is None else "hit")
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        self._cache.set(key, value, ttl=ttl, size=size)
+
+    def delete(self, key: str) -> None:
+        self._cache.delete(key)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    async def aget(self, key: str) -> Optional[Any]:
+        value = await self._cache.aget(key)
+        CACHE_LOOKUPS.inc(cache=self.name, result="miss" if value is None else "hit")
+        return value
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        await self._cache.aset(key, value, ttl=ttl, size=size)
+
+    async def adelete(self, key: str) -> None:
+        await self._cache.adelete(key)
+
+
+def create_cache(
+    name: str,
+    backend: str = "memory",
+    max_entries: int = 256,
+    max_bytes: Optional[int] = None,
+    ttl: Optional[float] = None,
+    path: Optional[str] = None,
+    disk_max_bytes: Optional[int] = None,
+) -> CacheBackend:
+    """
+    Build a cache from configuration.
+
+    backend is "memory", "sqlite" (memory in front of an on-disk store at
+    `path`, default .cache/<name>.sqlite3), "shared" (memory in front of the
+    store every worker process shares, see shared_state.py; plain memory
+    while SHARED_STATE is "local") or "none".
+    """
+    backend = backend.lower()
+    if backend == "none":
+        return NullCache()
+
+    memory = MemoryCache(max_entries=max_entries, max_bytes=max_bytes, default_ttl=ttl)
+    if backend == "memory":
+        return MeteredCache(name, memory)
+    if backend == "sqlite":
+        path = path or os.path.join(".cache", f"{name}.sqlite3")
+        return MeteredCache(name, TieredCache(memory, SQLiteCache(path, max_bytes=disk_max_bytes, default_ttl=ttl, table=name)))
+    if backend == "shared":
+        from core.shared_state import open_shared_state, shared_state_enabled
+
+        if not shared_state_enabled():
+            return MeteredCache(name, memory)
+        return MeteredCache(name, TieredCache(memory, open_shared_state(name, max_bytes=disk_max_bytes, ttl=ttl)))
+    raise ValueError(f"Unknown cache backend: {backend}")
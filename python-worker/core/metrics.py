@@ -0,0 +1,262 @@
+# metrics.py
+import asyncio
+import glob
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cached GitHub call to a long README stream
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Byte and token sizes
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# With several worker processes, each one writes its metrics to a file here
+# (every METRICS_PUBLISH_INTERVAL seconds and when it serves /metrics) and
+# /metrics adds them all up, so a scrape sees the whole server whichever
+# worker answers it. Unset, /metrics covers only the process that answers.
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", "5"))
+
+LabelValues = Tuple[str, ...]
+# A metric's series as JSON-compatible data, for adding up across processes
+Snapshot = List[List[Any]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self, snapshots: Optional[List[Snapshot]] = None) -> List[str]:
+        """This metric's lines, summed over snapshots (from several processes) when given"""
+        series = snapshots if snapshots is not None else [self.snapshot()]
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples(series)
+
+    @abstractmethod
+    def snapshot(self) -> Snapshot:
+        """Current series as [label values, value...] lists"""
+
+    @abstractmethod
+    def _samples(self, snapshots: List[Snapshot]) -> List[str]:
+        """Sample lines for the summed snapshots, without the HELP and TYPE header"""
+
+
+class Counter(_Metric):
+    """Monotonic total per label set"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def snapshot(self) -> Snapshot:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def _samples(self, snapshots: List[Snapshot]) -> List[str]:
+        totals: Dict[LabelValues, float] = {}
+        for snapshot in snapshots:
+            for key, value in snapshot:
+                totals[tuple(key)] = totals.get(tuple(key), 0) + value
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in totals.items()]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label set"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts, sum, count]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def snapshot(self) -> Snapshot:
+        with self._lock:
+            return [[list(key), list(counts), total, count] for key, (counts, total, count) in self._series.items()]
+
+    def _samples(self, snapshots: List[Snapshot]) -> List[str]:
+        merged: Dict[LabelValues, list] = {}
+        for snapshot in snapshots:
+            for key, counts, total, count in snapshot:
+                series = merged.get(tuple(key))
+                if series is None or len(counts) != len(series[0]):
+                    # A bucket layout from another build would not add up; keep the latest
+                    merged[tuple(key)] = [list(counts), total, count]
+                    continue
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+        lines = []
+        for key, (counts, total, count) in merged.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    In-process metrics for this worker, rendered in the Prometheus text format
+    (added up over every worker process with METRICS_DIR, see render_metrics).
+
+    Metrics are declared at import time by the module that records them;
+    declaring the same name twice returns the existing metric.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labels != metric.labels:
+                    raise ValueError(f"Metric {metric.name} is already registered with different labels")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def snapshot(self) -> Dict[str, Snapshot]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def render(self, snapshots: Optional[List[Dict[str, Snapshot]]] = None) -> str:
+        """Every metric, summed over registry snapshots when given"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines += metric.render([s.get(metric.name, []) for s in snapshots] if snapshots is not None else None)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+    return REGISTRY.counter(name, help, labels)
+
+
+def histogram(name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.histogram(name, help, labels, buckets)
+
+
+# This process's file in METRICS_DIR; the start time keeps a restarted
+# worker that gets a recycled pid from overwriting its predecessor's totals
+_snapshot_path: Optional[str] = None
+
+
+def publish_metrics() -> None:
+    """Write this process's metrics to METRICS_DIR"""
+    global _snapshot_path
+    if _snapshot_path is None:
+        _snapshot_path = os.path.join(METRICS_DIR, f"{os.getpid()}-{time.time_ns()}.json")
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    temp_path = f"{_snapshot_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(REGISTRY.snapshot(), f)
+    os.replace(temp_path, _snapshot_path)
+
+
+def render_metrics() -> str:
+    """/metrics body: every worker process's metrics with METRICS_DIR, else this process's"""
+    if not METRICS_DIR:
+        return REGISTRY.render()
+    publish_metrics()
+    snapshots = []
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning("Skipping metrics file %s: %s", path, e)
+    return REGISTRY.render(snapshots)
+
+
+async def publish_metrics_forever() -> None:
+    """Keep this process's file in METRICS_DIR current, for whichever worker serves /metrics"""
+    while True:
+        try:
+            await asyncio.to_thread(publish_metrics)
+        except OSError as e:
+            logger.warning("Could not write metrics to %s: %s", METRICS_DIR, e)
+        await asyncio.sleep(METRICS_PUBLISH_INTERVAL)
+
+
+def clear_metrics_dir(path: str) -> None:
+    """Drop the files of a previous server run; call before the workers start"""
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,132 @@
+# redis_state.py
+import asyncio
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import redis
+import redis.asyncio
+
+from core.shared_state import Change, SharedState
+
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "5"))
+# Prefix for every key the worker writes, so one Redis can serve several deployments
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "shards:")
+
+_clients: Dict[str, redis.Redis] = {}
+_async_clients: Dict[str, Tuple[asyncio.AbstractEventLoop, redis.asyncio.Redis]] = {}
+
+
+def get_redis_client(url: str) -> redis.Redis:
+    """
+    Blocking client per URL per process (redis://, rediss:// and unix://
+    URLs). Its pool reconnects after a fork. Clients speak RESP2, which
+    every Redis version and benchmarks/fake_redis.py understand.
+    """
+    if url not in _clients:
+        _clients[url] = redis.Redis.from_url(url, protocol=2, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
+    return _clients[url]
+
+
+def get_async_redis_client(url: str) -> redis.asyncio.Redis:
+    """Asyncio client per URL for the running event loop; its connections cannot move between loops"""
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(url)
+    if entry is None or entry[0] is not loop:
+        client = redis.asyncio.Redis.from_url(url, protocol=2, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
+        _async_clients[url] = entry = (loop, client)
+    return entry[1]
+
+
+class RedisState(SharedState):
+    """
+    Shared state in Redis, for worker processes on several hosts.
+
+    update() is optimistic: the key is WATCHed while change() runs, and if
+    another client writes it before EXEC the transaction fails and change()
+    runs again on the new value.
+    """
+
+    def __init__(self, url: str, namespace: str, default_ttl: Optional[float] = None):
+        self.url = url
+        self.prefix = f"{REDIS_KEY_PREFIX}{namespace}:"
+        self.default_ttl = default_ttl
+
+    @property
+    def client(self) -> redis.Redis:
+        return get_redis_client(self.url)
+
+    @property
+    def async_client(self) -> redis.asyncio.Redis:
+        return get_async_redis_client(self.url)
+
+    def _px(self, ttl: Optional[float]) -> Optional[int]:
+        ttl = self.default_ttl if ttl is None else ttl
+        return max(int(ttl * 1000), 1) if ttl else None
+
+    @staticmethod
+    def _load(raw: Optional[bytes]) -> Optional[Any]:
+        return json.loads(raw) if raw is not None else None
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._load(self.client.get(self.prefix + key))
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        self.client.set(self.prefix + key, json.dumps(value, default=str), px=self._px(ttl))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=self.prefix + "*", count=500))
+        if keys:
+            self.client.delete(*keys)
+
+    def update(self, key: str, change: Change, ttl: Optional[float] = None) -> Optional[Any]:
+        name = self.prefix + key
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(name)
+                    current = self._load(pipe.get(name))
+                    value = change(current)
+                    if value == current:
+                        return value
+                    pipe.multi()
+                    if value is None:
+                        pipe.delete(name)
+                    else:
+                        pipe.set(name, json.dumps(value, default=str), px=self._px(ttl))
+                    pipe.execute()
+                    return value
+                except redis.WatchError:
+                    continue
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return self._load(await self.async_client.get(self.prefix + key))
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        await self.async_client.set(self.prefix + key, json.dumps(value, default=str), px=self._px(ttl))
+
+    async def adelete(self, key: str) -> None:
+        await self.async_client.delete(self.prefix + key)
+
+    async def aupdate(self, key: str, change: Change, ttl: Optional[float] = None) -> Optional[Any]:
+        name = self.prefix + key
+        async with self.async_client.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(name)
+                    current = self._load(await pipe.get(name))
+                    value = change(current)
+                    if value == current:
+                        return value
+                    pipe.multi()
+                    if value is None:
+                        pipe.delete(name)
+                    else:
+                        pipe.set(name, json.dumps(value, default=str), px=self._px(ttl))
+                    await pipe.execute()
+                    return value
+                except redis.WatchError:
+                    continue
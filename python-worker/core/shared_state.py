@@ -0,0 +1,132 @@
+# shared_state.py
+import asyncio
+import json
+import os
+import time
+from abc import abstractmethod
+from typing import Any, Callable, Optional
+
+from core.cache import CacheBackend, MemoryCache, SQLiteCache
+
+# Where state the worker processes share lives: "local" (this process only,
+# enough for a single worker), "sqlite" (one file every worker on the host
+# opens) or "redis" (SHARED_STATE_URL, for workers spread over several hosts)
+SHARED_STATE = os.getenv("SHARED_STATE", "local").lower()
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", os.path.join(".cache", "shared_state.sqlite3"))
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "redis://localhost:6379/0")
+# Server processes (uvicorn --workers / gunicorn -w); account-wide budgets are split between them
+WORKER_PROCESSES = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+
+# change(current value or None) -> new value, None to delete
+Change = Callable[[Optional[Any]], Optional[Any]]
+
+
+class SharedState(CacheBackend):
+    """
+    CacheBackend that can also change an entry atomically, which is what
+    separate worker processes need to coordinate (leases, quotas, claims).
+
+    Code on the event loop uses aupdate (and CacheBackend's aget, aset and
+    adelete), which by default runs update in a worker thread.
+    """
+
+    @abstractmethod
+    def update(self, key: str, change: Change, ttl: Optional[float] = None) -> Optional[Any]:
+        """
+        Replace the entry with change(current) and return the new value, with
+        no other writer in between. change may run more than once, so it
+        must not have side effects.
+
+        When change returns the current value nothing is written and the
+        entry keeps its expiry, so looking at someone else's lease does not
+        extend it; renewing one of your own needs a changed value.
+        """
+
+    async def aupdate(self, key: str, change: Change, ttl: Optional[float] = None) -> Optional[Any]:
+        return await asyncio.to_thread(self.update, key, change, ttl)
+
+
+class LocalState(MemoryCache, SharedState):
+    """Shared state for a single process"""
+
+    def update(self, key: str, change: Change, ttl: Optional[float] = None) -> Optional[Any]:
+        with self._lock:
+            current = self.get(key)
+            value = change(current)
+            if value == current:
+                return value
+            if value is None:
+                self.delete(key)
+            else:
+                self.set(key, value, ttl=ttl)
+            return value
+
+    async def aupdate(self, key: str, change: Change, ttl: Optional[float] = None) -> Optional[Any]:
+        return self.update(key, change, ttl=ttl)
+
+
+class SQLiteState(SQLiteCache, SharedState):
+    """
+    Shared state in a SQLite file, for worker processes on the same host.
+    The async methods run their queries in a worker thread, where
+    BEGIN IMMEDIATE can wait for another process's write lock.
+    """
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None, default_ttl: Optional[float] = None, table: str = "shared_state"):
+        super().__init__(path, max_bytes=max_bytes, default_ttl=default_ttl, table=table)
+        # WAL stays consistent without a sync per commit; a crash loses at most recent state
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    def update(self, key: str, change: Change, ttl: Optional[float] = None) -> Optional[Any]:
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            # IMMEDIATE takes the write lock before the read, so no other
+            # process can write the row in between
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute(
+                    f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                current = json.loads(row[0]) if row and (row[1] is None or row[1] > now) else None
+                value = change(current)
+                if value is None and current is not None:
+                    self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                elif value != current:
+                    payload = json.dumps(value, default=str)
+                    self._conn.execute(
+                        f"INSERT OR REPLACE INTO {self.table} (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                        (key, payload, len(payload), now + ttl if ttl else None, now),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return value
+
+
+def shared_state_enabled() -> bool:
+    """Whether state is actually shared with other processes"""
+    return SHARED_STATE != "local"
+
+
+def open_shared_state(name: str, max_entries: int = 4096, max_bytes: Optional[int] = None, ttl: Optional[float] = None) -> SharedState:
+    """
+    Store for one kind of shared state (a cache, leases, quotas), configured
+    by SHARED_STATE. Values must be JSON-serializable. max_entries only
+    applies to "local"; Redis evicts by its own maxmemory policy.
+    """
+    if SHARED_STATE == "local":
+        return LocalState(max_entries=max_entries, max_bytes=max_bytes, default_ttl=ttl)
+    if SHARED_STATE == "sqlite":
+        return SQLiteState(SHARED_STATE_PATH, max_bytes=max_bytes, default_ttl=ttl, table=name)
+    if SHARED_STATE == "redis":
+        from core.redis_state import RedisState
+
+        return RedisState(SHARED_STATE_URL, namespace=name, default_ttl=ttl)
+    raise ValueError(f"Unknown shared state backend: {SHARED_STATE}")
+
+
+def per_process(limit: int) -> int:
+    """An account-wide budget split evenly between worker processes (0, unlimited, stays 0)"""
+    return max(limit // WORKER_PROCESSES, 1) if limit else 0
@@ -0,0 +1,122 @@
+# single_flight.py
+import asyncio
+import logging
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from core.metrics import counter
+from core.shared_state import SharedState, open_shared_state, shared_state_enabled
+
+logger = logging.getLogger(__name__)
+
+# Across worker processes: how long a key stays claimed by the process
+# running it (another one takes over if that process dies), and how often
+# processes waiting on it look for the result
+SINGLE_FLIGHT_LEASE = float(os.getenv("SINGLE_FLIGHT_LEASE", "120"))
+SINGLE_FLIGHT_POLL = float(os.getenv("SINGLE_FLIGHT_POLL", "0.05"))
+
+COALESCED = counter("single_flight_coalesced_total", "Callers that joined identical work already in flight", ("name", "scope"))
+
+_flight_state: Optional[SharedState] = None
+
+
+def get_flight_state() -> SharedState:
+    global _flight_state
+    if _flight_state is None:
+        _flight_state = open_shared_state("single_flight", ttl=SINGLE_FLIGHT_LEASE)
+    return _flight_state
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one in-flight task.
+
+    The first caller starts the work; callers arriving while it runs await
+    the same task and get its result (or exception). A caller that goes
+    away doesn't cancel the work for the others; it is only cancelled once
+    nobody is waiting on it. Nothing is kept after the task finishes, so
+    this is not a cache.
+
+    Given dump and load (result to JSON-compatible data and back) and a
+    shared SHARED_STATE, calls in other worker processes are joined too: the
+    first process to claim the key runs it and publishes the result, the
+    others wait for that. If it fails, a waiting process runs it itself.
+    """
+
+    def __init__(self, name: str, dump: Optional[Callable[[Any], Any]] = None, load: Optional[Callable[[Any], Any]] = None):
+        self.name = name
+        self.dump = dump
+        self.load = load
+        self.coalesced = 0
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+
+    async def do(self, key: str, make_call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared); shared is True when another caller's task produced it"""
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.create_task(self._call(key, make_call))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+            COALESCED.inc(name=self.name, scope="process")
+            logger.debug("Joined in-flight %s call", self.name, extra={"key": key})
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            result, elsewhere = await asyncio.shield(task)
+            return result, shared or elsewhere
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    async def _call(self, key: str, make_call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """(result, True when another process produced it)"""
+        if self.dump is None or not shared_state_enabled():
+            return await make_call(), False
+
+        state = get_flight_state()
+        lease = f"{self.name}:{key}"
+        flight_id = uuid.uuid4().hex
+        joined = False
+        while True:
+            holder = await state.aupdate(lease, lambda current: current or flight_id, ttl=SINGLE_FLIGHT_LEASE)
+            if holder == flight_id:
+                try:
+                    result = await make_call()
+                    await state.aset(f"{lease}:{flight_id}", self.dump(result), ttl=SINGLE_FLIGHT_LEASE)
+                    return result, False
+                finally:
+                    # Unless it expired and another process has claimed it since
+                    await state.aupdate(lease, lambda current: None if current == flight_id else current, ttl=SINGLE_FLIGHT_LEASE)
+
+            if not joined:
+                joined = True
+                self.coalesced += 1
+                COALESCED.inc(name=self.name, scope="worker")
+                logger.debug("Waiting on %s call in another worker", self.name, extra={"key": key})
+            while True:
+                await asyncio.sleep(SINGLE_FLIGHT_POLL)
+                published = await state.aget(f"{lease}:{holder}")
+                if published is None and await state.aget(lease) != holder:
+                    # Released: the result is published just before, so look once more
+                    published = await state.aget(f"{lease}:{holder}")
+                    if published is None:
+                        break
+                if published is not None:
+                    return self.load(published), True
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,149 @@
+# tracing.py
+import logging
+import os
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Iterator, Optional
+
+from core.metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+# OpenTelemetry spans around stages, GitHub calls and model calls. Spans use
+# the opentelemetry-api package when it is installed and are no-ops until a
+# TracerProvider is configured (by WORKER_TRACING_EXPORTER below, or by
+# running under opentelemetry-instrument). "0" skips them entirely.
+WORKER_TRACING = os.getenv("WORKER_TRACING", "1").lower() not in ("0", "false", "no")
+# "console" or "otlp" installs an SDK TracerProvider at startup; "otlp" also
+# needs opentelemetry-exporter-otlp-proto-http, which is not pinned here
+WORKER_TRACING_EXPORTER = os.getenv("WORKER_TRACING_EXPORTER", "").lower()
+
+STAGE_SECONDS = histogram(
+    "worker_stage_duration_seconds",
+    "Time spent in each stage of README generation",
+    ("stage", "outcome"),
+)
+HTTP_SECONDS = histogram(
+    "worker_http_request_duration_seconds",
+    "Worker endpoint latency, including streamed bodies",
+    ("route", "method", "status"),
+)
+
+
+@lru_cache(maxsize=1)
+def get_tracer():
+    """The worker's tracer, or None when tracing is off or opentelemetry is missing"""
+    if not WORKER_TRACING:
+        return None
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return None
+    return trace.get_tracer("shards-python-worker")
+
+
+def configure_tracing() -> None:
+    """Install an SDK TracerProvider for WORKER_TRACING_EXPORTER, if one is set"""
+    if not WORKER_TRACING or WORKER_TRACING_EXPORTER not in ("console", "otlp"):
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+        if WORKER_TRACING_EXPORTER == "otlp":
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+            exporter = OTLPSpanExporter()
+        else:
+            exporter = ConsoleSpanExporter()
+    except ImportError as e:
+        logger.warning("Tracing exporter %s unavailable: %s", WORKER_TRACING_EXPORTER, e)
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "shards-python-worker")}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+
+def _attributes(attributes: dict) -> dict:
+    return {key: value for key, value in attributes.items() if value is not None}
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Any]]:
+    """Current span for the block (None when tracing is off)"""
+    tracer = get_tracer()
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name, attributes=_attributes(attributes)) as current:
+        yield current
+
+
+def start_span(name: str, **attributes: Any):
+    """Span ended later by end_span(), for work that outlives a with block (streams)"""
+    tracer = get_tracer()
+    return tracer.start_span(name, attributes=_attributes(attributes)) if tracer is not None else None
+
+
+def end_span(current, error: Optional[BaseException] = None, **attributes: Any) -> None:
+    if current is None:
+        return
+    for key, value in _attributes(attributes).items():
+        current.set_attribute(key, value)
+    if error is not None:
+        from opentelemetry.trace import Status, StatusCode
+
+        current.record_exception(error)
+        current.set_status(Status(StatusCode.ERROR, type(error).__name__))
+    current.end()
+
+
+@contextmanager
+def stage(name: str, **attributes: Any) -> Iterator[None]:
+    """Time a pipeline stage into worker_stage_duration_seconds, inside a span"""
+    start = time.perf_counter()
+    outcome = "ok"
+    with span(f"readme.{name}", **attributes):
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=name, outcome=outcome)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware recording each request's duration by route template, so
+    /jobs/{job_id} is one series rather than one per job.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_SECONDS.observe(
+                time.perf_counter() - start,
+                route=getattr(route, "path", "unmatched"),
+                method=scope["method"],
+                status=str(status["code"]),
+            )
@@ -0,0 +1,38 @@
+# gunicorn.conf.py
+"""
+Multi-process deployment, one uvicorn event loop per CPU core:
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Workers share caches, GitHub quotas, in-flight calls and job claims
+through SHARED_STATE, a SQLite file under .cache/ by default; use
+SHARED_STATE=redis with SHARED_STATE_URL when workers run on more than
+one host. Jobs default to the SQLite store so any worker can answer for
+them. LLM_RPM / LLM_TPM stay account-wide and are split between workers.
+/metrics adds up every worker's metrics through files in METRICS_DIR.
+"""
+import multiprocessing
+import os
+import shutil
+
+# The app reads WEB_CONCURRENCY too, to split per-account budgets
+workers = int(os.environ.setdefault("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+os.environ.setdefault("SHARED_STATE", "sqlite")
+os.environ.setdefault("JOB_STORE", "sqlite")
+os.environ.setdefault("METRICS_DIR", os.path.join(".cache", "metrics"))
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+# Each worker imports the app itself, so no client, socket or SQLite
+# connection is carried across the fork
+preload_app = False
+# A worker whose event loop stops answering the arbiter this long is restarted
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+
+
+def on_starting(server):
+    # Totals from a previous run would otherwise be added to this one's.
+    # (core.metrics is not imported here: the workers fork from this
+    # process and must read METRICS_DIR themselves)
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
@@ -1,8 +1,11 @@
-import os
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from enum import Enum
-from openai import OpenAI
+from llm.response_cache import cached_chat_completion, is_cache_hit
+from llm.gateway import StreamedCompletion
+from llm.scheduler import PRIORITY_INTERACTIVE
+from llm.json_stream import JsonArrayStreamParser
+from llm.tokens import CreditBudget
 
 class ComplexityLevel(Enum):
     BEGINNER = "beginner"
@@ -10,31 +13,29 @@ class ComplexityLevel(Enum):
     ADVANCED = "advanced"
     ANY = "any"
 
-class IdeaGenerator:
-    def __init__(self):
-        # Initialize OpenAI client
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable is required")
-        self.client = OpenAI(api_key=api_key)
-    
+# Static prompt parts, built once at import; requests only fill in the fields
+TIME_ESTIMATES = {
+    ComplexityLevel.BEGINNER: "1-2 weeks",
+    ComplexityLevel.INTERMEDIATE: "1-3 months",
+    ComplexityLevel.ADVANCED: "3-6 months",
+    ComplexityLevel.ANY: "variable time commitment"
+}
 
-    def _build_prompt(self, topic: str, skills: str, complexity: ComplexityLevel) -> str:
+IDEA_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "You are a helpful assistant designed to output JSON. "
+        "Generate software project ideas based on the user's prompt. "
+        "Your entire output must be a single, valid JSON object with an 'ideas' key, "
+        "which contains an array of idea objects."
+    ),
+}
 
-        complexity_map = {
-            ComplexityLevel.BEGINNER: "1-2 weeks",
-            ComplexityLevel.INTERMEDIATE: "1-3 months", 
-            ComplexityLevel.ADVANCED: "3-6 months",
-            ComplexityLevel.ANY: "variable time commitment"
-        }
-        
-        time_estimate = complexity_map.get(complexity, "variable time commitment")
-        
-        prompt= f"""
+IDEA_PROMPT_TEMPLATE = """
             Generate 10 software project ideas based on the following criteria:
             - Topic/Interest: {topic}
             - Required Skills: {skills}
-            - Complexity Level: {complexity.value}
+            - Complexity Level: {complexity}
             - Estimated Completion Time: {time_estimate}
             
             For each idea, provide:
@@ -63,55 +64,101 @@ class IdeaGenerator:
             - Avoid generic or overused ideas (e.g., to-do apps, calculators, blog platforms). Only suggest unique, creative projects
             that would stand out and impress in real-world technical people.
         """
-        return prompt
 
-    def generate_ideas(self, topic: str, skills: str, complexity: ComplexityLevel, max_tokens: int) -> Dict[str, Any]:
-        print("idea_generator: func generate_ideas begun")
+_idea_generator: Optional["IdeaGenerator"] = None
+
+class IdeaGenerator:
+    """Stateless; one instance serves every request (see get_idea_generator)"""
+
+    def _build_prompt(self, topic: str, skills: str, complexity: ComplexityLevel) -> str:
+        return IDEA_PROMPT_TEMPLATE.format(
+            topic=topic,
+            skills=skills,
+            complexity=complexity.value,
+            time_estimate=TIME_ESTIMATES.get(complexity, "variable time commitment")
+        )
+
+    def _build_messages(self, prompt: str) -> List[Dict[str, str]]:
+        return [
+            IDEA_SYSTEM_MESSAGE,
+            {
+                "role": "user",
+                "content": prompt,
+            },
+        ]
+
+    async def generate_ideas(self, topic: str, skills: str, complexity: ComplexityLevel, user_credits: Optional[int], use_cache: bool = True) -> Dict[str, Any]:
         prompt = self._build_prompt(topic, skills, complexity)
-        print("Prompt generated")
+        messages = self._build_messages(prompt)
+        # Raises InsufficientCreditsError before the call if the user can't afford it
+        reservation = CreditBudget(user_credits).reserve("ideas", messages)
         
-        response = self.client.chat.completions.create(
+        response = await cached_chat_completion(
             model="gpt-4o-mini",
+            priority=PRIORITY_INTERACTIVE,
             response_format={"type": "json_object"},
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a helpful assistant designed to output JSON. "
-                        "Generate software project ideas based on the user's prompt. "
-                        "Your entire output must be a single, valid JSON object with an 'ideas' key, "
-                        "which contains an array of idea objects."
-                    ),
-                },
-                {
-                    "role": "user",
-                    "content": prompt,
-                },
-            ],
+            messages=messages,
             temperature=0.7,
-            max_tokens=max_tokens
+            use_cache=use_cache,
+            **reservation.as_kwargs()
         )
 
         content = response.choices[0].message.content
-        print("Response stored")
         
         # Check if response was truncated due to token limit
         if response.choices[0].finish_reason == "length":
             return {
                 "error": "insufficient_credits",
-                "message": "Not enough AI credits to complete the generation"
+                "message": "Not enough AI credits to complete the generation",
+                "used_credits": response.usage.total_tokens if response.usage else 0
             }
         
         # This line will now reliably parse the JSON content.
         ideas_data = json.loads(content)
-        print("Response converted to JSON")
 
         # Add IDs to ideas
         for i, idea in enumerate(ideas_data.get("ideas", [])):
             idea["id"] = i + 1
-        print("IDs indexed")
 
         return {
             "ideas": ideas_data.get("ideas", []),
-            "used_credits": response.usage.total_tokens if response.usage else 0
-        }
\ No newline at end of file
+            "used_credits": response.usage.total_tokens if response.usage else 0,
+            "cache_hit": is_cache_hit(response)
+        }
+
+    async def stream_ideas(self, topic: str, skills: str, complexity: ComplexityLevel, user_credits: Optional[int]):
+        """Yield ("idea", idea) as each idea object closes, then ("done", {...}) or ("error", {...})"""
+        messages = self._build_messages(self._build_prompt(topic, skills, complexity))
+        reservation = CreditBudget(user_credits).reserve("ideas", messages)
+        completion = StreamedCompletion(
+            model="gpt-4o-mini",
+            priority=PRIORITY_INTERACTIVE,
+            response_format={"type": "json_object"},
+            messages=messages,
+            temperature=0.7,
+            **reservation.as_kwargs()
+        )
+        parser = JsonArrayStreamParser("ideas")
+        count = 0
+
+        async for delta in completion:
+            for idea in parser.feed(delta):
+                count += 1
+                idea["id"] = count
+                yield "idea", idea
+
+        if completion.finish_reason == "length":
+            yield "error", {
+                "error": "insufficient_credits",
+                "message": "Not enough AI credits to complete the generation",
+                "used_credits": completion.total_tokens
+            }
+            return
+
+        yield "done", {"count": count, "used_credits": completion.total_tokens, "success": True}
+
+def get_idea_generator() -> IdeaGenerator:
+    global _idea_generator
+    if _idea_generator is None:
+        _idea_generator = IdeaGenerator()
+    return _idea_generator
@@ -0,0 +1,100 @@
+# routes.py
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from core.api import insufficient_credits_response, model_busy_response, service, truncated_response, verify_api_key
+from core.sse import SSE_HEADERS, sse_event
+from idea_lab.idea_generator import ComplexityLevel, IdeaGenerator, get_idea_generator
+from llm.scheduler import ModelBusyError
+from llm.tokens import InsufficientCreditsError
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+class IdeaGeneratorRequest(BaseModel):
+    topic: str
+    skills: str
+    complexity: str
+    use_cache: bool = True
+
+@router.post("/idea-generator")
+async def idea_generator(
+    req: IdeaGeneratorRequest,
+    request: Request,
+    generator: IdeaGenerator = Depends(service(get_idea_generator)),
+    auth=Depends(verify_api_key)
+):
+    try:
+        complexity = ComplexityLevel(req.complexity.lower())
+        
+        user_credits = int(request.headers.get("X-User-Credits", 0))
+        
+        if user_credits <= 0:
+            return JSONResponse(
+                status_code=402,
+                content={
+                    "error": "insufficient_credits",
+                    "message": "Not enough AI credits"
+                }
+            )
+        
+        result = await generator.generate_ideas(req.topic, req.skills, complexity, user_credits, req.use_cache)
+        
+        if "error" in result and result["error"] == "insufficient_credits":
+            return truncated_response(result.get("used_credits", 0))
+            
+        return {
+            "ideas": result["ideas"],
+            "used_credits": result.get("used_credits", 0),
+            "cache_hit": result.get("cache_hit", False),
+            "success": True
+        }
+    except InsufficientCreditsError as e:
+        return insufficient_credits_response(e)
+    except ModelBusyError as e:
+        return model_busy_response(e)
+    except Exception as e:
+        logger.exception("Error in idea generator")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/idea-generator/stream")
+async def idea_generator_stream(
+    req: IdeaGeneratorRequest,
+    request: Request,
+    generator: IdeaGenerator = Depends(service(get_idea_generator)),
+    auth=Depends(verify_api_key)
+):
+    try:
+        complexity = ComplexityLevel(req.complexity.lower())
+    except Exception as e:
+        logger.exception("Error in idea generator")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    user_credits = int(request.headers.get("X-User-Credits", 0))
+    
+    if user_credits <= 0:
+        return JSONResponse(
+            status_code=402,
+            content={
+                "error": "insufficient_credits",
+                "message": "Not enough AI credits"
+            }
+        )
+    
+    async def events():
+        try:
+            async for event, data in generator.stream_ideas(req.topic, req.skills, complexity, user_credits):
+                yield sse_event(event, data)
+        except InsufficientCreditsError as e:
+            yield sse_event("error", {"error": "insufficient_credits", "message": str(e), "required_credits": e.required})
+        except ModelBusyError:
+            yield sse_event("error", {"error": "model_busy", "message": "The AI service is busy, please try again shortly"})
+        except Exception as e:
+            logger.exception("Error in idea generator stream")
+            yield sse_event("error", {"error": "generation_failed", "message": str(e)})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,30 @@
+# handlers.py
+from typing import Any, Dict
+
+from jobs.queue import JobFailed, JobQueue, ProgressFn
+from models import ReadmeRequest
+from readme.readme_builder import generate_readme
+
+README_JOB = "readme-builder"
+
+
+async def readme_job(payload: Dict[str, Any], secrets: Dict[str, Any], progress: ProgressFn) -> Dict[str, Any]:
+    request_fields = {k: v for k, v in payload.items() if k != "user_credits"}
+    req = ReadmeRequest(**request_fields, github_token=secrets.get("github_token"))
+    result = await generate_readme(req, progress=progress, user_credits=payload.get("user_credits"))
+
+    if "error" in result:
+        # Tokens already spent on the attempt are still billed
+        raise JobFailed(result["error"], {"error": result["error"], "used_credits": result.get("used_credits", 0)})
+
+    response = {
+        "readme": result["readme"],
+        "used_credits": result.get("used_credits", 0),
+    }
+    if req.include_analysis:
+        response["analysis"] = result.get("analysis")
+    return response
+
+
+def register_job_handlers(queue: JobQueue) -> None:
+    queue.register(README_JOB, readme_job)
@@ -0,0 +1,239 @@
+# queue.py
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from core.shared_state import WORKER_PROCESSES, SharedState, open_shared_state
+from jobs.store import FAILED, FINISHED_STATES, QUEUED, RUNNING, SUCCEEDED, Job, JobStore, create_job_store
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_STORE = os.getenv("JOB_STORE", "memory")
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH")
+# A worker process's claim on a job is renewed while the job runs and lapses
+# this long after the process stops; on start, only jobs nobody holds a
+# claim on are re-queued
+JOB_CLAIM_TTL = float(os.getenv("JOB_CLAIM_TTL", "600"))
+# How often events for a job running in another worker process are read from the store
+JOB_EVENTS_POLL = float(os.getenv("JOB_EVENTS_POLL", "1"))
+# Finished jobs (and their results) are deleted this long after they finish,
+# checked every JOB_SWEEP_INTERVAL seconds
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "86400"))
+JOB_SWEEP_INTERVAL = float(os.getenv("JOB_SWEEP_INTERVAL", "300"))
+
+ProgressFn = Callable[[str], None]
+# handler(payload, secrets, progress) -> result; raising marks the job failed
+JobHandler = Callable[[Dict[str, Any], Dict[str, Any], ProgressFn], Awaitable[Dict[str, Any]]]
+
+
+class JobFailed(Exception):
+    """Raised by a handler to fail a job while keeping a result, e.g. the credits it used"""
+
+    def __init__(self, message: str, result: Dict[str, Any]):
+        self.result = result
+        super().__init__(message)
+
+
+class JobQueue:
+    """
+    In-process job queue drained by a bounded pool of asyncio workers.
+
+    Job state goes through a JobStore, so with the SQLite store anything queued
+    or running when the process stopped is queued again on start(). Secrets
+    such as GitHub tokens are kept in memory only and are not persisted;
+    recovered jobs fall back to the server's GITHUB_TOKEN.
+
+    With several worker processes on one store, each job is claimed by the
+    process running it (through SharedState), so a restarting process does
+    not re-queue work another one is still doing, and events for a job are
+    followed through the store from whichever process the client reaches.
+    """
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS, claims: Optional[SharedState] = None):
+        self.store = store
+        self.workers = workers
+        self._claims = claims or open_shared_state("job_claims", ttl=JOB_CLAIM_TTL)
+        self._owner = uuid.uuid4().hex
+        self._local: Set[str] = set()
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._handlers: Dict[str, JobHandler] = {}
+        self._secrets: Dict[str, Dict[str, Any]] = {}
+        self._listeners: Dict[str, List["asyncio.Queue[Tuple[str, Dict[str, Any]]]"]] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        for job in await self.store.aunfinished():
+            if not await self._claim(job.id):
+                continue
+            logger.info("Re-queueing job %s (%s) left %s by a previous run", job.id, job.kind, job.status)
+            job.status = QUEUED
+            job.stage = None
+            await self.store.asave(job)
+            self._local.add(job.id)
+            self._queue.put_nowait(job.id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Unfinished jobs are free for the next process that starts
+        for job_id in self._local:
+            await self._claims.aupdate(job_id, lambda claim: None if self._owns(claim) else claim)
+
+    async def submit(self, kind: str, payload: Dict[str, Any], secrets: Optional[Dict[str, Any]] = None) -> Job:
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+        job = Job(kind=kind, payload=payload)
+        await self._claim(job.id)
+        await self.store.asave(job)
+        self._local.add(job.id)
+        if secrets:
+            self._secrets[job.id] = secrets
+        self._queue.put_nowait(job.id)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self.store.aget(job_id)
+
+    def _owns(self, claim: Optional[Dict[str, Any]]) -> bool:
+        return bool(claim) and claim["owner"] == self._owner
+
+    async def _claim(self, job_id: str) -> bool:
+        """Claim the job for this process, or renew our claim; False if another process holds it"""
+        def claim_or_renew(claim: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            if claim and not self._owns(claim):
+                return claim
+            # A new renewal time, so the write (and its TTL) goes through
+            return {"owner": self._owner, "renewed_at": time.time()}
+
+        return self._owns(await self._claims.aupdate(job_id, claim_or_renew))
+
+    async def _renew_claim(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(JOB_CLAIM_TTL / 3)
+            await self._claim(job_id)
+
+    async def events(self, job_id: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Yield ("status" | "stage" | "done", data) for a job until it finishes"""
+        listener: "asyncio.Queue[Tuple[str, Dict[str, Any]]]" = asyncio.Queue()
+        self._listeners.setdefault(job_id, []).append(listener)
+        try:
+            job = await self.store.aget(job_id)
+            if job is None:
+                return
+            yield "status", job.status_dict()
+            if job.status in FINISHED_STATES:
+                yield "done", self._done_payload(job)
+                return
+            if job_id not in self._local:
+                async for event, data in self._follow(job):
+                    yield event, data
+                return
+            while True:
+                event, data = await listener.get()
+                yield event, data
+                if event == "done":
+                    return
+        finally:
+            listeners = self._listeners.get(job_id, [])
+            if listener in listeners:
+                listeners.remove(listener)
+            if not listeners:
+                self._listeners.pop(job_id, None)
+
+    async def _follow(self, job: Job) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Events for a job another worker process runs, from its saved state"""
+        status, stage = job.status, job.stage
+        while True:
+            await asyncio.sleep(JOB_EVENTS_POLL)
+            job = await self.store.aget(job.id)
+            if job is None:
+                return
+            if job.status != status and job.status not in FINISHED_STATES:
+                status = job.status
+                yield "status", job.status_dict()
+            if job.stage != stage and job.stage:
+                stage = job.stage
+                yield "stage", {"job_id": job.id, "stage": stage}
+            if job.status in FINISHED_STATES:
+                yield "done", self._done_payload(job)
+                return
+
+    def _publish(self, job_id: str, event: str, data: Dict[str, Any]) -> None:
+        for listener in self._listeners.get(job_id, []):
+            listener.put_nowait((event, data))
+
+    def _done_payload(self, job: Job) -> Dict[str, Any]:
+        return {**job.status_dict(), "result": job.result}
+
+    async def _sweep(self) -> None:
+        while True:
+            purged = await self.store.apurge(time.time() - JOB_RETENTION)
+            if purged:
+                logger.info("Deleted %d finished jobs older than %.0fs", purged, JOB_RETENTION)
+            await asyncio.sleep(JOB_SWEEP_INTERVAL)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = await self.store.aget(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return
+        # Stage saves run in the background, since progress is a plain callback
+        saving: List[asyncio.Task] = []
+
+        def progress(stage: str) -> None:
+            job.stage = stage
+            saving.append(asyncio.create_task(self.store.asave(job)))
+            self._publish(job.id, "stage", {"job_id": job.id, "stage": stage})
+
+        job.status = RUNNING
+        await self.store.asave(job)
+        self._publish(job.id, "status", job.status_dict())
+
+        renew = asyncio.create_task(self._renew_claim(job.id))
+        try:
+            job.result = await self._handlers[job.kind](job.payload, self._secrets.get(job.id, {}), progress)
+            job.status = SUCCEEDED
+        except asyncio.CancelledError:
+            # Shutting down: leave it "running" so the next start() re-queues it
+            raise
+        except Exception as e:
+            logger.warning("Job %s (%s) failed: %s", job.id, job.kind, e)
+            job.status = FAILED
+            job.error = str(e)
+            if isinstance(e, JobFailed):
+                job.result = e.result
+        finally:
+            renew.cancel()
+            if job.status in FINISHED_STATES:
+                self._secrets.pop(job.id, None)
+
+        # A late stage save must not overwrite the final state
+        await asyncio.gather(*saving, return_exceptions=True)
+        await self.store.asave(job)
+        self._publish(job.id, "done", self._done_payload(job))
+        self._local.discard(job.id)
+        await self._claims.adelete(job.id)
+
+
+def create_job_queue() -> JobQueue:
+    if WORKER_PROCESSES > 1 and JOB_STORE == "memory":
+        logger.warning("JOB_STORE=memory with %d worker processes: a job is only visible to the process that took it", WORKER_PROCESSES)
+    return JobQueue(create_job_store(JOB_STORE, JOB_STORE_PATH), workers=JOB_WORKERS)
@@ -0,0 +1,59 @@
+# routes.py
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from core.api import verify_api_key
+from core.sse import SSE_HEADERS, sse_event
+from jobs.handlers import README_JOB
+from models import ReadmeRequest
+
+router = APIRouter()
+
+@router.post("/jobs/readme-builder", status_code=202)
+async def submit_readme_job(req: ReadmeRequest, request: Request, auth=Depends(verify_api_key)):
+    user_credits = int(request.headers.get("X-User-Credits", 0))
+    
+    if user_credits <= 0:
+        return JSONResponse(
+            status_code=402,
+            content={
+                "error": "insufficient_credits",
+                "message": "Not enough AI credits"
+            }
+        )
+    
+    job = await request.app.state.job_queue.submit(
+        README_JOB,
+        {**req.dict(exclude={"github_token"}), "user_credits": user_credits},
+        secrets={"github_token": req.github_token} if req.github_token else None
+    )
+    return {"job_id": job.id, "status": job.status, "success": True}
+
+async def get_job_or_404(request: Request, job_id: str):
+    job = await request.app.state.job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str, request: Request, auth=Depends(verify_api_key)):
+    return (await get_job_or_404(request, job_id)).status_dict()
+
+@router.get("/jobs/{job_id}/result")
+async def job_result(job_id: str, request: Request, auth=Depends(verify_api_key)):
+    job = await get_job_or_404(request, job_id)
+    if job.status == "failed":
+        return JSONResponse(status_code=500, content={"detail": job.error, **(job.result or {})})
+    if job.status != "succeeded":
+        return JSONResponse(status_code=202, content=job.status_dict())
+    return {**job.result, "success": True}
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, auth=Depends(verify_api_key)):
+    await get_job_or_404(request, job_id)
+    
+    async def events():
+        async for event, data in request.app.state.job_queue.events(job_id):
+            yield sse_event(event, data)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,173 @@
+# store.py
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+
+@dataclass
+class Job:
+    kind: str
+    payload: Dict[str, Any]
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = QUEUED
+    stage: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def status_dict(self) -> Dict[str, Any]:
+        """Job state without the (possibly large) result and the request payload"""
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobStore(ABC):
+    """
+    Where job state lives. The queue calls the async methods from the event
+    loop; by default they run the blocking ones in a worker thread.
+    """
+
+    @abstractmethod
+    def save(self, job: Job) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        ...
+
+    @abstractmethod
+    def unfinished(self) -> List[Job]:
+        ...
+
+    @abstractmethod
+    def purge(self, finished_before: float) -> int:
+        """Delete succeeded and failed jobs last updated before the given time; returns how many"""
+        ...
+
+    async def asave(self, job: Job) -> None:
+        await asyncio.to_thread(self.save, job)
+
+    async def aget(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self.get, job_id)
+
+    async def aunfinished(self) -> List[Job]:
+        return await asyncio.to_thread(self.unfinished)
+
+    async def apurge(self, finished_before: float) -> int:
+        return await asyncio.to_thread(self.purge, finished_before)
+
+
+class MemoryJobStore(JobStore):
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+
+    def save(self, job: Job) -> None:
+        job.updated_at = time.time()
+        self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def unfinished(self) -> List[Job]:
+        return [job for job in self._jobs.values() if job.status not in FINISHED_STATES]
+
+    def purge(self, finished_before: float) -> int:
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in FINISHED_STATES and job.updated_at < finished_before
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        return len(expired)
+
+    # In memory, so there is nothing to move off the event loop
+
+    async def asave(self, job: Job) -> None:
+        self.save(job)
+
+    async def aget(self, job_id: str) -> Optional[Job]:
+        return self.get(job_id)
+
+    async def aunfinished(self) -> List[Job]:
+        return self.unfinished()
+
+    async def apurge(self, finished_before: float) -> int:
+        return self.purge(finished_before)
+
+
+class SQLiteJobStore(JobStore):
+    """Persists jobs so queued and interrupted work is picked up again after a restart"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_updated ON jobs (status, updated_at)")
+
+    def save(self, job: Job) -> None:
+        job.updated_at = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, status, data, updated_at) VALUES (?, ?, ?, ?)",
+                (job.id, job.status, json.dumps(job.to_dict(), default=str), job.updated_at),
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(**json.loads(row[0])) if row else None
+
+    def unfinished(self) -> List[Job]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM jobs WHERE status NOT IN (?, ?) ORDER BY updated_at", FINISHED_STATES
+            ).fetchall()
+        return [Job(**json.loads(row[0])) for row in rows]
+
+    def purge(self, finished_before: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (*FINISHED_STATES, finished_before)
+            )
+        return cursor.rowcount
+
+
+def create_job_store(backend: str = "memory", path: Optional[str] = None) -> JobStore:
+    backend = backend.lower()
+    if backend == "memory":
+        return MemoryJobStore()
+    if backend == "sqlite":
+        return SQLiteJobStore(path or os.path.join(".cache", "jobs.sqlite3"))
+    raise ValueError(f"Unknown job store backend: {backend}")
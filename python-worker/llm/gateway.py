@@ -0,0 +1,177 @@
+# gateway.py
+import asyncio
+import logging
+import os
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from core.metrics import counter
+from core.tracing import end_span, span, start_span
+from llm.scheduler import PRIORITY_DEFAULT, estimate_request_tokens, get_llm_scheduler
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+LLM_TOKENS = counter("llm_tokens_total", "Tokens billed by OpenAI", ("model", "kind"))
+
+# One pooled HTTP client is shared by every feature module so concurrent
+# generations reuse keep-alive connections instead of opening new ones.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+_http_client: Optional[httpx.AsyncClient] = None
+_client: Optional["AsyncOpenAI"] = None
+# Requests arriving while the startup task builds the client wait here,
+# without blocking the event loop
+_client_lock = asyncio.Lock()
+
+
+def _build_llm_client() -> "AsyncOpenAI":
+    """Import openai and build the client; slow, so it runs in a worker thread"""
+    global _http_client, _client
+
+    from openai import AsyncOpenAI
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        ),
+        timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+    )
+    # base_url falls back to OPENAI_BASE_URL, which the benchmarks use
+    # to point the worker at a local fake server.
+    # Retries are left to llm.scheduler, which also adapts concurrency to 429s
+    client = AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=http_client,
+        max_retries=0,
+    )
+    _http_client, _client = http_client, client
+    return client
+
+
+async def get_llm_client() -> "AsyncOpenAI":
+    """
+    Return the process-wide AsyncOpenAI client, creating it on first use.
+
+    The openai package takes longer to import than the rest of the worker,
+    so it is only loaded here, off the event loop; the app lifespan starts
+    this at startup so the first request doesn't pay for it.
+    """
+    if _client is not None:
+        return _client
+    async with _client_lock:
+        if _client is not None:
+            return _client
+        return await asyncio.to_thread(_build_llm_client)
+
+
+async def chat_completion(messages: List[Dict[str, str]], model: str = DEFAULT_MODEL, priority: int = PRIORITY_DEFAULT, **kwargs: Any):
+    """Run a chat completion through the shared scheduler without blocking the event loop"""
+    client = await get_llm_client()
+    with span("llm.chat", **{"gen_ai.request.model": model, "llm.priority": priority}) as current:
+        response = await get_llm_scheduler().call(
+            model,
+            estimate_request_tokens(messages, kwargs.get("max_tokens"), model),
+            priority,
+            lambda: client.chat.completions.create(model=model, messages=messages, **kwargs),
+        )
+        record_usage(model, response.usage, current)
+    return response
+
+
+def record_usage(model: str, usage, current=None) -> None:
+    """Count a completion's prompt and completion tokens (and tag its span)"""
+    if not usage:
+        return
+    LLM_TOKENS.inc(usage.prompt_tokens, model=model, kind="prompt")
+    LLM_TOKENS.inc(usage.completion_tokens, model=model, kind="completion")
+    if current is not None:
+        current.set_attribute("gen_ai.usage.input_tokens", usage.prompt_tokens)
+        current.set_attribute("gen_ai.usage.output_tokens", usage.completion_tokens)
+
+
+class StreamedCompletion:
+    """
+    Streaming chat completion: iterate it for text deltas.
+
+    total_tokens and finish_reason are filled in once the stream has ended.
+    """
+
+    def __init__(self, messages: List[Dict[str, str]], model: str = DEFAULT_MODEL, priority: int = PRIORITY_DEFAULT, **kwargs: Any):
+        self.messages = messages
+        self.model = model
+        self.priority = priority
+        self.kwargs = kwargs
+        self.total_tokens = 0
+        self.finish_reason: Optional[str] = None
+
+    async def __aiter__(self):
+        client = await get_llm_client()
+        scheduler = get_llm_scheduler()
+        current = start_span("llm.chat", **{"gen_ai.request.model": self.model, "llm.priority": self.priority, "llm.stream": True})
+        # Only opening the stream is retried; the slot is held until it ends
+        try:
+            stream, grant = await scheduler.open(
+                self.model,
+                estimate_request_tokens(self.messages, self.kwargs.get("max_tokens"), self.model),
+                self.priority,
+                lambda: client.chat.completions.create(
+                    model=self.model,
+                    messages=self.messages,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **self.kwargs,
+                ),
+            )
+        except BaseException as e:
+            end_span(current, e)
+            raise
+        error = None
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    self.total_tokens = chunk.usage.total_tokens
+                    record_usage(self.model, chunk.usage, current)
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.finish_reason:
+                    self.finish_reason = choice.finish_reason
+                if choice.delta and choice.delta.content:
+                    yield choice.delta.content
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            scheduler.release(grant, used_tokens=self.total_tokens or None, error=error)
+            end_span(current, error, **{"gen_ai.response.finish_reasons": (self.finish_reason,) if self.finish_reason else None})
+
+
+async def start_llm_client() -> None:
+    """Build the client in a worker thread so the openai import doesn't block startup"""
+    try:
+        await get_llm_client()
+    except Exception as e:
+        # e.g. OPENAI_API_KEY missing: the features that need it fail on use
+        logger.warning("OpenAI client not ready: %s", e)
+
+
+async def close_llm_client():
+    """Close the shared HTTP pool; the next call will open a fresh one"""
+    global _http_client, _client
+
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = None
+    _client = None
@@ -0,0 +1,78 @@
+# json_stream.py
+import json
+from typing import Any, List, Optional
+
+
+class JsonArrayStreamParser:
+    """
+    Incrementally parse a streamed JSON object and emit the items of one of
+    its top-level arrays as soon as each item closes.
+
+        parser = JsonArrayStreamParser("content")
+        for chunk in chunks:
+            for node in parser.feed(chunk):
+                ...
+
+    Only object/array items are emitted, which covers TipTap nodes in
+    {"type": "doc", "content": [...]} and ideas in {"ideas": [...]}. The full
+    text is kept so the caller can still json.loads() the whole document.
+    """
+
+    def __init__(self, array_key: str):
+        self.array_key = array_key
+        self._text: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key_chars: Optional[List[str]] = None
+        self._last_key: Optional[str] = None
+        self._in_array = False
+        self._item: Optional[List[str]] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self._text)
+
+    def feed(self, chunk: str) -> List[Any]:
+        self._text.append(chunk)
+        items = []
+        for c in chunk:
+            if self._item is not None:
+                self._item.append(c)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._key_chars is not None:
+                        self._last_key = "".join(self._key_chars)
+                        self._key_chars = None
+                elif self._key_chars is not None:
+                    self._key_chars.append(c)
+                continue
+
+            if c == '"':
+                self._in_string = True
+                # Strings directly inside the root object are keys (or values; the
+                # value case is harmless because only "key": [ opens the array)
+                if self._depth == 1 and not self._in_array:
+                    self._key_chars = []
+            elif c in "{[":
+                self._depth += 1
+                if self._depth == 2 and c == "[" and self._last_key == self.array_key:
+                    self._in_array = True
+                elif self._in_array and self._depth == 3 and self._item is None:
+                    self._item = [c]
+            elif c in "}]":
+                if self._item is not None and self._depth == 3:
+                    items.append(json.loads("".join(self._item)))
+                    self._item = None
+                self._depth -= 1
+                if self._in_array and self._depth == 1:
+                    self._in_array = False
+            elif c == "," and self._depth == 1:
+                self._last_key = None
+        return items
@@ -0,0 +1,122 @@
+# response_cache.py
+import hashlib
+import json
+import os
+import re
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from core.cache import CacheBackend, create_cache
+from core.metrics import counter
+from core.single_flight import SingleFlight
+from llm.gateway import DEFAULT_MODEL, chat_completion
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletion
+
+# Opt-in: "none" (default), "memory", "sqlite" or "shared" (across worker processes)
+LLM_RESPONSE_CACHE = os.getenv("LLM_RESPONSE_CACHE", "none")
+LLM_RESPONSE_CACHE_PATH = os.getenv("LLM_RESPONSE_CACHE_PATH")
+LLM_RESPONSE_CACHE_TTL = float(os.getenv("LLM_RESPONSE_CACHE_TTL", "3600"))
+LLM_RESPONSE_CACHE_ENTRIES = int(os.getenv("LLM_RESPONSE_CACHE_ENTRIES", "1024"))
+LLM_RESPONSE_CACHE_BYTES = int(os.getenv("LLM_RESPONSE_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+# Request parameters that change the completion; anything else (max_tokens,
+# timeouts) does not affect a finished answer and stays out of the key.
+_KEY_PARAMS = ("temperature", "top_p", "response_format", "seed")
+
+_WHITESPACE = re.compile(r"\s+")
+
+RESPONSE_CACHE_LOOKUPS = counter(
+    "llm_response_cache_total",
+    "Completions by how they were served: hit, miss (model called), coalesced or bypass",
+    ("result",),
+)
+
+_response_cache: Optional[CacheBackend] = None
+
+# Identical prompts in flight at the same time share one completion
+_completion_flights = SingleFlight(
+    "completion",
+    dump=lambda response: response.model_dump(mode="json"),
+    load=lambda data: _cached_completion(data),
+)
+
+
+def get_response_cache() -> CacheBackend:
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = create_cache(
+            "llm_responses",
+            backend=LLM_RESPONSE_CACHE,
+            max_entries=LLM_RESPONSE_CACHE_ENTRIES,
+            max_bytes=LLM_RESPONSE_CACHE_BYTES,
+            ttl=LLM_RESPONSE_CACHE_TTL,
+            path=LLM_RESPONSE_CACHE_PATH,
+            disk_max_bytes=LLM_RESPONSE_CACHE_BYTES * 4,
+        )
+    return _response_cache
+
+
+def _normalize(text: str) -> str:
+    # Prompts differing only in case or whitespace map to the same entry
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def response_cache_key(messages: List[Dict[str, str]], model: str, **params: Any) -> str:
+    payload = {
+        "model": model,
+        "messages": [[m.get("role", ""), _normalize(m.get("content") or "")] for m in messages],
+        "params": {name: params.get(name) for name in _KEY_PARAMS},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _cached_completion(data: Dict[str, Any]) -> "ChatCompletion":
+    """Completion for a caller that didn't pay for it: no usage, marked as a hit"""
+    from openai.types.chat import ChatCompletion
+
+    return ChatCompletion.model_validate({**data, "usage": None, "cache_hit": True})
+
+
+def is_cache_hit(response: Any) -> bool:
+    return bool(getattr(response, "cache_hit", False))
+
+
+async def cached_chat_completion(
+    messages: List[Dict[str, str]],
+    model: str = DEFAULT_MODEL,
+    use_cache: bool = True,
+    **kwargs: Any,
+) -> "ChatCompletion":
+    """
+    chat_completion with a response cache and request coalescing in front of it.
+
+    Hits, and callers that joined an identical in-flight request, come back
+    with usage=None (so callers bill 0 tokens) and cache_hit=True. Only
+    completions that finished normally are stored. use_cache=False skips both.
+    """
+    if not use_cache:
+        RESPONSE_CACHE_LOOKUPS.inc(result="bypass")
+        return await chat_completion(messages=messages, model=model, **kwargs)
+
+    key = response_cache_key(messages, model, **kwargs)
+    caching = LLM_RESPONSE_CACHE != "none"
+    if caching:
+        cached = await get_response_cache().aget(key)
+        if cached is not None:
+            RESPONSE_CACHE_LOOKUPS.inc(result="hit")
+            return _cached_completion(cached)
+
+    async def complete() -> "ChatCompletion":
+        response = await chat_completion(messages=messages, model=model, **kwargs)
+        if caching and response.choices and response.choices[0].finish_reason == "stop":
+            await get_response_cache().aset(key, response.model_dump(mode="json", exclude={"usage"}))
+        return response
+
+    # max_tokens comes from each caller's credits, so a smaller cap can't
+    # truncate the answer for someone who could afford more
+    response, shared = await _completion_flights.do(f"{key}:{kwargs.get('max_tokens')}", complete)
+    RESPONSE_CACHE_LOOKUPS.inc(result="coalesced" if shared else "miss")
+    if shared:
+        return _cached_completion(response.model_dump(mode="json"))
+    return response
@@ -0,0 +1,319 @@
+# scheduler.py
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from core.metrics import counter, histogram
+from core.shared_state import per_process
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first. Ideas, stack and competitive analysis have a user
+# waiting on the page; READMEs and repository analysis can queue behind them.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKGROUND = 2
+
+# Account limits per model, split evenly between worker processes; 0 disables that budget
+LLM_RPM = per_process(int(os.getenv("LLM_RPM", "500")))
+LLM_TPM = per_process(int(os.getenv("LLM_TPM", "200000")))
+# AIMD bounds for concurrent requests per model
+LLM_CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", "16"))
+LLM_CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", "1"))
+LLM_CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", "64"))
+# Calls slower than this (to the first byte when streaming) shrink the limit
+LLM_LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "0.5"))
+LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX", "30"))
+
+LLM_QUEUE_SECONDS = histogram("llm_queue_wait_seconds", "Time model calls waited for admission", ("model", "priority"))
+LLM_CALL_SECONDS = histogram("llm_call_duration_seconds", "Model call duration, to the end of the stream when streaming", ("model", "outcome"))
+LLM_RETRIES = counter("llm_retries_total", "Model calls retried after a retryable error", ("model", "error"))
+
+_scheduler: Optional["LLMScheduler"] = None
+
+
+class ModelBusyError(Exception):
+    """OpenAI kept rate limiting the call after every retry"""
+
+    def __init__(self, retry_after: Optional[float] = None):
+        self.retry_after = retry_after
+        super().__init__("The AI service is busy, please try again shortly")
+
+
+@lru_cache(maxsize=1)
+def retryable_errors() -> Tuple[type, ...]:
+    # openai is imported on first use so importing the worker stays cheap
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APIConnectionError,  # includes APITimeoutError
+        openai.InternalServerError,
+    )
+
+
+def is_rate_limit(error: Optional[BaseException]) -> bool:
+    import openai
+
+    return isinstance(error, openai.RateLimitError)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, from retry-after(-ms) headers"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def is_quota_exhausted(error: Exception) -> bool:
+    """429 for an exhausted billing quota, which no amount of waiting fixes"""
+    return is_rate_limit(error) and getattr(error, "code", None) == "insufficient_quota"
+
+
+def backoff_delay(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, never shorter than retry-after"""
+    delay = random.uniform(0, min(LLM_RETRY_MAX, LLM_RETRY_BASE * 2 ** attempt))
+    server_delay = retry_after(error)
+    if server_delay is not None:
+        # Spread the callers that were all told the same retry-after
+        delay = server_delay + random.uniform(0, LLM_RETRY_BASE)
+    return delay
+
+
+def estimate_request_tokens(messages: List[Dict[str, str]], max_tokens: Optional[int], model: str) -> int:
+    """Prompt tokens plus the completion cap, which is what the TPM limit counts"""
+    from llm.tokens import count_message_tokens
+
+    return count_message_tokens(messages, model) + (max_tokens or 0)
+
+
+class TokenBucket:
+    """Refills `per_minute` units evenly over a minute; 0 means unlimited"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: int, now: float) -> float:
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        # Requests larger than the bucket only need it full
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) * 60 / self.capacity
+
+    def take(self, amount: int) -> None:
+        if self.capacity:
+            self.level -= amount
+
+    def give_back(self, amount: int) -> None:
+        if self.capacity:
+            self.level = min(self.capacity, self.level + amount)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+@dataclass
+class Grant:
+    """A started request; hand it back with release()"""
+    model: str
+    tokens: int
+    started: float
+    # Time until the response (or the stream's headers) arrived
+    latency: Optional[float] = None
+
+
+class ModelLane:
+    """
+    Admission for one model: RPM and TPM buckets plus an AIMD concurrency
+    limit. Waiters are admitted strictly by priority, then arrival order.
+    """
+
+    def __init__(self, model: str, rpm: int = LLM_RPM, tpm: int = LLM_TPM):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.limit = float(LLM_CONCURRENCY_INITIAL)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self._last_decrease = 0.0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def acquire(self, tokens: int, priority: int) -> Grant:
+        queued = time.monotonic()
+        waiter = _Waiter(priority, next(self._seq), tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, waiter)
+        self._pump()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as the caller went away
+                self.in_flight -= 1
+                self.requests.give_back(1)
+                self.tokens.give_back(tokens)
+                self._pump()
+            raise
+        started = time.monotonic()
+        LLM_QUEUE_SECONDS.observe(started - queued, model=self.model, priority=str(priority))
+        return Grant(self.model, tokens, started)
+
+    def _pump(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            head = self._waiters[0]
+            if head.future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= int(self.limit):
+                return
+            now = time.monotonic()
+            wait = max(
+                self.blocked_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(head.tokens, now),
+            )
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._pump)
+                return
+            heapq.heappop(self._waiters)
+            self.requests.take(1)
+            self.tokens.take(head.tokens)
+            self.in_flight += 1
+            head.future.set_result(None)
+
+    def release(self, grant: Grant, used_tokens: Optional[int] = None, error: Optional[Exception] = None) -> None:
+        self.in_flight -= 1
+        now = time.monotonic()
+        if used_tokens is not None:
+            # Return what the estimate over-reserved
+            self.tokens.give_back(grant.tokens - used_tokens)
+
+        outcome = "ok" if error is None else "rate_limited" if is_rate_limit(error) else "error"
+        LLM_CALL_SECONDS.observe(now - grant.started, model=self.model, outcome=outcome)
+
+        if outcome == "rate_limited":
+            self.throttled += 1
+            server_delay = retry_after(error)
+            if server_delay:
+                self.blocked_until = max(self.blocked_until, now + server_delay)
+            self._decrease(now, 0.5)
+        elif error is None:
+            latency = grant.latency if grant.latency is not None else now - grant.started
+            if latency > LLM_LATENCY_TARGET:
+                self._decrease(now, 0.9)
+            else:
+                # Additive increase: about +1 per limit's worth of successes
+                self.limit = min(LLM_CONCURRENCY_MAX, self.limit + 1 / self.limit)
+        self._pump()
+
+    def _decrease(self, now: float, factor: float) -> None:
+        # A burst of 429s from one overload halves the limit once, not per error
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self.limit = max(LLM_CONCURRENCY_MIN, self.limit * factor)
+        logger.info("LLM concurrency lowered to %d", int(self.limit), extra={"model": self.model})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "concurrency_limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": sum(1 for w in self._waiters if not w.future.done()),
+            "throttled": self.throttled,
+        }
+
+
+class LLMScheduler:
+    """Shared admission and retry policy for every OpenAI call in the worker"""
+
+    def __init__(self):
+        self._lanes: Dict[str, ModelLane] = {}
+
+    def lane(self, model: str) -> ModelLane:
+        if model not in self._lanes:
+            self._lanes[model] = ModelLane(model)
+        return self._lanes[model]
+
+    async def open(self, model: str, tokens: int, priority: int, make_call: Callable[[], Awaitable[Any]]) -> Tuple[Any, Grant]:
+        """
+        Run make_call once admitted, retrying 429s, timeouts and 5xx with
+        backoff. The slot stays taken until release(), so a stream can keep
+        it while it is read. A 429 that outlasts the retries is raised as
+        ModelBusyError.
+        """
+        lane = self.lane(model)
+        retryable = retryable_errors()
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            grant = await lane.acquire(tokens, priority)
+            try:
+                response = await make_call()
+                grant.latency = time.monotonic() - grant.started
+                return response, grant
+            except retryable as e:
+                lane.release(grant, used_tokens=0, error=e)
+                if attempt == LLM_MAX_RETRIES or is_quota_exhausted(e):
+                    if is_rate_limit(e):
+                        raise ModelBusyError(retry_after(e)) from e
+                    raise
+                delay = backoff_delay(attempt, e)
+                LLM_RETRIES.inc(model=model, error=type(e).__name__)
+                logger.warning("OpenAI call failed (%s), retry %d/%d in %.1fs", type(e).__name__, attempt + 1, LLM_MAX_RETRIES, delay, extra={"model": model})
+                await asyncio.sleep(delay)
+            except BaseException as e:
+                lane.release(grant, used_tokens=0, error=e)
+                raise
+
+    def release(self, grant: Grant, used_tokens: Optional[int] = None, error: Optional[Exception] = None) -> None:
+        self.lane(grant.model).release(grant, used_tokens, error)
+
+    async def call(self, model: str, tokens: int, priority: int, make_call: Callable[[], Awaitable[Any]]) -> Any:
+        """open() and release() around a non-streaming call"""
+        response, grant = await self.open(model, tokens, priority, make_call)
+        usage = getattr(response, "usage", None)
+        self.release(grant, used_tokens=usage.total_tokens if usage else None)
+        return response
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [lane.stats() for lane in self._lanes.values()]
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
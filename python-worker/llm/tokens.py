@@ -0,0 +1,144 @@
+# tokens.py
+import logging
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from llm.gateway import DEFAULT_MODEL
+
+logger = logging.getLogger(__name__)
+
+# Expected completion size per feature, used to reject requests the user
+# cannot afford before any model call is made
+OUTPUT_ESTIMATES = {
+    "readme": 2500,
+    "readme_section": 600,
+    "analysis": 900,
+    "ideas": 1500,
+    "stack": 450,
+    "competitive": 700,
+}
+
+MODEL_MAX_OUTPUT = {
+    "gpt-4o-mini": 16384,
+}
+
+# Chat format overhead (per message and for the reply primer)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+
+class InsufficientCreditsError(Exception):
+    """Raised before a model call when prompt + expected output exceed the user's credits"""
+
+    def __init__(self, feature: str, required: int, available: int):
+        self.feature = feature
+        self.required = required
+        self.available = available
+        super().__init__(f"{feature} needs about {required} credits but only {available} are available")
+
+
+@lru_cache(maxsize=8)
+def _encoder(model: str):
+    """tiktoken encoder for the model, or None when tiktoken or its BPE files are unavailable"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # e.g. no network to fetch the BPE file on first use
+        logger.warning("tiktoken unavailable for %s, estimating tokens from length: %s", model, e)
+        return None
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    encoder = _encoder(model)
+    if encoder is None:
+        # ~4 characters per token for English prose and code
+        return math.ceil(len(text) / 4)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str = DEFAULT_MODEL) -> int:
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        total += TOKENS_PER_MESSAGE + count_tokens(message.get("content") or "", model)
+    return total
+
+
+@dataclass
+class TokenReservation:
+    feature: str
+    prompt_tokens: int
+    max_tokens: Optional[int]
+
+    def as_kwargs(self) -> Dict[str, int]:
+        """Completion kwargs for this reservation (nothing when unlimited)"""
+        return {"max_tokens": self.max_tokens} if self.max_tokens is not None else {}
+
+
+class CreditBudget:
+    """
+    Per-request credit accounting. Each model call reserves its prompt tokens
+    plus an output allowance up front; the call's max_tokens is set from that
+    allowance so the completion can never cost more than the user has.
+
+    A budget created with credits=None is unlimited (internal callers).
+    Shared budgets (one per batch, with up to `slots` calls in flight) give
+    each call an even share of what is left among the slots not yet
+    reserved, never less than the feature's estimate, so concurrent requests
+    can all fit; settle() returns what a call did not use.
+    """
+
+    def __init__(self, credits: Optional[int], model: str = DEFAULT_MODEL, shared: bool = False, slots: int = 1):
+        self.credits = credits
+        self.model = model
+        self.shared = shared
+        self.slots = slots
+        self.remaining = credits
+        self.used = 0
+        # Reservations not settled yet
+        self.open = 0
+
+    def reserve(self, feature: str, messages: List[Dict[str, str]], exact: bool = False) -> TokenReservation:
+        """
+        Reserve credits for one call.
+
+        With exact=True the output allowance is the feature's estimate, leaving
+        the rest for later reservations; otherwise the call gets everything left
+        (its share, on a shared budget), up to the model's output limit.
+        """
+        prompt_tokens = count_message_tokens(messages, self.model)
+        model_cap = MODEL_MAX_OUTPUT.get(self.model, 16384)
+        if self.remaining is None:
+            return TokenReservation(feature, prompt_tokens, None)
+
+        estimate = OUTPUT_ESTIMATES.get(feature, 1000)
+        required = prompt_tokens + estimate
+        if required > self.remaining:
+            raise InsufficientCreditsError(feature, required, self.remaining)
+
+        if exact:
+            max_tokens = estimate
+        elif self.shared:
+            share = self.remaining // max(self.slots - self.open, 1) - prompt_tokens
+            max_tokens = max(estimate, share)
+        else:
+            max_tokens = self.remaining - prompt_tokens
+        max_tokens = min(max_tokens, model_cap)
+        self.remaining -= prompt_tokens + max_tokens
+        self.open += 1
+        return TokenReservation(feature, prompt_tokens, max_tokens)
+
+    def settle(self, reservation: TokenReservation, used_tokens: int) -> None:
+        """Record what a call actually used and give back the rest of its reservation"""
+        self.used += used_tokens
+        if self.remaining is None or reservation.max_tokens is None:
+            return
+        self.open -= 1
+        self.remaining += reservation.prompt_tokens + reservation.max_tokens - used_tokens
@@ -1,232 +1,103 @@
-from fastapi import FastAPI, Request, HTTPException, Depends
-from fastapi.responses import JSONResponse
-from models import ReadmeRequest, ReadmeResponse
-from readme.readme_builder import generate_readme
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Request
+from fastapi.responses import PlainTextResponse
+import asyncio
+import importlib
+import logging
 import os
-from readme.github_service import (
-    fetch_important_files,
-    fetch_repo_metadata,
-    normalize_github_metadata,
-)
-from readme.analysis_service import analyze_repository
-from idea_lab.idea_generator import IdeaGenerator, ComplexityLevel
-from stackgenerator.stack_generator import StackGenerator, StackRequest
-from competitiveanalysis.competitive_analysis import CompetitiveAnalyzer, CompetitiveAnalysisRequest
-from pydantic import BaseModel
+from core.api import verify_api_key
+from core.log import configure_logging
+from core.metrics import METRICS_DIR, clear_metrics_dir, publish_metrics_forever, render_metrics
+from core.shared_state import SHARED_STATE, WORKER_PROCESSES, shared_state_enabled
+from core.tracing import RequestMetricsMiddleware, configure_tracing
+from readme.github_client import start_github_client, close_github_client
+from llm.gateway import start_llm_client, close_llm_client
+from llm.scheduler import get_llm_scheduler
 
-app = FastAPI()
+# Endpoints are grouped per feature; a worker only imports the features it
+# serves (e.g. WORKER_FEATURES=readme,jobs for a README-only deployment)
+FEATURE_ROUTERS = {
+    "readme": "readme.routes",
+    "jobs": "jobs.routes",
+    "ideas": "idea_lab.routes",
+    "stack": "stackgenerator.routes",
+    "competitive": "competitiveanalysis.routes",
+}
+WORKER_FEATURES = [
+    name.strip() for name in os.getenv("WORKER_FEATURES", ",".join(FEATURE_ROUTERS)).split(",") if name.strip()
+]
+# Prometheus scrapers can't always send X-API-Key; "0" serves /metrics without it
+METRICS_REQUIRE_API_KEY = os.getenv("METRICS_REQUIRE_API_KEY", "1").lower() not in ("0", "false", "no")
 
-API_KEY = os.getenv("WORKER_API_KEY")
+configure_logging()
+configure_tracing()
+logger = logging.getLogger(__name__)
 
-class IdeaGeneratorRequest(BaseModel):
-    topic: str
-    skills: str
-    complexity: str
+if WORKER_PROCESSES > 1 and not shared_state_enabled():
+    logger.warning(
+        "%d worker processes with SHARED_STATE=%s: caches, GitHub quotas and in-flight calls are per process",
+        WORKER_PROCESSES,
+        SHARED_STATE,
+    )
 
-class StackGeneratorRequest(BaseModel):
-    project_type: str
-    requirements: str
-    preferences: str
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clients live as long as the app: one pooled GitHub client instead of
+    # one per call, and the OpenAI client, which is built in the background
+    # so the worker accepts requests while the openai package loads
+    llm_ready = asyncio.create_task(start_llm_client())
+    metrics_publisher = asyncio.create_task(publish_metrics_forever()) if METRICS_DIR else None
+    app.state.github_client = await start_github_client()
+    # Background jobs for long-running generations
+    if "jobs" in WORKER_FEATURES:
+        from jobs.queue import create_job_queue
+        from jobs.handlers import register_job_handlers
 
-def verify_api_key(request: Request):
-    key = request.headers.get("X-API-Key")
-    if not key or key != API_KEY:
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    return True
+        app.state.job_queue = create_job_queue()
+        register_job_handlers(app.state.job_queue)
+        await app.state.job_queue.start()
+    yield
+    await llm_ready
+    if "jobs" in WORKER_FEATURES:
+        await app.state.job_queue.stop()
+    await close_github_client()
+    await close_llm_client()
+    if metrics_publisher is not None:
+        metrics_publisher.cancel()
 
-@app.post("/readme-builder")
-async def readme_builder(req: ReadmeRequest, request: Request, auth=Depends(verify_api_key)):
-    print("README builder endpoint called")
-    try:
-        # Get user credits from headers
-        user_credits = int(request.headers.get("X-User-Credits", 0))
-        
-        if user_credits <= 0:
-            return JSONResponse(
-                status_code=402,
-                content={
-                    "error": "insufficient_credits",
-                    "message": "Not enough AI credits"
-                }
-            )
-        
-        result = await generate_readme(req)
-        
-        # Check if generation was successful
-        if "error" in result:
-            if result["error"] == "insufficient_credits":
-                return JSONResponse(
-                    status_code=402,
-                    content={
-                        "error": "insufficient_credits",
-                        "message": "Not enough AI credits to complete generation"
-                    }
-                )
-            else:
-                raise HTTPException(status_code=500, detail=result["error"])
-        
-        # Extract the readme content and used credits
-        readme_content = result.get("readme")
-        used_credits = result.get("used_credits", 0)
-        
-        # Validate the readme content structure
-        if not isinstance(readme_content, dict) or readme_content.get("type") != "doc":
-            print(f"Invalid readme structure: {readme_content}")
-            raise HTTPException(status_code=500, detail="Invalid README structure generated")
-        
-        # Return the direct TipTap JSON structure without nesting
-        return {
-            "readme": readme_content,  # This is the direct TipTap JSON
-            "used_credits": used_credits,
-            "success": True
-        }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Error in readme builder: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestMetricsMiddleware)
 
-@app.post("/repository-analysis")
-async def repository_analysis(req: ReadmeRequest, auth=Depends(verify_api_key)):
-    try:
-        github_token = req.github_token
-        raw_metadata = await fetch_repo_metadata(req.github_repo, github_token)
-        normalized_metadata = normalize_github_metadata(raw_metadata)
-        files = await fetch_important_files(req.github_repo, github_token)
-        analysis_result = await analyze_repository(normalized_metadata, files)
-        return {
-            "analysis": analysis_result,
-            "metadata": normalized_metadata,
-            "success": True
-        }
-    except Exception as e:
-        print(str(e))
-        raise HTTPException(status_code=500, detail=str(e))
+for feature in WORKER_FEATURES:
+    if feature not in FEATURE_ROUTERS:
+        logger.warning("Unknown feature in WORKER_FEATURES: %s, skipping", feature)
+        continue
+    app.include_router(importlib.import_module(FEATURE_ROUTERS[feature]).router)
 
-@app.post("/idea-generator")
-async def idea_generator(
-    req: IdeaGeneratorRequest,
-    request: Request,
-    auth=Depends(verify_api_key)
-):
-    try:
-        complexity = ComplexityLevel(req.complexity.lower())
-        generator = IdeaGenerator()
-        
-        user_credits = int(request.headers.get("X-User-Credits", 0))
-        
-        if user_credits <= 0:
-            return JSONResponse(
-                status_code=402,
-                content={
-                    "error": "insufficient_credits",
-                    "message": "Not enough AI credits"
-                }
-            )
-        
-        result = generator.generate_ideas(req.topic, req.skills, complexity, user_credits)
-        
-        if "error" in result and result["error"] == "insufficient_credits":
-            return JSONResponse(
-                status_code=402,
-                content={
-                    "error": "insufficient_credits",
-                    "message": "Not enough AI credits to complete generation"
-                }
-            )
-            
-        return {
-            "ideas": result["ideas"],
-            "used_credits": result.get("used_credits", 0),
-            "success": True
-        }
-    except Exception as e:
-        print(f"Error in idea generator: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/llm/scheduler")
+async def llm_scheduler_stats(auth=Depends(verify_api_key)):
+    """Concurrency limit, queue depth and 429 count per model"""
+    return {"models": get_llm_scheduler().stats()}
 
-@app.post("/stack-generator")
-async def stack_generator_endpoint(req: StackGeneratorRequest, request: Request, auth=Depends(verify_api_key)):
-    try:
-        user_credits = int(request.headers.get("X-User-Credits", 0))
-        
-        if user_credits <= 0:
-            return JSONResponse(
-                status_code=402,
-                content={
-                    "error": "insufficient_credits",
-                    "message": "Not enough AI credits"
-                }
-            )
-        
-        generator = StackGenerator()
-        result = generator.generate_stack_recommendation(
-            req.project_type,
-            req.requirements,
-            req.preferences
-        )
-        
-        used_credits = result["used_tokens"]
-        
-        if used_credits > user_credits:
-            return JSONResponse(
-                status_code=402,
-                content={
-                    "error": "insufficient_credits",
-                    "message": "Not enough AI credits to complete generation"
-                }
-            )
-            
-        return {
-            "recommendation": result["recommendation"],
-            "used_credits": used_credits,
-            "success": True
-        }
-    except Exception as e:
-        print(f"Error in stack generator: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.post("/competitive-analysis")
-async def competitive_analysis(req: CompetitiveAnalysisRequest, request: Request, auth=Depends(verify_api_key)):
-    try:
-        user_credits = int(request.headers.get("X-User-Credits", 0))
-        
-        if user_credits <= 0:
-            return JSONResponse(
-                status_code=402,
-                content={
-                    "error": "insufficient_credits",
-                    "message": "Not enough AI credits"
-                }
-            )
-        
-        analyzer = CompetitiveAnalyzer()
-        result = analyzer.generate_analysis(req)
-        
-        used_credits = result["used_tokens"]
-        
-        if used_credits > user_credits:
-            return JSONResponse(
-                status_code=402,
-                content={
-                    "error": "insufficient_credits",
-                    "message": "Not enough AI credits to complete generation"
-                }
-            )
-            
-        analysis = result["analysis"]
-        return {
-            "uniqueValueProposition": analysis.unique_value_proposition,
-            "competitiveAdvantages": analysis.competitive_advantages,
-            "targetAudienceAlignment": analysis.target_audience_alignment,
-            "recommendedPositioning": analysis.recommended_positioning,
-            "used_credits": used_credits,
-            "success": True
-        }
-    except Exception as e:
-        print(f"Error in competitive analysis: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    """
+    Stage, GitHub, model, token and cache metrics in the Prometheus text
+    format, for every worker process when METRICS_DIR is set
+    """
+    if METRICS_REQUIRE_API_KEY:
+        await verify_api_key(request)
+    return PlainTextResponse(await asyncio.to_thread(render_metrics), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    if WORKER_PROCESSES > 1:
+        # WEB_CONCURRENCY=N runs N processes; they share state through a
+        # SQLite file unless configured otherwise (see gunicorn.conf.py)
+        os.environ.setdefault("SHARED_STATE", "sqlite")
+        os.environ.setdefault("JOB_STORE", "sqlite")
+        os.environ.setdefault("METRICS_DIR", os.path.join(".cache", "metrics"))
+        clear_metrics_dir(os.environ["METRICS_DIR"])
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WORKER_PROCESSES)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
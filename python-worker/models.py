@@ -15,6 +15,15 @@ class ReadmeRequest(BaseModel):
     shard_id: str
     metadata: Metadata
     github_token: Optional[str] = None
+    # Run repository analysis alongside README generation and return it
+    include_analysis: bool = False
+    # "api" or "clone" (local git working copy); None uses REPO_SOURCE
+    repo_source: Optional[str] = None
+    # "single" (one completion) or "sections" (one per section, in parallel); None uses README_GENERATION
+    readme_mode: Optional[str] = None
+
+class ReadmeBatchRequest(BaseModel):
+    requests: List[ReadmeRequest]
 
 class ReadmeResponse(BaseModel):
     readme_json: Dict[str, Any]
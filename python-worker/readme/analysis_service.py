@@ -1,29 +1,45 @@
 # analysis_service.py
-import os
 import json
-from openai import OpenAI
+import logging
 from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
 import httpx
-import base64
+from llm.gateway import chat_completion
+from llm.scheduler import PRIORITY_BACKGROUND
+from readme.context_compactor import ANALYSIS_CONTEXT_TOKENS, compact_sources
+from readme.raw_content import fetch_raw_files
+from readme.github_client import GITHUB_API_URL
+from readme.github_service import ANALYSIS_PRIORITY_FILES
+from readme.repo_snapshot import RepoSnapshot
 
 load_dotenv()
 
-api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
+logger = logging.getLogger(__name__)
 
-async def get_relevant_code_snippets(repo_url: str, github_token: Optional[str] = None) -> Dict[str, str]:
+# Limit to 5 most relevant snippets
+ANALYSIS_MAX_SNIPPETS = 5
+
+async def get_relevant_code_snippets(repo_url: str, github_token: Optional[str] = None, client: Optional[httpx.AsyncClient] = None, snapshot: Optional[RepoSnapshot] = None) -> Dict[str, str]:
     """Extract the most relevant code snippets from a repository"""
     
+    if snapshot is not None:
+        sources = {}
+        for file_name in ANALYSIS_PRIORITY_FILES:
+            content = snapshot.read(file_name)
+            if content and content.strip():
+                sources[file_name] = content
+        snippets = compact_sources(sources, ANALYSIS_CONTEXT_TOKENS, max_files=ANALYSIS_MAX_SNIPPETS)
+        return snippets if snippets else {"error": "No relevant code snippets found"}
+    
     parts = repo_url.split('/')
     if len(parts) < 2:
-        print(f"Invalid repo URL format: {repo_url}")
+        logger.warning("Invalid repo URL format: %s", repo_url)
         return {"error": "Invalid repository URL format"}
     
     # Get the last two non-empty parts
     non_empty_parts = [p for p in parts if p.strip()]
     if len(non_empty_parts) < 2:
-        print(f"Not enough parts in repo URL: {repo_url}")
+        logger.warning("Not enough parts in repo URL: %s", repo_url)
         return {"error": "Invalid repository URL"}
     
     owner = non_empty_parts[-2]
@@ -33,58 +49,29 @@ async def get_relevant_code_snippets(repo_url: str, github_token: Optional[str]
     if repo.endswith('.git'):
         repo = repo[:-4]
     
-    headers = {}
-    if github_token:
-        headers["Authorization"] = f"Bearer {github_token}"
-    elif os.getenv("GITHUB_TOKEN"):
-        headers["Authorization"] = f"Bearer {os.getenv('GITHUB_TOKEN')}"
-    
-    # Priority files that typically contain important code
-    priority_files = [
-        'main.py', 'app.py', 'index.js', 'server.js', 'app.js', 
-        'src/main.py', 'src/app.js', 'src/index.js', 'lib/main.rb',
-        'package.json', 'requirements.txt', 'setup.py', 'Dockerfile',
-        'docker-compose.yml', '.env.example', 'config.py', 'settings.py',
-        'utils.py', 'helpers.py', 'models.py', 'routes.py', 'controllers.py'
-    ]
-    
-    snippets = {}
-    
-    async with httpx.AsyncClient() as client:
-        for file_name in priority_files:
-            if len(snippets) >= 5:  # Limit to 5 most relevant snippets
-                break
-                
-            try:
-                res = await client.get(
-                    f"https://api.github.com/repos/{owner}/{repo}/contents/{file_name}",
-                    headers=headers,
-                    timeout=10.0
-                )
-                
-                if res.status_code == 200:
-                    file_data = res.json()
-                    if file_data.get('content') and file_data.get('type') == 'file':
-                        # Decode base64 content
-                        content = base64.b64decode(file_data['content']).decode('utf-8')
-                        
-                        # Take first 300-500 characters for meaningful context
-                        snippet_content = content[:500].strip()
-                        if snippet_content:  # Only add if we got meaningful content
-                            snippets[file_name] = snippet_content
-                            
-            except Exception as e:
-                print(f"Error fetching {file_name}: {e}")
-                continue
+    # Fetched in parallel as raw bodies capped at the byte budget; stops as
+    # soon as the 5 highest-priority hits are known
+    sources = await fetch_raw_files(
+        [(file_name, f"{GITHUB_API_URL}/repos/{owner}/{repo}/contents/{file_name}") for file_name in ANALYSIS_PRIORITY_FILES],
+        github_token,
+        client,
+        quota=ANALYSIS_MAX_SNIPPETS,
+    )
+    snippets = compact_sources(sources, ANALYSIS_CONTEXT_TOKENS, max_files=ANALYSIS_MAX_SNIPPETS)
     
     return snippets if snippets else {"error": "No relevant code snippets found"}
 
-async def analyze_repository_with_code(metadata: Dict[str, Any], files: list, repo_url: str, github_token: Optional[str] = None) -> Dict[str, Any]:
+ANALYSIS_SYSTEM_MESSAGE = "You are a senior software architect providing detailed technical analysis. Focus on code quality, architecture patterns, and practical improvements."
+
+async def analyze_repository_with_code(metadata: Dict[str, Any], files: list, repo_url: str, github_token: Optional[str] = None, snapshot: Optional[RepoSnapshot] = None, max_tokens: Optional[int] = None) -> Dict[str, Any]:
     """Analyze repository with actual code context for better feedback"""
     
     # Get relevant code snippets
-    code_snippets = await get_relevant_code_snippets(repo_url, github_token)
-    
+    code_snippets = await get_relevant_code_snippets(repo_url, github_token, snapshot=snapshot)
+    messages = build_analysis_messages(metadata, files, code_snippets)
+    return await run_analysis(messages, metadata, files, code_snippets, max_tokens)
+
+def build_analysis_messages(metadata: Dict[str, Any], files: list, code_snippets: Dict[str, str]) -> List[Dict[str, str]]:
     # Format code snippets for the prompt
     formatted_snippets = "No code snippets available"
     if code_snippets and "error" not in code_snippets:
@@ -126,21 +113,36 @@ Please provide a comprehensive analysis in the following JSON format:
 Be specific, technical, and provide actionable feedback based on the actual code content.
 Focus on what the code reveals about the project's purpose and quality.
 """
+    return [
+        {"role": "system", "content": ANALYSIS_SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt},
+    ]
 
+async def run_analysis(messages: List[Dict[str, str]], metadata: Dict[str, Any], files: list, code_snippets: Dict[str, str], max_tokens: Optional[int] = None) -> Dict[str, Any]:
+    # Once the completion has returned its tokens are billed, whatever goes wrong after
+    used_credits = 0
     try:
-        response = client.chat.completions.create(
+        response = await chat_completion(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a senior software architect providing detailed technical analysis. Focus on code quality, architecture patterns, and practical improvements."},
-                {"role": "user", "content": prompt},
-            ],
+            priority=PRIORITY_BACKGROUND,
+            messages=messages,
             temperature=0.7,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            **({"max_tokens": max_tokens} if max_tokens is not None else {})
         )
+        used_credits = response.usage.total_tokens if response.usage else 0
+        
+        # Cut off at the credit limit: the JSON would not parse anyway
+        if response.choices[0].finish_reason == "length":
+            return {
+                "error": "insufficient_credits",
+                "message": "Not enough AI credits to complete the analysis",
+                "used_credits": used_credits
+            }
         
         raw_response = response.choices[0].message.content
         if not raw_response:
-            return {"error": "Empty response from analysis service"}
+            return {"error": "Empty response from analysis service", "used_credits": used_credits}
             
         analysis_result = json.loads(raw_response)
         
@@ -149,13 +151,14 @@ Focus on what the code reveals about the project's purpose and quality.
             "metadata": metadata,
             "files_preview": files[:10],
             "code_snippets_used": len(code_snippets) if "error" not in code_snippets else 0,
-            "snippet_files": list(code_snippets.keys()) if "error" not in code_snippets else []
+            "snippet_files": list(code_snippets.keys()) if "error" not in code_snippets else [],
+            "used_credits": used_credits
         }
         
     except Exception as e:
-        return {"error": f"Analysis failed: {str(e)}"}
+        return {"error": f"Analysis failed: {str(e)}", "used_credits": used_credits}
 
 # Keep the original function for backward compatibility
-async def analyze_repository(metadata: Dict[str, Any], files: list) -> Dict[str, Any]:
+async def analyze_repository(metadata: Dict[str, Any], files: list, snapshot: Optional[RepoSnapshot] = None) -> Dict[str, Any]:
     """Legacy function - use analyze_repository_with_code for better analysis"""
-    return await analyze_repository_with_code(metadata, files, "", None)
\ No newline at end of file
+    return await analyze_repository_with_code(metadata, files, "", None, snapshot=snapshot)
\ No newline at end of file
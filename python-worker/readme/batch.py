@@ -0,0 +1,135 @@
+# batch.py
+import asyncio
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from llm.tokens import CreditBudget, InsufficientCreditsError, TokenReservation
+from models import ReadmeRequest
+from readme.github_service import GitHubRateLimitError
+from readme.pipeline import collect_repo_context
+from readme.readme_builder import generate_readme
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_REPOS = int(os.getenv("BATCH_MAX_REPOS", "50"))
+# Repositories collected from GitHub at once, across the whole batch
+BATCH_GITHUB_CONCURRENCY = int(os.getenv("BATCH_GITHUB_CONCURRENCY", "8"))
+# README generations in flight at once, across the whole batch
+BATCH_MODEL_CONCURRENCY = int(os.getenv("BATCH_MODEL_CONCURRENCY", "4"))
+
+
+class ModelGate:
+    """
+    Bounds concurrent README generations within one batch. Rate limits and
+    retries are handled per call by llm.scheduler, where interactive
+    requests from other users still go first.
+    """
+
+    def __init__(self, limit: int = BATCH_MODEL_CONCURRENCY):
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def run(self, make_call):
+        async with self._semaphore:
+            return await make_call()
+
+
+class _RepoBudget:
+    """One repository's view of the batch budget, keeping what its own calls used"""
+
+    def __init__(self, budget: CreditBudget):
+        self.budget = budget
+        self.used = 0
+
+    def reserve(self, feature: str, messages: List[Dict[str, str]], exact: bool = False) -> TokenReservation:
+        return self.budget.reserve(feature, messages, exact=exact)
+
+    def settle(self, reservation: TokenReservation, used_tokens: int) -> None:
+        self.used += used_tokens
+        self.budget.settle(reservation, used_tokens)
+
+
+class _BatchState:
+    """Shared limits and credits for one batch"""
+
+    def __init__(self, user_credits: Optional[int]):
+        self.budget = CreditBudget(user_credits, shared=True, slots=BATCH_MODEL_CONCURRENCY)
+        self.github_gate = asyncio.Semaphore(BATCH_GITHUB_CONCURRENCY)
+        self.model_gate = ModelGate()
+        # Generations holding a credit reservation; when one finishes, its
+        # unused credits go back to the budget and waiting repositories retry
+        self.in_flight = 0
+        self.settled = asyncio.Condition()
+
+    async def generate(self, req: ReadmeRequest, ctx, budget: _RepoBudget) -> Dict[str, Any]:
+        while True:
+            self.in_flight += 1
+            try:
+                return await self.model_gate.run(lambda: generate_readme(req, ctx=ctx, budget=budget))
+            except InsufficientCreditsError:
+                if self.in_flight == 1:
+                    raise
+            finally:
+                self.in_flight -= 1
+                async with self.settled:
+                    self.settled.notify_all()
+            async with self.settled:
+                if self.in_flight > 0:
+                    await self.settled.wait()
+
+
+async def _generate_one(index: int, req: ReadmeRequest, state: _BatchState) -> Dict[str, Any]:
+    line: Dict[str, Any] = {"index": index, "github_repo": req.github_repo, "shard_id": req.shard_id}
+    budget = _RepoBudget(state.budget)
+    try:
+        async with state.github_gate:
+            ctx = await collect_repo_context(req.github_repo, req.github_token, source=req.repo_source)
+        result = await state.generate(req, ctx, budget)
+    except InsufficientCreditsError as e:
+        return {**line, "success": False, "error": "insufficient_credits", "message": str(e), "used_credits": budget.used}
+    except GitHubRateLimitError as e:
+        return {**line, "success": False, "error": "github_rate_limited", "message": str(e), "retry_after": e.retry_after, "used_credits": budget.used}
+    except Exception as e:
+        logger.warning("Batch README for %s failed: %s", req.github_repo, e)
+        return {**line, "success": False, "error": "generation_failed", "message": str(e), "used_credits": budget.used}
+
+    if result.get("error") == "insufficient_credits":
+        # The README was cut off at its reservation; the batch had the credits
+        # to start it, so this is reported apart from a repository never started
+        return {**line, "success": False, "error": "truncated", "message": "README was cut off at its share of the batch credits", "used_credits": result.get("used_credits", 0)}
+    if "error" in result:
+        return {**line, "success": False, "error": result["error"], "used_credits": result.get("used_credits", 0)}
+    response = {**line, "success": True, "readme": result["readme"], "used_credits": result.get("used_credits", 0)}
+    if req.include_analysis:
+        response["analysis"] = result.get("analysis")
+    return response
+
+
+async def generate_readme_batch(requests: List[ReadmeRequest], user_credits: Optional[int]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Generate READMEs for many repositories, yielding one result per repository
+    as it finishes and then a summary. A failed repository is reported in its
+    own line and does not stop the others; all of them draw on one credit
+    budget.
+    """
+    state = _BatchState(user_credits)
+    tasks = [asyncio.create_task(_generate_one(i, req, state)) for i, req in enumerate(requests)]
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            line = await next_done
+            succeeded += line["success"]
+            yield line
+    finally:
+        # The client went away: stop the repositories still in progress
+        for task in tasks:
+            task.cancel()
+
+    yield {
+        "summary": True,
+        "total": len(requests),
+        "succeeded": succeeded,
+        "failed": len(requests) - succeeded,
+        "used_credits": state.budget.used,
+        "remaining_credits": state.budget.remaining,
+    }
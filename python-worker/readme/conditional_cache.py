@@ -0,0 +1,124 @@
+# conditional_cache.py
+import hashlib
+import os
+from typing import Optional
+
+import httpx
+
+from core.cache import CacheBackend, create_cache
+
+# "shared", "memory", "sqlite" or "none", as for create_cache
+GITHUB_ETAG_CACHE = os.getenv("GITHUB_ETAG_CACHE", "shared")
+GITHUB_ETAG_CACHE_PATH = os.getenv("GITHUB_ETAG_CACHE_PATH")
+GITHUB_ETAG_CACHE_ENTRIES = int(os.getenv("GITHUB_ETAG_CACHE_ENTRIES", "2048"))
+GITHUB_ETAG_CACHE_BYTES = int(os.getenv("GITHUB_ETAG_CACHE_BYTES", str(64 * 1024 * 1024)))
+# Bodies above this size (e.g. large blobs) are not worth keeping around
+GITHUB_ETAG_MAX_BODY = int(os.getenv("GITHUB_ETAG_MAX_BODY", str(1024 * 1024)))
+
+# Set on responses rebuilt from the store after a 304
+CACHE_STATUS_HEADER = "X-Worker-Cache"
+
+_etag_store: Optional[CacheBackend] = None
+
+
+def get_etag_store() -> CacheBackend:
+    global _etag_store
+    if _etag_store is None:
+        _etag_store = create_cache(
+            "github_etags",
+            backend=GITHUB_ETAG_CACHE,
+            max_entries=GITHUB_ETAG_CACHE_ENTRIES,
+            max_bytes=GITHUB_ETAG_CACHE_BYTES,
+            path=GITHUB_ETAG_CACHE_PATH,
+            disk_max_bytes=GITHUB_ETAG_CACHE_BYTES * 4,
+        )
+    return _etag_store
+
+
+def _cache_key(request: httpx.Request) -> str:
+    # Different tokens can see different data, so the credential is part of the key
+    parts = [
+        str(request.url),
+        request.headers.get("Accept", ""),
+        request.headers.get("Authorization", ""),
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+class ConditionalRequestTransport(httpx.AsyncBaseTransport):
+    """
+    Wrap a transport with ETag / Last-Modified revalidation for GET requests.
+
+    Successful responses carrying a validator are stored; later requests for
+    the same URL and credential send If-None-Match / If-Modified-Since, and a
+    304 (which GitHub does not count against the rate limit) is turned back
+    into the stored 200 response.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, store: Optional[CacheBackend] = None):
+        self._transport = transport
+        self._store = store
+
+    @property
+    def store(self) -> CacheBackend:
+        return self._store or get_etag_store()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # Archives and raw file bodies are streamed and read partially, so they
+        # must not be buffered here
+        if request.method != "GET" or "/tarball/" in request.url.path or request.headers.get("Accept", "").endswith(".raw"):
+            return await self._transport.handle_async_request(request)
+
+        key = _cache_key(request)
+        cached = await self.store.aget(key)
+        if cached:
+            if cached.get("etag"):
+                request.headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                request.headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = await self._transport.handle_async_request(request)
+
+        if response.status_code == 304 and cached:
+            await response.aclose()
+            headers = dict(cached["headers"])
+            headers[CACHE_STATUS_HEADER] = "revalidated"
+            # Keep the fresh rate-limit headers from the 304
+            for name, value in response.headers.items():
+                if name.lower().startswith("x-ratelimit"):
+                    headers[name] = value
+            return httpx.Response(200, headers=headers, content=cached["body"].encode("utf-8"), request=request)
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code != 200 or not (etag or last_modified):
+            return response
+
+        content_length = response.headers.get("Content-Length")
+        if content_length and int(content_length) > GITHUB_ETAG_MAX_BODY:
+            return response
+
+        body = await response.aread()
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            text = None
+
+        if text is not None and len(body) <= GITHUB_ETAG_MAX_BODY:
+            await self.store.aset(
+                key,
+                {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "headers": {"Content-Type": response.headers.get("Content-Type", "application/json")},
+                    "body": text,
+                },
+                size=len(body),
+            )
+
+        # The body has been consumed; hand back an equivalent in-memory response
+        headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")]
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request, extensions=response.extensions)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
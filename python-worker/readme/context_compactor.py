@@ -0,0 +1,325 @@
+# context_compactor.py
+import ast
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+
+from llm.tokens import count_tokens
+
+# Token budgets for the code section of each prompt
+README_CONTEXT_TOKENS = int(os.getenv("README_CONTEXT_TOKENS", "1000"))
+ANALYSIS_CONTEXT_TOKENS = int(os.getenv("ANALYSIS_CONTEXT_TOKENS", "600"))
+# Cap per file so one large module can't crowd out the rest
+CONTEXT_FILE_TOKENS = int(os.getenv("CONTEXT_FILE_TOKENS", "250"))
+# How many ranked files are loaded and summarized, and listed by name
+CONTEXT_MAX_FILES = int(os.getenv("CONTEXT_MAX_FILES", "12"))
+CONTEXT_LISTED_FILES = int(os.getenv("CONTEXT_LISTED_FILES", "40"))
+
+# Below this many tokens a truncated summary is not worth including
+MIN_SUMMARY_TOKENS = 40
+
+MANIFEST_FILES = {
+    "package.json", "requirements.txt", "pyproject.toml", "setup.py", "setup.cfg",
+    "go.mod", "cargo.toml", "pom.xml", "build.gradle", "gemfile", "composer.json",
+    "dockerfile", "docker-compose.yml", "docker-compose.yaml",
+}
+ENTRYPOINT_STEMS = {"main", "app", "index", "server", "cli", "manage", "wsgi", "asgi", "__main__"}
+PUBLIC_API_FILES = {"__init__.py", "index.ts", "index.js", "lib.rs", "mod.rs", "api.py", "routes.py", "urls.py"}
+SOURCE_EXTENSIONS = {".py", ".js", ".jsx", ".ts", ".tsx", ".go", ".rs", ".java", ".rb", ".php", ".c", ".cpp", ".kt", ".swift"}
+SKIP_DIRS = {"node_modules", "vendor", "dist", "build", "target", ".git", ".github", "__pycache__", "coverage", "third_party"}
+LOCK_FILES = {"package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "cargo.lock", "go.sum", "composer.lock", "gemfile.lock"}
+
+
+def score_path(path: str) -> float:
+    """Relevance of a file for describing the project; <= 0 means not worth reading"""
+    parts = path.split("/")
+    name = parts[-1].lower()
+    stem, ext = os.path.splitext(name)
+    dirs = [p.lower() for p in parts[:-1]]
+
+    if name in LOCK_FILES or any(d in SKIP_DIRS for d in dirs) or name.endswith((".min.js", ".map")):
+        return 0
+    if ext not in SOURCE_EXTENSIONS and name not in MANIFEST_FILES:
+        return 0
+
+    if name in MANIFEST_FILES:
+        score = 90
+    elif stem in ENTRYPOINT_STEMS:
+        score = 80
+    elif name in PUBLIC_API_FILES:
+        score = 60
+    else:
+        score = 30
+
+    if any(d in ("test", "tests", "__tests__", "spec", "examples", "example", "docs", "scripts", "benchmarks", "fixtures") for d in dirs) \
+            or stem.startswith("test_") or stem.endswith(("_test", ".test", ".spec")):
+        score -= 25
+    if dirs and dirs[0] in ("src", "cmd", "app", "lib", "pkg"):
+        score += 5
+    # Prefer shallow files: the root and first level describe the project best
+    score -= 6 * max(len(dirs) - (1 if dirs and dirs[0] in ("src", "cmd") else 0), 0)
+    return score
+
+
+def rank_files(paths: Iterable[str]) -> List[str]:
+    """Paths worth reading, most relevant first"""
+    scored = [(score_path(path), path) for path in paths]
+    return [path for score, path in sorted(scored, key=lambda item: (-item[0], item[1])) if score > 0]
+
+
+def format_file_listing(paths: List[str], limit: int = CONTEXT_LISTED_FILES) -> str:
+    """Ranked, capped file list for a prompt; uninteresting files are only counted"""
+    ranked = rank_files(paths)
+    listed = ranked[:limit]
+    rest = len(paths) - len(listed)
+    listing = ", ".join(listed) if listed else "None detected"
+    return f"{listing} (+{rest} more)" if rest > 0 else listing
+
+
+def _first_line(docstring: Optional[str]) -> str:
+    return docstring.strip().splitlines()[0] if docstring and docstring.strip() else ""
+
+
+def _parse_python(content: str, attempts: int = 3) -> Optional[ast.Module]:
+    """Parse, dropping the tail from the error on when a file was cut off by the byte budget"""
+    for _ in range(attempts):
+        try:
+            return ast.parse(content)
+        except SyntaxError as e:
+            if not e.lineno or e.lineno <= 1:
+                return None
+            content = "\n".join(content.splitlines()[: e.lineno - 1])
+        except ValueError:
+            return None
+    return None
+
+
+def _summarize_python(content: str) -> Optional[str]:
+    tree = _parse_python(content)
+    if tree is None:
+        return None
+
+    lines = []
+    doc = _first_line(ast.get_docstring(tree))
+    if doc:
+        lines.append(f'"""{doc}"""')
+    imports = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            imports.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.append(node.module or ".")
+    if imports:
+        lines.append("imports: " + ", ".join(dict.fromkeys(imports)))
+
+    def signature(node, indent: str = "") -> None:
+        prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+        decorators = "".join(f"@{ast.unparse(d)} " for d in node.decorator_list)
+        returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+        lines.append(f"{indent}{decorators}{prefix} {node.name}({ast.unparse(node.args)}){returns}")
+        doc = _first_line(ast.get_docstring(node))
+        if doc:
+            lines.append(f'{indent}    """{doc}"""')
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if not node.name.startswith("_"):
+                signature(node)
+        elif isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(b) for b in node.bases)
+            lines.append(f"class {node.name}({bases})" if bases else f"class {node.name}")
+            doc = _first_line(ast.get_docstring(node))
+            if doc:
+                lines.append(f'    """{doc}"""')
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and \
+                        (not child.name.startswith("_") or child.name == "__init__"):
+                    signature(child, "    ")
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            # Module constants and app objects (app = FastAPI(), CONFIG = ...)
+            text = ast.unparse(node)
+            if len(text) <= 120:
+                lines.append(text)
+    return "\n".join(lines)
+
+
+# import/export lines, function/class declarations and exported arrow functions
+_JS_DECLARATION = re.compile(
+    r"^\s*(?:"
+    r"import\s.+|"
+    r"(?:export\s+(?:default\s+)?)?(?:async\s+)?function\s*\*?\s*\w*\s*\([^)]*\)|"
+    r"(?:export\s+(?:default\s+)?)?(?:abstract\s+)?class\s+\w+[^{]*|"
+    r"(?:export\s+)?(?:interface|type|enum)\s+\w+[^{=]*|"
+    r"export\s+(?:const|let|var)\s+\w+[^=]*=\s*(?:async\s*)?(?:\([^)]*\)|\w+)\s*=>|"
+    r"export\s+(?:\{[^}]*\}|\*).*|"
+    r"module\.exports\s*=.*|"
+    r"(?:const|let|var)\s+\w+\s*=\s*require\(.+\)|"
+    r"app\.(?:get|post|put|delete|patch|use)\(\s*['\"][^'\"]*['\"]"
+    r")",
+)
+
+
+def _summarize_js(content: str) -> str:
+    lines = []
+    for line in content.splitlines():
+        match = _JS_DECLARATION.match(line)
+        if match:
+            lines.append(match.group(0).strip().rstrip("{").strip())
+    return "\n".join(lines)
+
+
+_GO_DECLARATION = re.compile(r"^(?:package\s+\w+|func\s+(?:\([^)]*\)\s*)?\w+\([^)]*\)[^{]*|type\s+\w+\s+\w+)")
+
+
+def _summarize_go(content: str) -> str:
+    lines = []
+    in_imports = False
+    imports = []
+    for line in content.splitlines():
+        stripped = line.strip()
+        if in_imports:
+            if stripped == ")":
+                in_imports = False
+            elif stripped:
+                imports.append(stripped.split()[-1].strip('"'))
+            continue
+        if stripped.startswith("import ("):
+            in_imports = True
+        elif stripped.startswith("import "):
+            imports.append(stripped.split()[-1].strip('"'))
+        elif stripped.startswith("// ") and lines and not lines[-1].startswith("//"):
+            # Doc comment directly above a declaration
+            lines.append(stripped)
+        else:
+            match = _GO_DECLARATION.match(line)
+            if match:
+                lines.append(match.group(0).strip())
+            elif lines and lines[-1].startswith("//"):
+                lines.pop()
+    if lines and lines[-1].startswith("//"):
+        lines.pop()
+    if imports:
+        lines.insert(1 if lines and lines[0].startswith("package") else 0, "imports: " + ", ".join(imports))
+    return "\n".join(lines)
+
+
+def _summarize_package_json(content: str) -> Optional[str]:
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    summary = {key: data[key] for key in ("name", "description", "main", "bin", "type") if data.get(key)}
+    if data.get("scripts"):
+        summary["scripts"] = data["scripts"]
+    for key in ("dependencies", "devDependencies", "peerDependencies"):
+        if data.get(key):
+            # Versions cost tokens and rarely matter for a README
+            summary[key] = sorted(data[key])
+    return json.dumps(summary, separators=(",", ":"))
+
+
+def _summarize_requirements(content: str, max_names: int = 60) -> str:
+    names = []
+    for line in content.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line and not line.startswith("-"):
+            names.append(re.split(r"[<>=!~;\[ ]", line, 1)[0])
+    listed = ", ".join(names[:max_names])
+    return f"requirements: {listed} (+{len(names) - max_names} more)" if len(names) > max_names else f"requirements: {listed}"
+
+
+def _leading_lines(content: str, max_lines: int = 30) -> str:
+    lines = [line.rstrip() for line in content.splitlines() if line.strip()]
+    return "\n".join(lines[:max_lines])
+
+
+def summarize_file(path: str, content: str) -> Optional[str]:
+    """
+    Compact, prompt-ready view of a file: signatures, docstrings and imports
+    for code, names and scripts for manifests, leading lines for the rest.
+    """
+    if not content or not content.strip():
+        return None
+    name = path.rsplit("/", 1)[-1].lower()
+    ext = os.path.splitext(name)[1]
+
+    summary = None
+    if ext == ".py" and name != "setup.py":
+        summary = _summarize_python(content)
+    elif ext in (".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs"):
+        summary = _summarize_js(content)
+    elif ext == ".go":
+        summary = _summarize_go(content)
+    elif name == "package.json":
+        summary = _summarize_package_json(content)
+    elif name == "requirements.txt":
+        summary = _summarize_requirements(content)
+
+    # Parsers find nothing in scripts without declarations; keep the top instead
+    if not summary or not summary.strip():
+        summary = _leading_lines(content)
+    return summary or None
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    kept = []
+    used = 0
+    for line in text.splitlines():
+        used += count_tokens(line) + 1
+        if used > max_tokens:
+            break
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def compact_sources(sources: Dict[str, str], budget_tokens: int, max_files: int = CONTEXT_MAX_FILES) -> Dict[str, str]:
+    """
+    Summarize files (given most relevant first) and keep as many as fit in
+    budget_tokens. Files whose summaries are identical, e.g. a vendored copy,
+    are only included once.
+    """
+    compacted: Dict[str, str] = {}
+    seen = set()
+    remaining = budget_tokens
+
+    for path, content in sources.items():
+        if len(compacted) >= max_files or remaining < MIN_SUMMARY_TOKENS:
+            break
+        summary = summarize_file(path, content)
+        if not summary:
+            continue
+        digest = hashlib.sha1(" ".join(summary.split()).encode("utf-8")).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+
+        # Path line and code fence overhead in the prompt
+        overhead = count_tokens(path) + 6
+        allowance = min(remaining - overhead, CONTEXT_FILE_TOKENS)
+        if count_tokens(summary) > allowance:
+            summary = _truncate_to_tokens(summary, allowance)
+            if count_tokens(summary) < MIN_SUMMARY_TOKENS:
+                continue
+        tokens = count_tokens(summary) + overhead
+        compacted[path] = summary
+        remaining -= tokens
+    return compacted
+
+
+def format_sources(snippets: Dict[str, str]) -> str:
+    """Summaries as fenced blocks; a dict repr would escape every newline"""
+    blocks = []
+    for path, summary in snippets.items():
+        language = path.rsplit(".", 1)[-1] if "." in path else "text"
+        blocks.append(f"{path}:\n```{language}\n{summary}\n```")
+    return "\n".join(blocks)
+
+
+def format_user_input(user_input: Dict[str, Optional[str]]) -> str:
+    """Only the fields the user actually filled in"""
+    filled = [f"{key}: {value.strip()}" for key, value in user_input.items() if value and str(value).strip()]
+    return "; ".join(filled) if filled else "None provided"
@@ -0,0 +1,164 @@
+# fetcher.py
+import asyncio
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+FETCH_CONCURRENCY = int(os.getenv("GITHUB_FETCH_CONCURRENCY", "8"))
+FETCH_PER_HOST = int(os.getenv("GITHUB_FETCH_PER_HOST", "6"))
+
+# parse(key, response) returns the value to keep, or None to skip the key
+ParseFn = Callable[[str, httpx.Response], Optional[Any]]
+
+# Set on responses cut short by max_bytes: response.extensions["truncated"]
+TRUNCATED = "truncated"
+
+
+async def read_limited(client: httpx.AsyncClient, url: str, headers: Dict[str, str], max_bytes: int, timeout: float) -> httpx.Response:
+    """
+    GET url but keep at most max_bytes of the body, closing the connection
+    instead of downloading the rest. The returned response holds the prefix.
+    """
+    async with client.stream("GET", url, headers=headers, timeout=timeout) as res:
+        chunks = []
+        received = 0
+        truncated = False
+        if res.status_code == 200:
+            async for chunk in res.aiter_bytes():
+                chunks.append(chunk)
+                received += len(chunk)
+                if received >= max_bytes:
+                    truncated = received > max_bytes or res.headers.get("Content-Length") != str(received)
+                    break
+        body = b"".join(chunks)[:max_bytes]
+        response_headers = [
+            (k, v) for k, v in res.headers.multi_items()
+            if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        ]
+        return httpx.Response(
+            res.status_code,
+            headers=response_headers,
+            content=body,
+            request=res.request,
+            extensions={TRUNCATED: truncated},
+        )
+
+
+class BoundedFetcher:
+    """Fetch many URLs at once with a global and a per-host concurrency cap"""
+
+    def __init__(self, limit: int = FETCH_CONCURRENCY, per_host_limit: int = FETCH_PER_HOST):
+        self._global = asyncio.Semaphore(limit)
+        self._per_host_limit = per_host_limit
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self._per_host_limit)
+        return self._hosts[host]
+
+    async def _fetch_one(
+        self,
+        client: httpx.AsyncClient,
+        key: str,
+        url: str,
+        parse: ParseFn,
+        headers: Dict[str, str],
+        timeout: float,
+        max_bytes: Optional[int] = None,
+    ) -> Optional[Any]:
+        async with self._global, self._host_semaphore(url):
+            try:
+                if max_bytes is not None:
+                    res = await read_limited(client, url, headers, max_bytes, timeout)
+                else:
+                    res = await client.get(url, headers=headers, timeout=timeout)
+                return parse(key, res)
+            except Exception as e:
+                logger.warning("Error fetching %s: %s", key, e)
+                return None
+
+    async def fetch(
+        self,
+        client: httpx.AsyncClient,
+        requests: List[Tuple[str, str]],
+        parse: ParseFn,
+        headers: Optional[Dict[str, str]] = None,
+        quota: Optional[int] = None,
+        timeout: float = 10.0,
+        max_bytes: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Fetch (key, url) pairs concurrently and return {key: parsed} in request order.
+
+        When quota is set the result holds at most that many entries, taken in
+        request order, and outstanding requests are cancelled as soon as the
+        first `quota` successful keys are settled. With max_bytes each body is
+        streamed and only its first max_bytes are kept.
+        """
+        headers = headers or {}
+        tasks = [
+            asyncio.create_task(self._fetch_one(client, key, url, parse, headers, timeout, max_bytes))
+            for key, url in requests
+        ]
+        results: Dict[int, Optional[Any]] = {}
+        index_of = {task: i for i, task in enumerate(tasks)}
+        pending = set(tasks)
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results[index_of[task]] = task.result()
+                if quota is not None and _quota_settled(results, len(tasks), quota):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        collected: Dict[str, Any] = {}
+        for i, (key, _) in enumerate(requests):
+            value = results.get(i)
+            if value is None:
+                continue
+            collected[key] = value
+            if quota is not None and len(collected) >= quota:
+                break
+        return collected
+
+
+def _quota_settled(results: Dict[int, Optional[Any]], total: int, quota: int) -> bool:
+    """True once the leading run of finished requests already holds `quota` hits"""
+    hits = 0
+    for i in range(total):
+        if i not in results:
+            return False
+        if results[i] is not None:
+            hits += 1
+            if hits >= quota:
+                return True
+    return True
+
+
+async def fetch_concurrently(
+    client: httpx.AsyncClient,
+    requests: List[Tuple[str, str]],
+    parse: ParseFn,
+    headers: Optional[Dict[str, str]] = None,
+    quota: Optional[int] = None,
+    limit: int = FETCH_CONCURRENCY,
+    per_host_limit: int = FETCH_PER_HOST,
+    timeout: float = 10.0,
+    max_bytes: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Convenience wrapper that runs one BoundedFetcher over `requests`"""
+    fetcher = BoundedFetcher(limit=limit, per_host_limit=per_host_limit)
+    return await fetcher.fetch(client, requests, parse, headers=headers, quota=quota, timeout=timeout, max_bytes=max_bytes)
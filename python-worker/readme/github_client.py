@@ -0,0 +1,101 @@
+# github_client.py
+import logging
+import os
+from typing import Dict, Optional
+
+import httpx
+
+from readme.conditional_cache import ConditionalRequestTransport
+from readme.github_metrics import MetricsTransport
+from readme.rate_limit import RateLimitTransport
+
+logger = logging.getLogger(__name__)
+
+# GitHub Enterprise, or a local fake for benchmarks (see benchmarks/fake_github.py)
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+
+GITHUB_MAX_CONNECTIONS = int(os.getenv("GITHUB_MAX_CONNECTIONS", "50"))
+GITHUB_MAX_KEEPALIVE = int(os.getenv("GITHUB_MAX_KEEPALIVE", "20"))
+GITHUB_KEEPALIVE_EXPIRY = float(os.getenv("GITHUB_KEEPALIVE_EXPIRY", "60"))
+GITHUB_TIMEOUT = float(os.getenv("GITHUB_TIMEOUT", "10"))
+# "auto" turns HTTP/2 on whenever the optional h2 package is installed
+GITHUB_HTTP2 = os.getenv("GITHUB_HTTP2", "auto").lower()
+# Revalidate repeat GETs with ETag / Last-Modified (see conditional_cache.py)
+GITHUB_CONDITIONAL_REQUESTS = os.getenv("GITHUB_CONDITIONAL_REQUESTS", "1").lower() in ("1", "true", "yes")
+# Schedule requests against each credential's quota (see rate_limit.py)
+GITHUB_RATE_LIMIT = os.getenv("GITHUB_RATE_LIMIT", "1").lower() in ("1", "true", "yes")
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def auth_headers(github_token: Optional[str] = None) -> Dict[str, str]:
+    """Authorization header for the request token, falling back to GITHUB_TOKEN"""
+    headers = {}
+    if github_token:
+        headers["Authorization"] = f"Bearer {github_token}"
+    elif os.getenv("GITHUB_TOKEN"):
+        headers["Authorization"] = f"Bearer {os.getenv('GITHUB_TOKEN')}"
+    return headers
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def create_github_client() -> httpx.AsyncClient:
+    """Build a pooled keep-alive client for GITHUB_API_URL"""
+    http2 = GITHUB_HTTP2 in ("auto", "1", "true", "yes") and _http2_available()
+    if GITHUB_HTTP2 in ("1", "true", "yes") and not http2:
+        logger.warning("GITHUB_HTTP2 requested but the h2 package is not installed, using HTTP/1.1")
+
+    transport = httpx.AsyncHTTPTransport(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=GITHUB_MAX_CONNECTIONS,
+            max_keepalive_connections=GITHUB_MAX_KEEPALIVE,
+            keepalive_expiry=GITHUB_KEEPALIVE_EXPIRY,
+        ),
+    )
+    # Innermost, so only calls that reach GitHub are timed
+    transport = MetricsTransport(transport)
+    if GITHUB_CONDITIONAL_REQUESTS:
+        transport = ConditionalRequestTransport(transport)
+    if GITHUB_RATE_LIMIT:
+        # Outermost, so revalidations that reach GitHub are scheduled too
+        transport = RateLimitTransport(transport)
+
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(GITHUB_TIMEOUT, connect=5.0),
+        headers={
+            "Accept": "application/vnd.github+json",
+            "User-Agent": "shards-python-worker",
+        },
+    )
+
+
+async def start_github_client() -> httpx.AsyncClient:
+    """Open the app-lifetime client; called from the FastAPI lifespan"""
+    global _client
+    if _client is None:
+        _client = create_github_client()
+    return _client
+
+
+def get_github_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily outside the app lifespan"""
+    global _client
+    if _client is None:
+        _client = create_github_client()
+    return _client
+
+
+async def close_github_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+    _client = None
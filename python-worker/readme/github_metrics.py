@@ -0,0 +1,94 @@
+# github_metrics.py
+import time
+
+import httpx
+
+from core.metrics import SIZE_BUCKETS, counter, histogram
+from core.tracing import end_span, start_span
+
+GITHUB_REQUEST_SECONDS = histogram(
+    "github_request_duration_seconds",
+    "GitHub call duration until the body was read or closed",
+    ("endpoint", "status"),
+)
+GITHUB_RESPONSE_BYTES = histogram(
+    "github_response_bytes",
+    "Bytes read from each GitHub response body",
+    ("endpoint",),
+    buckets=SIZE_BUCKETS,
+)
+GITHUB_ERRORS = counter(
+    "github_request_errors_total",
+    "GitHub calls that failed without a response",
+    ("endpoint", "error"),
+)
+
+
+def github_endpoint(url: httpx.URL) -> str:
+    """Low-cardinality name for a GitHub URL: repo, git, contents, tarball, raw..."""
+    if url.host == "raw.githubusercontent.com":
+        return "raw"
+    if url.host == "codeload.github.com":
+        return "codeload"
+    parts = [part for part in url.path.split("/") if part]
+    if len(parts) >= 3 and parts[0] == "repos":
+        # /repos/{owner}/{repo}[/{endpoint}/...]
+        return parts[3] if len(parts) > 3 else "repo"
+    return parts[0] if parts else "root"
+
+
+class _MeteredStream(httpx.AsyncByteStream):
+    """Counts body bytes as they are read; the call is recorded when it closes"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self.bytes = 0
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self.bytes += len(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close(self.bytes)
+
+
+class MetricsTransport(httpx.AsyncBaseTransport):
+    """
+    Innermost GitHub transport: times each call that reaches the network
+    (304 revalidations included, rate-limit holds excluded) and counts the
+    bytes actually read, which is less than the body for partial reads.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = github_endpoint(request.url)
+        started = time.perf_counter()
+        current = start_span(f"github.{endpoint}", **{"http.request.method": request.method, "url.path": request.url.path})
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception as e:
+            GITHUB_ERRORS.inc(endpoint=endpoint, error=type(e).__name__)
+            end_span(current, e)
+            raise
+
+        status = str(response.status_code)
+
+        def record(read: int) -> None:
+            GITHUB_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, status=status)
+            GITHUB_RESPONSE_BYTES.observe(read, endpoint=endpoint)
+            end_span(current, **{"http.response.status_code": response.status_code, "http.response.body.size": read})
+
+        response.stream = _MeteredStream(response.stream, record)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
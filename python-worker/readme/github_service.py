@@ -1,120 +1,178 @@
 # github_service.py
 import httpx
-import os
+import logging
 import re
+import time
 from typing import Dict, Any, Optional
+from readme.context_compactor import CONTEXT_MAX_FILES, README_CONTEXT_TOKENS, compact_sources, rank_files
+from readme.raw_content import fetch_raw_files
+from readme.github_client import GITHUB_API_URL, auth_headers, get_github_client
+from readme.local_clone import clone_snapshot
+from readme.rate_limit import is_rate_limited, retry_after_seconds
+from readme.repo_snapshot import RepoSnapshot, fetch_repo_snapshot, load_snapshot_contents
+
+logger = logging.getLogger(__name__)
+
+# Characters GitHub allows in user, organization and repository names
+_GITHUB_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+# Priority files that typically contain important code (used by repository analysis)
+ANALYSIS_PRIORITY_FILES = [
+    'main.py', 'app.py', 'index.js', 'server.js', 'app.js', 
+    'src/main.py', 'src/app.js', 'src/index.js', 'lib/main.rb',
+    'package.json', 'requirements.txt', 'setup.py', 'Dockerfile',
+    'docker-compose.yml', '.env.example', 'config.py', 'settings.py',
+    'utils.py', 'helpers.py', 'models.py', 'routes.py', 'controllers.py'
+]
 
 class RepoAccessError(Exception):
     pass
 
-async def fetch_repo_metadata(repo_url: str, github_token: Optional[str] = None):
-    owner, repo = extract_owner_repo(repo_url)
-    
-    headers = {}
-    if github_token:
-        headers["Authorization"] = f"Bearer {github_token}"  # Changed from "token" to "Bearer"
-        print(f"Using GitHub token for authentication: {github_token[:10]}...")  # Debug log
-    elif os.getenv("GITHUB_TOKEN"):
-        headers["Authorization"] = f"Bearer {os.getenv('GITHUB_TOKEN')}"
-        print("Using environment GITHUB_TOKEN")
-    else:
-        print("No GitHub token provided, making unauthenticated request")
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            res = await client.get(
-                f"https://api.github.com/repos/{owner}/{repo}",
-                headers=headers
-            )
-            
-            print(f"GitHub API response status: {res.status_code}")
-            
-            if res.status_code == 401:
-                print("GitHub API returned 401 Unauthorized - token may be invalid or expired")
-                print(f"Response headers: {dict(res.headers)}")
-                
-            if res.status_code in (403, 404):
-                raise RepoAccessError(
-                    "The original GitHub Repository is private or inaccessible. Please make it public or select a different Shard."
-                )
-            
-            res.raise_for_status()
-            return res.json()
-            
-        except httpx.HTTPStatusError as e:
-            print(f"GitHub API error: {e}")
-            print(f"Response text: {e.response.text}")
-            raise RepoAccessError(f"GitHub API error: {e}")
-
-async def fetch_important_files(repo_url: str, github_token: Optional[str] = None):
+class GitHubRateLimitError(RepoAccessError):
+    """GitHub refused the request because of a rate limit, not repository visibility"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+def raise_for_rate_limit(res: httpx.Response):
+    """Raise GitHubRateLimitError for a primary or secondary rate limit response"""
+    if not is_rate_limited(res):
+        return
+    retry_after = retry_after_seconds(res)
+    if retry_after is None and res.headers.get("X-RateLimit-Reset", "").isdigit():
+        retry_after = max(int(res.headers["X-RateLimit-Reset"]) - time.time(), 0)
+    wait = f" Try again in {int(retry_after)} seconds." if retry_after is not None else ""
+    raise GitHubRateLimitError(f"GitHub API rate limit exceeded.{wait}", retry_after)
+
+async def fetch_repo_metadata(repo_url: str, github_token: Optional[str] = None, client: Optional[httpx.AsyncClient] = None):
     owner, repo = extract_owner_repo(repo_url)
     
-    headers = {}
-    if github_token:
-        headers["Authorization"] = f"Bearer {github_token}"
-    elif os.getenv("GITHUB_TOKEN"):
-        headers["Authorization"] = f"Bearer {os.getenv('GITHUB_TOKEN')}"
+    headers = auth_headers(github_token)
+    if "Authorization" not in headers:
+        logger.debug("No GitHub token provided, making unauthenticated request")
     
-    async with httpx.AsyncClient() as client:
-        # Get repository contents (root level)
+    client = client or get_github_client()
+    try:
         res = await client.get(
-            f"https://api.github.com/repos/{owner}/{repo}/contents",
+            f"{GITHUB_API_URL}/repos/{owner}/{repo}",
             headers=headers
         )
         
-        print(f"GitHub files API response status: {res.status_code}")
+        if res.status_code == 401:
+            logger.warning("GitHub API returned 401 Unauthorized - token may be invalid or expired", extra={"repo": f"{owner}/{repo}"})
+        
+        # A 403 is also how GitHub reports rate limits; don't blame the repository for those
+        raise_for_rate_limit(res)
+        if res.status_code in (403, 404):
+            raise RepoAccessError(
+                "The original GitHub Repository is private or inaccessible. Please make it public or select a different Shard."
+            )
+        
+        res.raise_for_status()
+        return res.json()
         
-        if res.status_code == 200:
-            contents = res.json()
-            # Return just the file names for now
-            return [item['name'] for item in contents if item['type'] == 'file']
-        return []
-
-# In github_service.py, improve the extract_code_snippets function:
-async def extract_code_snippets(repo_url: str, files: list, github_token: Optional[str] = None):
+    except httpx.HTTPStatusError as e:
+        logger.warning("GitHub API error: %s", e, extra={"repo": f"{owner}/{repo}"})
+        raise RepoAccessError(f"GitHub API error: {e}")
+
+async def fetch_root_listing(repo_url: str, github_token: Optional[str] = None, client: Optional[httpx.AsyncClient] = None) -> Dict[str, int]:
+    """Root-level files with their sizes, {name: bytes}"""
     owner, repo = extract_owner_repo(repo_url)
     
-    headers = {}
-    if github_token:
-        headers["Authorization"] = f"Bearer {github_token}"
-    elif os.getenv("GITHUB_TOKEN"):
-        headers["Authorization"] = f"Bearer {os.getenv('GITHUB_TOKEN')}"
+    headers = auth_headers(github_token)
     
-    snippets = {}
-    async with httpx.AsyncClient() as client:
-        # Prioritize files that are more likely to contain meaningful code
-        priority_files = [f for f in files if any(f.endswith(ext) for ext in 
-                         ['.py', '.js', '.ts', '.java', '.cpp', '.c', '.go', '.rs', '.php', '.rb', '.json', '.yaml', '.yml'])]
-        
-        for file in priority_files[:8]:  # Limit to 8 most relevant files
-            try:
-                res = await client.get(
-                    f"https://api.github.com/repos/{owner}/{repo}/contents/{file}",
-                    headers=headers,
-                    timeout=10.0
-                )
-                
-                if res.status_code == 200:
-                    content_data = res.json()
-                    if 'content' in content_data and content_data.get('type') == 'file':
-                        # Decode base64 content
-                        import base64
-                        content = base64.b64decode(content_data['content']).decode('utf-8')
-                        
-                        # Only include meaningful code (not empty or just comments)
-                        if content.strip() and not content.strip().startswith('#'):
-                            snippets[file] = content[:800]  # Slightly shorter snippets
-                            
-            except Exception as e:
-                print(f"Error fetching {file}: {e}")
-                continue
+    client = client or get_github_client()
+    # Get repository contents (root level)
+    res = await client.get(
+        f"{GITHUB_API_URL}/repos/{owner}/{repo}/contents",
+        headers=headers
+    )
+    
+    if res.status_code == 200:
+        contents = res.json()
+        return {item['name']: item.get('size', 0) for item in contents if item['type'] == 'file'}
+    return {}
+
+async def fetch_important_files(repo_url: str, github_token: Optional[str] = None, client: Optional[httpx.AsyncClient] = None):
+    # Return just the file names for now
+    return list(await fetch_root_listing(repo_url, github_token, client))
+
+async def fetch_head_sha(repo_url: str, github_token: Optional[str] = None, client: Optional[httpx.AsyncClient] = None) -> Optional[str]:
+    """Resolve the default branch HEAD to a commit SHA (a ~40 byte response)"""
+    owner, repo = extract_owner_repo(repo_url)
+    headers = auth_headers(github_token)
+    headers["Accept"] = "application/vnd.github.sha"
+    
+    client = client or get_github_client()
+    try:
+        res = await client.get(f"{GITHUB_API_URL}/repos/{owner}/{repo}/commits/HEAD", headers=headers)
+    except httpx.HTTPError as e:
+        logger.warning("Could not resolve HEAD for %s/%s: %s", owner, repo, e)
+        return None
+    if res.status_code != 200:
+        return None
+    return res.text.strip() or None
+
+def snapshot_paths(paths: list) -> list:
+    """Files a snapshot loads: the top ranked ones plus those repository analysis reads"""
+    # The whole tree is ranked, so entrypoints under src/ or cmd/ are found too
+    return rank_files(paths)[:CONTEXT_MAX_FILES] + ANALYSIS_PRIORITY_FILES
+
+async def build_repo_snapshot(repo_url: str, raw_metadata: Dict[str, Any], github_token: Optional[str] = None, client: Optional[httpx.AsyncClient] = None, source: str = "api") -> Optional[RepoSnapshot]:
+    """One tree call plus one bulk content load covering both README snippets and analysis files"""
+    owner, repo = extract_owner_repo(repo_url)
+    ref = raw_metadata.get('default_branch') or 'main'
+    
+    if source == "clone":
+        try:
+            snapshot = await clone_snapshot(owner, repo, ref, snapshot_paths, github_token)
+            logger.info("Repository snapshot built from local clone", extra={"repo": f"{owner}/{repo}", "files": len(snapshot.entries), "loaded": len(snapshot.contents)})
+            return snapshot
+        except Exception as e:
+            logger.warning("Local clone failed, falling back to the GitHub API: %s", e, extra={"repo": f"{owner}/{repo}"})
+    
+    try:
+        snapshot = await fetch_repo_snapshot(owner, repo, ref, github_token, client)
+        await load_snapshot_contents(snapshot, snapshot_paths(list(snapshot.entries)), github_token, client)
+        logger.info("Repository snapshot built", extra={"repo": f"{owner}/{repo}", "files": len(snapshot.entries), "loaded": len(snapshot.contents)})
+        return snapshot
+    except Exception as e:
+        # Empty repositories and odd refs fall back to per-file contents calls
+        logger.warning("Could not build repository snapshot: %s", e, extra={"repo": f"{owner}/{repo}"})
+        return None
+
+async def extract_code_snippets(repo_url: str, files: list, github_token: Optional[str] = None, client: Optional[httpx.AsyncClient] = None, snapshot: Optional[RepoSnapshot] = None, sizes: Optional[Dict[str, int]] = None):
+    """Signatures, imports and manifest summaries of the most relevant files, fitted to README_CONTEXT_TOKENS"""
+    if snapshot is not None:
+        sources = {}
+        for file in rank_files(snapshot.entries)[:CONTEXT_MAX_FILES]:
+            content = snapshot.read(file)
+            if content is not None:
+                sources[file] = content
+        snippets = compact_sources(sources, README_CONTEXT_TOKENS)
+        return snippets if snippets else "No code snippets could be extracted"
+    
+    owner, repo = extract_owner_repo(repo_url)
+    priority_files = rank_files(files)[:8]  # Limit to 8 most relevant files
+    
+    # Raw bodies, read only up to the byte budget; oversized files are skipped by listed size
+    sources = await fetch_raw_files(
+        [(file, f"{GITHUB_API_URL}/repos/{owner}/{repo}/contents/{file}") for file in priority_files],
+        github_token,
+        client,
+        sizes=sizes,
+    )
     
+    snippets = compact_sources(sources, README_CONTEXT_TOKENS)
     return snippets if snippets else "No code snippets could be extracted"
 
 def extract_owner_repo(repo_url: str):
     # Handle various GitHub URL formats
     match = re.search(r"github\.com[/:]([^/]+)/([^/]+?)(?:\.git)?$", repo_url)
-    if match:
+    # Owner and repo end up in API paths and on-disk clone paths, so "." and
+    # ".." (or anything else GitHub would not accept as a name) are refused
+    if match and all(_GITHUB_NAME.match(part) and part not in (".", "..") for part in match.groups()):
         return match.group(1), match.group(2)
     raise ValueError(f"Invalid GitHub URL: {repo_url}")
 
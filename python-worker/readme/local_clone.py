@@ -0,0 +1,236 @@
+# local_clone.py
+import asyncio
+import base64
+import logging
+import mmap
+import os
+import re
+import shutil
+from typing import Callable, Dict, List, Optional, Tuple
+
+from readme.raw_content import GITHUB_CONTENT_READ_BYTES, decode_text
+from readme.repo_snapshot import SNAPSHOT_MAX_FILE_BYTES, RepoEntry, RepoSnapshot
+
+logger = logging.getLogger(__name__)
+
+# "api" (REST calls, the default) or "clone" (local git working copies)
+REPO_SOURCE = os.getenv("REPO_SOURCE", "api").lower()
+REPO_SOURCES = ("api", "clone")
+
+CLONE_CACHE_DIR = os.getenv("CLONE_CACHE_DIR", os.path.join(".cache", "clones"))
+CLONE_CACHE_MAX_REPOS = int(os.getenv("CLONE_CACHE_MAX_REPOS", "200"))
+CLONE_TIMEOUT = float(os.getenv("CLONE_TIMEOUT", "60"))
+# Where to clone from; tests point this at local bare repositories, e.g.
+# file:///srv/fixtures/{owner}/{repo}.git
+CLONE_URL_TEMPLATE = os.getenv("CLONE_URL_TEMPLATE", "https://github.com/{owner}/{repo}.git")
+# Files at least this large are read through mmap instead of a buffered read
+CLONE_MMAP_BYTES = int(os.getenv("CLONE_MMAP_BYTES", str(256 * 1024)))
+
+# Owner and repository names become path components under CLONE_CACHE_DIR
+_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+# One git operation at a time per working copy
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+class GitError(Exception):
+    pass
+
+
+def resolve_repo_source(source: Optional[str] = None) -> str:
+    """Per-request choice, falling back to REPO_SOURCE"""
+    source = (source or REPO_SOURCE).lower()
+    if source not in REPO_SOURCES:
+        raise ValueError(f"Unknown repository source: {source}")
+    return source
+
+
+def clone_url_for(owner: str, repo: str) -> str:
+    return CLONE_URL_TEMPLATE.format(owner=owner, repo=repo)
+
+
+def _git_env(github_token: Optional[str]) -> Dict[str, str]:
+    env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+    token = github_token or os.getenv("GITHUB_TOKEN")
+    if token:
+        # Passed through the environment so the token never shows up in the
+        # process list or gets written to the clone's .git/config
+        basic = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+        env.update({
+            "GIT_CONFIG_COUNT": "1",
+            "GIT_CONFIG_KEY_0": "http.https://github.com/.extraheader",
+            "GIT_CONFIG_VALUE_0": f"Authorization: Basic {basic}",
+        })
+    return env
+
+
+async def _git(*args: str, cwd: Optional[str] = None, github_token: Optional[str] = None, stdin: Optional[bytes] = None) -> str:
+    process = await asyncio.create_subprocess_exec(
+        "git", *args,
+        cwd=cwd,
+        env=_git_env(github_token),
+        stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(stdin), timeout=CLONE_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise GitError(f"git {args[0]} timed out after {CLONE_TIMEOUT}s")
+    if process.returncode != 0:
+        raise GitError(f"git {args[0]} failed: {stderr.decode(errors='replace').strip()}")
+    return stdout.decode(errors="replace")
+
+
+async def remote_head_sha(owner: str, repo: str, github_token: Optional[str] = None) -> Optional[str]:
+    """HEAD of the remote's default branch, without the REST API"""
+    try:
+        out = await _git("ls-remote", clone_url_for(owner, repo), "HEAD", github_token=github_token)
+    except GitError as e:
+        logger.warning("Could not resolve HEAD for %s/%s: %s", owner, repo, e)
+        return None
+    return out.split()[0] if out.strip() else None
+
+
+def _workdir(owner: str, repo: str) -> str:
+    for name in (owner, repo):
+        if not _NAME.match(name) or name in (".", ".."):
+            raise ValueError(f"Invalid repository name: {owner}/{repo}")
+    return os.path.join(CLONE_CACHE_DIR, owner.lower(), repo.lower())
+
+
+def _remove_workdir(path: str) -> None:
+    """rmtree, only ever for a working copy strictly inside CLONE_CACHE_DIR"""
+    root = os.path.realpath(CLONE_CACHE_DIR)
+    target = os.path.realpath(path)
+    if os.path.commonpath([root, target]) != root or target == root:
+        raise ValueError(f"Refusing to remove {path}: not inside {CLONE_CACHE_DIR}")
+    shutil.rmtree(target, ignore_errors=True)
+
+
+async def _sync_working_copy(path: str, url: str, ref: str, github_token: Optional[str]) -> None:
+    """
+    Shallow, blob-less clone with nothing checked out on first use; later
+    calls only fetch the new tip with --depth 1.
+    """
+    if os.path.isdir(os.path.join(path, ".git")):
+        await _git("fetch", "--depth", "1", "--filter=blob:none", "origin", ref, cwd=path, github_token=github_token)
+        await _git("update-ref", "HEAD", "FETCH_HEAD", cwd=path)
+        return
+
+    await asyncio.to_thread(_remove_workdir, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    await _git(
+        "clone", "--depth", "1", "--filter=blob:none", "--sparse", "--no-checkout",
+        "--branch", ref, url, path,
+        github_token=github_token,
+    )
+
+
+async def _list_tree(path: str) -> Dict[str, RepoEntry]:
+    """Tree of HEAD; needs only tree objects, so no blobs are downloaded"""
+    out = await _git("ls-tree", "-r", "-z", "HEAD", cwd=path)
+    entries = {}
+    for record in out.split("\0"):
+        if not record:
+            continue
+        meta, _, file_path = record.partition("\t")
+        _, kind, sha = meta.split()
+        if kind == "blob":
+            # Sizes would need the blobs; files are size-checked on disk instead
+            entries[file_path] = RepoEntry(path=file_path, sha=sha, size=0)
+    return entries
+
+
+async def _checkout(path: str, paths: List[str], github_token: Optional[str]) -> None:
+    """Materialize only `paths`; the partial clone fetches just those blobs"""
+    await _git("sparse-checkout", "set", "--no-cone", "--stdin", cwd=path, stdin="\n".join(f"/{p}" for p in paths).encode())
+    await _git("checkout", "--force", "HEAD", cwd=path, github_token=github_token)
+
+
+def read_file_prefix(file_path: str, max_bytes: int = GITHUB_CONTENT_READ_BYTES) -> Optional[str]:
+    """First max_bytes of a file as text; large files are mapped rather than read"""
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return ""
+    with open(file_path, "rb") as f:
+        if size < CLONE_MMAP_BYTES:
+            return decode_text(f.read(max_bytes))
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return decode_text(mapped[:max_bytes])
+
+
+def _read_contents(path: str, entries: Dict[str, RepoEntry], paths: List[str]) -> Dict[str, str]:
+    """Checked-out files as text, filling in entry sizes along the way"""
+    contents = {}
+    for file_path in paths:
+        full_path = os.path.join(path, file_path)
+        if not os.path.isfile(full_path):
+            continue
+        size = os.path.getsize(full_path)
+        entries[file_path].size = size
+        if size > SNAPSHOT_MAX_FILE_BYTES:
+            continue
+        text = read_file_prefix(full_path)
+        if text is not None:
+            contents[file_path] = text
+    return contents
+
+
+def _prune_cache(keep: str) -> None:
+    """Drop the least recently used working copies above CLONE_CACHE_MAX_REPOS"""
+    copies: List[Tuple[float, str]] = []
+    if not os.path.isdir(CLONE_CACHE_DIR):
+        return
+    for owner in os.listdir(CLONE_CACHE_DIR):
+        owner_dir = os.path.join(CLONE_CACHE_DIR, owner)
+        if not os.path.isdir(owner_dir):
+            continue
+        for repo in os.listdir(owner_dir):
+            path = os.path.join(owner_dir, repo)
+            copies.append((os.path.getmtime(path), path))
+    copies.sort()
+    for _, path in copies[: max(len(copies) - CLONE_CACHE_MAX_REPOS, 0)]:
+        lock = _locks.get(path)
+        if path != keep and not (lock and lock.locked()):
+            try:
+                _remove_workdir(path)
+            except ValueError as e:
+                logger.warning("Skipping clone cache entry: %s", e)
+                continue
+            _locks.pop(path, None)
+
+
+async def clone_snapshot(
+    owner: str,
+    repo: str,
+    ref: str,
+    wanted: Callable[[List[str]], List[str]],
+    github_token: Optional[str] = None,
+    url: Optional[str] = None,
+) -> RepoSnapshot:
+    """
+    Build a RepoSnapshot from a cached local working copy.
+
+    `wanted` is called with the full list of paths and returns the files to
+    read, so callers can rank the tree before anything is checked out.
+    """
+    path = _workdir(owner, repo)
+    lock = _locks.setdefault(path, asyncio.Lock())
+    async with lock:
+        await _sync_working_copy(path, url or clone_url_for(owner, repo), ref, github_token)
+        os.utime(path)
+        entries = await _list_tree(path)
+        tree_sha = (await _git("rev-parse", "HEAD^{tree}", cwd=path)).strip()
+
+        paths = [p for p in dict.fromkeys(wanted(list(entries))) if p in entries]
+        if paths:
+            await _checkout(path, paths, github_token)
+
+        # File reads and directory walks stay off the event loop
+        contents = await asyncio.to_thread(_read_contents, path, entries, paths)
+
+    await asyncio.to_thread(_prune_cache, path)
+    return RepoSnapshot(owner=owner, repo=repo, ref=ref, tree_sha=tree_sha, entries=entries, contents=contents)
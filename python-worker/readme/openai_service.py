@@ -1,19 +1,51 @@
 # openai_service.py
+import asyncio
+import logging
 import os
-from openai import OpenAI
 import json
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
+from core.metrics import counter
+from llm.gateway import chat_completion, StreamedCompletion
+from llm.scheduler import PRIORITY_BACKGROUND
+from llm.json_stream import JsonArrayStreamParser
+from llm.tokens import count_message_tokens
+from readme.context_compactor import format_file_listing, format_sources, format_user_input
+from readme.tiptap import REQUIRED_SECTIONS, TiptapReport, normalize_doc, normalize_nodes, parse_tiptap, replace_section
 
 load_dotenv()
 
-api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
+logger = logging.getLogger(__name__)
 
-async def generate_readme_from_context(context: dict):
-    print("GENERATE FUNCTION CALLED")
-    print("API KEY available:", bool(api_key))
+README_FIXES = counter("readme_output_fixes_total", "Model README outputs that needed normalizing, and sections regenerated", ("kind",))
 
-    prompt = f"""
+# "single" (one completion writes the whole README) or "sections" (one
+# completion per section, run concurrently and assembled in order)
+README_GENERATION = os.getenv("README_GENERATION", "single").lower()
+README_GENERATION_MODES = ("single", "sections")
+# Output cap for a single generated or regenerated section
+README_SECTION_MAX_TOKENS = int(os.getenv("README_SECTION_MAX_TOKENS", "800"))
+# Sections are not regenerated when less than this is left of the credit allowance
+README_REPAIR_MIN_TOKENS = int(os.getenv("README_REPAIR_MIN_TOKENS", "150"))
+
+README_SYSTEM_MESSAGE = "You are a README generator that outputs only TipTap JSON. Output exactly one JSON object with type: 'doc' and content array."
+
+def format_repo_context(context: dict) -> str:
+    """The repository block shared by the README and section prompts"""
+    code_snippets = context.get('code_snippets')
+    formatted_snippets = format_sources(code_snippets) if isinstance(code_snippets, dict) and code_snippets else 'No code snippets available'
+    return f"""Repository Context:
+- Repo Name: {context['repo_meta'].get('name', 'Unknown')}
+- Description: {context['repo_meta'].get('description', '')}
+- Primary Language: {context['repo_meta'].get('language', '')}
+- Files: {format_file_listing(context['files'])}
+- User Input: {format_user_input(context['user_input'])}
+- Important Code (signatures, imports and manifests):
+{formatted_snippets}
+"""
+
+def build_readme_prompt(context: dict) -> str:
+    return f"""
 You are an expert technical writer and TipTap (ProseMirror) content generator.
 
 Objective:
@@ -28,14 +60,7 @@ Strict Output Contract:
 - **Never** use snake_case variants like "bullet_list" or "list_item" - always use camelCase
 - Ensure every node has required attributes (e.g., heading must have "level" and "textAlign")
 
-Repository Context:
-- Repo Name: {context['repo_meta'].get('name', 'Unknown')}
-- Description: {context['repo_meta'].get('description', '')}
-- Primary Language: {context['repo_meta'].get('language', '')}
-- Files: {context['files']}
-- User Input: {context['user_input']}
-- Important Code Snippets: {context.get('code_snippets', 'No code snippets available')}
-
+{format_repo_context(context)}
 Content Requirements:
 - Minimum 300 words, descriptive yet casual tone
 - **Required sections**: Overview, Features, Installation, Usage, Code Explanation
@@ -60,40 +85,292 @@ Output:
 **ONLY** the complete TipTap JSON object that passes all validation rules. No other text.
 """
 
+def build_readme_messages(context: dict) -> list:
+    return [
+        {"role": "system", "content": README_SYSTEM_MESSAGE},
+        {"role": "user", "content": build_readme_prompt(context)},
+    ]
+
+# What each planned section covers in "sections" mode
+README_SECTION_GUIDANCE = {
+    "Overview": "What the project does, the problem it solves and who it is for, in one or two paragraphs.",
+    "Features": "A bulletList of the main features, each with a short explanation.",
+    "Installation": "Prerequisites and step-by-step setup, with the commands in codeBlock nodes.",
+    "Usage": "How to run and use the project, with at least one codeBlock example.",
+    "Code Explanation": "A walkthrough of the most important files and functions, quoting one or two short excerpts from the code above in codeBlock nodes.",
+}
+
+def resolve_readme_mode(mode: Optional[str] = None) -> str:
+    """Per-request choice, falling back to README_GENERATION"""
+    mode = (mode or README_GENERATION).lower()
+    if mode not in README_GENERATION_MODES:
+        raise ValueError(f"Unknown README generation mode: {mode}")
+    return mode
+
+def build_section_messages(context: dict, title: str, level: int = 2, guidance: Optional[str] = None) -> list:
+    """Prompt for a single README section, sharing the repository context of the full prompt"""
+    prompt = f"""
+You are an expert technical writer and TipTap (ProseMirror) content generator.
+
+Objective:
+Write **only** the "{title}" section of this repository's README as a single valid TipTap JSON object.
+It is one section of a longer README, so do not write any other section.
+
+Strict Output Contract:
+- Output **exactly one valid TipTap JSON object**: {{"type": "doc", "content": [array_of_nodes]}}
+- The first node must be a heading titled "{title}" with an emoji before the text and {{"attrs": {{"level": {level}, "textAlign": "left"}}}}
+- Use **only these valid TipTap node types**: "paragraph", "heading", "bulletList", "listItem", "codeBlock", "text"
+- Use **only these valid mark types**: "bold", "italic", "code", "underline"
+- Every paragraph node must have: {{"attrs": {{"textAlign": "left"}}}}
+- Every codeBlock node must have: {{"attrs": {{"language": "language-name"}}}}
+- All text nodes must be nested within paragraph or other container nodes
+
+{format_repo_context(context)}
+Section Requirements:
+- {guidance or f"Cover the {title} of this repository."}
+- Descriptive yet casual tone; no markdown or HTML in text content
+
+Output:
+**ONLY** the TipTap JSON object. No other text.
+"""
+    return [
+        {"role": "system", "content": README_SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt},
+    ]
+
+async def generate_section(messages: list, max_tokens: Optional[int] = None) -> Tuple[List[dict], int]:
+    """(normalized nodes, used tokens) for one section completion"""
+    response = await chat_completion(
+        model="gpt-4o-mini",
+        priority=PRIORITY_BACKGROUND,
+        messages=messages,
+        response_format={"type": "json_object"},
+        **({"max_tokens": max_tokens} if max_tokens is not None else {})
+    )
+    used = response.usage.total_tokens if response.usage else 0
+    data, _ = parse_tiptap(response.choices[0].message.content or "")
+    doc, _ = normalize_doc(data)
+    return doc["content"], used
+
+async def repair_readme(context: dict, doc: dict, report: TiptapReport, allowance: Optional[int]) -> Tuple[dict, int]:
+    """
+    Regenerate only the sections the normalizer could not fix (and, when the
+    JSON itself was broken, the required sections that went missing), each
+    as its own small completion. allowance is the output budget left from
+    the README reservation; None means unlimited.
+    """
+    targets = [(s, s.title, s.level) for s in report.broken_sections]
+    if report.salvaged or not doc["content"]:
+        targets += [(None, title, 2) for title in report.missing_sections()]
+    if not targets:
+        return doc, 0
+
+    calls = []
+    share = allowance // len(targets) if allowance is not None else None
+    for section, title, level in targets:
+        messages = build_section_messages(context, title, level)
+        cap = README_SECTION_MAX_TOKENS
+        if share is not None:
+            cap = min(cap, share - count_message_tokens(messages))
+        if cap < README_REPAIR_MIN_TOKENS:
+            logger.info("Not enough credits left to regenerate the %s section", title)
+            continue
+        calls.append((section, title, generate_section(messages, cap)))
+    if not calls:
+        return doc, 0
+
+    logger.info("Regenerating README sections: %s", ", ".join(title for _, title, _ in calls))
+    README_FIXES.inc(len(calls), kind="section_regenerated")
+    results = await asyncio.gather(*(call for _, _, call in calls), return_exceptions=True)
+    content = list(doc["content"])
+    used = 0
+    appended = []
+    # Replace from the end so earlier section offsets stay valid
+    outcomes = [(section, title, result) for (section, title, _), result in zip(calls, results)]
+    for section, title, result in sorted(outcomes, key=lambda o: o[0].start if o[0] else -1, reverse=True):
+        if isinstance(result, BaseException):
+            logger.warning("Regenerating the %s section failed: %s", title, result)
+            continue
+        nodes, tokens = result
+        used += tokens
+        if section is None:
+            appended.append((REQUIRED_SECTIONS.index(title), nodes))
+        elif nodes:
+            content = replace_section(content, section, nodes)
+    for _, nodes in sorted(appended, key=lambda a: a[0]):
+        content.extend(nodes)
+    return {"type": "doc", "content": content}, used
+
+def plan_readme_sections(context: dict) -> List[Tuple[str, list]]:
+    """
+    (title, messages) for every README section in "sections" mode. The plan is
+    the README prompt's required section list, so it costs no extra round trip.
+    """
+    return [
+        (title, build_section_messages(context, title, 2, README_SECTION_GUIDANCE[title]))
+        for title in REQUIRED_SECTIONS
+    ]
+
+def readme_title_node(context: dict) -> dict:
+    name = context['repo_meta'].get('name') or 'Project'
+    return {"type": "heading", "attrs": {"level": 1, "textAlign": "left"}, "content": [{"type": "text", "text": f"📦 {name}"}]}
+
+def _section_caps(plan: List[Tuple[str, list]], max_tokens: Optional[int]) -> List[int]:
+    """Output cap per section: an even share of the reservation, at most README_SECTION_MAX_TOKENS"""
+    if max_tokens is None:
+        return [README_SECTION_MAX_TOKENS] * len(plan)
+    return [min(README_SECTION_MAX_TOKENS, max_tokens // len(plan)) for _ in plan]
+
+def _start_sections(plan: List[Tuple[str, list]], max_tokens: Optional[int]) -> List[asyncio.Task]:
+    return [
+        asyncio.create_task(generate_section(messages, cap))
+        for (_, messages), cap in zip(plan, _section_caps(plan, max_tokens))
+    ]
+
+async def _assemble_sections(context: dict, plan: List[Tuple[str, list]], tasks: List[asyncio.Task], max_tokens: Optional[int]):
+    """
+    Yield ("node", node) for each section in plan order as soon as it and
+    every section before it are done, then ("done", {"readme", "used_credits"}).
+    """
+    content = [readme_title_node(context)]
+    yield "node", content[0]
+    used = 0
+    try:
+        for (title, _), task in zip(plan, tasks):
+            try:
+                nodes, tokens = await task
+                used += tokens
+            except Exception as e:
+                logger.warning("Generating the %s section failed: %s", title, e)
+                nodes = []
+            if not nodes:
+                # An empty heading marks the section as broken, so repair_readme
+                # regenerates it in place if credits allow
+                content.append({"type": "heading", "attrs": {"level": 2, "textAlign": "left"}, "content": [{"type": "text", "text": title}]})
+                continue
+            content.extend(nodes)
+            for node in nodes:
+                yield "node", node
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    doc, report = normalize_doc({"type": "doc", "content": content})
+    allowance = None
+    if max_tokens is not None:
+        # The reservation covered every section prompt plus max_tokens of output
+        allowance = max_tokens + sum(count_message_tokens(messages) for _, messages in plan) - used
+    doc, repair_credits = await repair_readme(context, doc, report, allowance)
+    yield "done", {"readme": doc, "used_credits": used + repair_credits}
+
+async def generate_readme_sections(context: dict, plan: List[Tuple[str, list]], max_tokens: Optional[int] = None):
+    """
+    Write the README as concurrent per-section completions from the shared
+    repository context, assembled in plan order. Wall-clock time is that of
+    the slowest section rather than the whole document.
+    """
+    result = None
+    async for event, data in _assemble_sections(context, plan, _start_sections(plan, max_tokens), max_tokens):
+        if event == "done":
+            result = data
+    return result
+
+async def stream_readme_sections(context: dict, plan: List[Tuple[str, list]], max_tokens: Optional[int] = None):
+    """Streaming counterpart of generate_readme_sections, with the same events as stream_readme_from_context"""
+    async for event, data in _assemble_sections(context, plan, _start_sections(plan, max_tokens), max_tokens):
+        yield event, data
+
+async def finish_readme(context: dict, raw: str, allowance: Optional[int]) -> Tuple[dict, int]:
+    """Validate and normalize raw README output, re-prompting only for broken sections"""
+    data, salvaged = parse_tiptap(raw)
+    doc, report = normalize_doc(data)
+    report.salvaged = salvaged
+    if report.fixes:
+        README_FIXES.inc(kind="normalized")
+        logger.info("Normalized README output: %d fixes (%s)", len(report.fixes), "; ".join(dict.fromkeys(report.fixes)))
+    doc, used = await repair_readme(context, doc, report, allowance)
+    if not doc["content"]:
+        raise ValueError("Invalid TipTap JSON structure returned by OpenAI")
+    return doc, used
 
+async def generate_readme_from_context(context: dict, messages: Optional[list] = None, max_tokens: Optional[int] = None):
     try:
-        response = client.chat.completions.create(
+        response = await chat_completion(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a README generator that outputs only TipTap JSON. Output exactly one JSON object with type: 'doc' and content array."},
-                {"role": "user", "content": prompt},
-            ],
-            response_format={"type": "json_object"}
+            priority=PRIORITY_BACKGROUND,
+            messages=messages or build_readme_messages(context),
+            response_format={"type": "json_object"},
+            **({"max_tokens": max_tokens} if max_tokens is not None else {})
         )
-        print("OpenAI response received")
+
+        # Cut off by the credit-derived max_tokens: the JSON is incomplete
+        if response.choices[0].finish_reason == "length":
+            return {
+                "error": "insufficient_credits",
+                "used_credits": response.usage.total_tokens if response.usage else 0
+            }
 
         raw = response.choices[0].message.content
         if not raw:
             raise ValueError("Empty response from OpenAI")
 
-        data = json.loads(raw)
-        
-        # Ensure the response has the correct structure
-        if not isinstance(data, dict) or data.get("type") != "doc" or "content" not in data:
-            raise ValueError("Invalid TipTap JSON structure returned by OpenAI")
-        
-        if response.usage:
-            print("USED CREDITS:::::::::::::::::::::::::::::::::::::::::::::::::: ",response.usage.total_tokens)
+        used_credits = response.usage.total_tokens if response.usage else 0
+        # What is left of the reservation once this call's output is paid for
+        allowance = max_tokens - response.usage.completion_tokens if max_tokens is not None and response.usage else max_tokens
+        data, repair_credits = await finish_readme(context, raw, allowance)
+        used_credits += repair_credits
         
         # Return direct structure without nesting
         return {
             "readme": data,  # Direct TipTap JSON
-            "used_credits": response.usage.total_tokens if response.usage else 0
+            "used_credits": used_credits
         }
 
-    except json.JSONDecodeError as e:
-        print("JSON parsing failed, raw output:\n", raw)
-        raise ValueError(f"JSON parsing error: {str(e)}")
     except Exception as e:
-        print(f"OpenAI API error: {str(e)}")
-        raise
\ No newline at end of file
+        logger.error("README generation failed: %s", e)
+        raise
+
+async def stream_readme_from_context(context: dict, messages: Optional[list] = None, max_tokens: Optional[int] = None):
+    """
+    Stream README generation, yielding ("node", node) for each top-level TipTap
+    node as soon as it is complete and finally ("done", {"readme", "used_credits"}),
+    or ("error", {...}) when the output ran past max_tokens.
+    """
+    completion = StreamedCompletion(
+        model="gpt-4o-mini",
+        priority=PRIORITY_BACKGROUND,
+        messages=messages or build_readme_messages(context),
+        response_format={"type": "json_object"},
+        **({"max_tokens": max_tokens} if max_tokens is not None else {})
+    )
+    messages = completion.messages
+    parser = JsonArrayStreamParser("content")
+    chunks = []
+
+    async for delta in completion:
+        chunks.append(delta)
+        if parser is None:
+            continue
+        try:
+            nodes = parser.feed(delta)
+        except json.JSONDecodeError:
+            # Malformed node: stop streaming nodes, the final doc is repaired below
+            parser = None
+            continue
+        for node in normalize_nodes(nodes):
+            yield "node", node
+
+    if completion.finish_reason == "length":
+        yield "error", {"error": "insufficient_credits", "used_credits": completion.total_tokens}
+        return
+
+    raw = "".join(chunks)
+    if not raw:
+        raise ValueError("Empty response from OpenAI")
+
+    allowance = max_tokens
+    if max_tokens is not None:
+        allowance = max_tokens - (completion.total_tokens - count_message_tokens(messages))
+    data, repair_credits = await finish_readme(context, raw, allowance)
+
+    yield "done", {"readme": data, "used_credits": completion.total_tokens + repair_credits}
@@ -0,0 +1,206 @@
+# pipeline.py
+import logging
+import os
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from core.cache import CacheBackend, create_cache
+from core.single_flight import SingleFlight
+from core.tracing import stage
+from readme.analysis_service import build_analysis_messages, get_relevant_code_snippets, run_analysis
+from readme.github_service import (
+    build_repo_snapshot,
+    extract_code_snippets,
+    extract_owner_repo,
+    fetch_head_sha,
+    fetch_root_listing,
+    fetch_repo_metadata,
+    normalize_github_metadata,
+)
+from readme.local_clone import remote_head_sha, resolve_repo_source
+from readme.rate_limit import credential_key
+from readme.repo_snapshot import RepoSnapshot
+
+logger = logging.getLogger(__name__)
+
+# "shared" (default: memory, plus the store shared by worker processes when
+# SHARED_STATE is set), "memory", "sqlite" (memory + on-disk store that
+# survives restarts) or "none"
+REPO_CONTEXT_CACHE = os.getenv("REPO_CONTEXT_CACHE", "shared")
+REPO_CONTEXT_CACHE_PATH = os.getenv("REPO_CONTEXT_CACHE_PATH")
+REPO_CONTEXT_CACHE_TTL = float(os.getenv("REPO_CONTEXT_CACHE_TTL", "86400"))
+REPO_CONTEXT_CACHE_ENTRIES = int(os.getenv("REPO_CONTEXT_CACHE_ENTRIES", "128"))
+REPO_CONTEXT_CACHE_BYTES = int(os.getenv("REPO_CONTEXT_CACHE_BYTES", str(64 * 1024 * 1024)))
+REPO_CONTEXT_CACHE_DISK_BYTES = int(os.getenv("REPO_CONTEXT_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+
+_repo_context_cache: Optional[CacheBackend] = None
+
+# Concurrent requests for the same repository share one collection / analysis,
+# across worker processes too when SHARED_STATE is set
+_context_flights = SingleFlight("repo context", dump=lambda ctx: ctx.to_dict(), load=lambda data: RepoContext.from_dict(data))
+_analysis_flights = SingleFlight("repository analysis", dump=dict, load=dict)
+
+# Called with the name of each pipeline stage as it starts (used by background jobs)
+ProgressFn = Optional[Callable[[str], None]]
+
+
+def report_stage(progress: ProgressFn, stage: str) -> None:
+    if progress is not None:
+        progress(stage)
+
+
+def get_repo_context_cache() -> CacheBackend:
+    global _repo_context_cache
+    if _repo_context_cache is None:
+        _repo_context_cache = create_cache(
+            "repo_context",
+            backend=REPO_CONTEXT_CACHE,
+            max_entries=REPO_CONTEXT_CACHE_ENTRIES,
+            max_bytes=REPO_CONTEXT_CACHE_BYTES,
+            ttl=REPO_CONTEXT_CACHE_TTL,
+            path=REPO_CONTEXT_CACHE_PATH,
+            disk_max_bytes=REPO_CONTEXT_CACHE_DISK_BYTES,
+        )
+    return _repo_context_cache
+
+
+@dataclass
+class RepoContext:
+    """Everything we collect from GitHub for one repository, gathered once per request"""
+    repo_url: str
+    github_token: Optional[str]
+    raw_metadata: Dict[str, Any]
+    normalized_metadata: Dict[str, Any]
+    files: List[str]
+    code_snippets: Union[Dict[str, str], str]
+    snapshot: Optional[RepoSnapshot] = None
+    head_sha: Optional[str] = None
+
+    @property
+    def has_code_snippets(self) -> bool:
+        return bool(self.code_snippets and self.code_snippets != "No code snippets could be extracted")
+
+    def to_dict(self) -> Dict[str, Any]:
+        # The token is per request and never written to the cache
+        return {
+            "repo_url": self.repo_url,
+            "raw_metadata": self.raw_metadata,
+            "normalized_metadata": self.normalized_metadata,
+            "files": self.files,
+            "code_snippets": self.code_snippets,
+            "snapshot": self.snapshot.to_dict() if self.snapshot else None,
+            "head_sha": self.head_sha,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], github_token: Optional[str] = None) -> "RepoContext":
+        data = dict(data)
+        snapshot = data.pop("snapshot", None)
+        return cls(
+            github_token=github_token,
+            snapshot=RepoSnapshot.from_dict(snapshot) if snapshot else None,
+            **data,
+        )
+
+
+async def collect_repo_context(repo_url: str, github_token: Optional[str] = None, client: Optional[httpx.AsyncClient] = None, progress: ProgressFn = None, source: Optional[str] = None) -> RepoContext:
+    """
+    Collect a repository's context, reusing a cached copy when HEAD has not moved.
+
+    The cache key is owner/repo@<HEAD sha>; resolving HEAD is a single small
+    request that also proves the caller can still see the repository.
+    source is "api" or "clone" (see local_clone.py), defaulting to REPO_SOURCE.
+    """
+    report_stage(progress, "metadata")
+    source = resolve_repo_source(source)
+    owner, repo = extract_owner_repo(repo_url)
+    with stage("head", source=source):
+        if source == "clone":
+            head_sha = await remote_head_sha(owner, repo, github_token)
+        else:
+            head_sha = await fetch_head_sha(repo_url, github_token, client)
+    cache_key = f"{owner}/{repo}@{head_sha}".lower() if head_sha else None
+
+    cache = get_repo_context_cache()
+    if cache_key:
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            logger.info("Repository context cache hit", extra={"repo": cache_key})
+            return RepoContext.from_dict(cached, github_token)
+
+    async def fetch() -> RepoContext:
+        ctx = await _fetch_repo_context(repo_url, github_token, client, progress, source)
+        ctx.head_sha = head_sha
+        if cache_key:
+            await cache.aset(cache_key, ctx.to_dict())
+        return ctx
+
+    # Each caller has already resolved HEAD with its own token above, so only
+    # the collection itself is shared; without a SHA, only same-credential calls are
+    flight_key = f"{source}:{cache_key}" if cache_key else f"{source}:{owner}/{repo}:{credential_key(github_token)}".lower()
+    ctx, shared = await _context_flights.do(flight_key, fetch)
+    return replace(ctx, github_token=github_token) if shared else ctx
+
+
+async def _fetch_repo_context(repo_url: str, github_token: Optional[str] = None, client: Optional[httpx.AsyncClient] = None, progress: ProgressFn = None, source: str = "api") -> RepoContext:
+    # 1. Fetch repo metadata
+    with stage("metadata"):
+        raw_metadata = await fetch_repo_metadata(repo_url, github_token, client)
+        normalized_metadata = normalize_github_metadata(raw_metadata)
+
+    report_stage(progress, "files")
+    # 2. Snapshot the repository tree and the files we need in 2-3 calls
+    with stage("files", source=source):
+        snapshot = await build_repo_snapshot(repo_url, raw_metadata, github_token, client, source=source)
+        sizes = None
+        if snapshot:
+            files = snapshot.root_files()
+        else:
+            sizes = await fetch_root_listing(repo_url, github_token, client)
+            files = list(sizes)
+
+    report_stage(progress, "snippets")
+    # 3. README snippets come from the snapshot, so no further GitHub calls
+    with stage("snippets"):
+        code_snippets = await extract_code_snippets(repo_url, files, github_token, client, snapshot=snapshot, sizes=sizes)
+    logger.debug("Repository context collected", extra={"repo": repo_url, "files": len(files), "snippets": len(code_snippets)})
+
+    return RepoContext(
+        repo_url=repo_url,
+        github_token=github_token,
+        raw_metadata=raw_metadata,
+        normalized_metadata=normalized_metadata,
+        files=files,
+        code_snippets=code_snippets,
+        snapshot=snapshot,
+    )
+
+
+async def prepare_repo_analysis(ctx: RepoContext) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+    """Analysis prompt and the code snippets it was built from, without calling the model"""
+    code_snippets = await get_relevant_code_snippets(ctx.repo_url, ctx.github_token, snapshot=ctx.snapshot)
+    return build_analysis_messages(ctx.normalized_metadata, ctx.files, code_snippets), code_snippets
+
+
+async def analyze_repo_context(ctx: RepoContext, prepared: Optional[Tuple[List[Dict[str, str]], Dict[str, str]]] = None, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """Repository analysis over an already collected context"""
+    messages, code_snippets = prepared or await prepare_repo_analysis(ctx)
+    with stage("analysis"):
+        return await run_analysis(messages, ctx.normalized_metadata, ctx.files, code_snippets, max_tokens)
+
+
+async def shared_repo_analysis(ctx: RepoContext) -> Dict[str, Any]:
+    """
+    analyze_repo_context for the /repository-analysis endpoint, with concurrent
+    requests for the same commit sharing one model call. Callers that joined
+    another's call get used_credits 0, like a cache hit.
+    """
+    if not ctx.head_sha:
+        return await analyze_repo_context(ctx)
+    owner, repo = extract_owner_repo(ctx.repo_url)
+    result, shared = await _analysis_flights.do(f"{owner}/{repo}@{ctx.head_sha}".lower(), lambda: analyze_repo_context(ctx))
+    if shared and "used_credits" in result:
+        result = {**result, "used_credits": 0}
+    return result
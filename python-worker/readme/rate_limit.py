@@ -0,0 +1,289 @@
+# rate_limit.py
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, TypeVar
+
+import httpx
+
+from core.metrics import counter, histogram
+from core.shared_state import SharedState, open_shared_state
+
+logger = logging.getLogger(__name__)
+
+# Requests are delayed at most this long waiting for quota; beyond it the
+# limited response is returned so the caller can fail fast
+GITHUB_RATE_LIMIT_MAX_WAIT = float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT", "30"))
+# Below this share of the hourly quota, requests are spread evenly until the reset
+GITHUB_RATE_LIMIT_PACE_BELOW = float(os.getenv("GITHUB_RATE_LIMIT_PACE_BELOW", "0.1"))
+# Requests kept back from each credential's quota (e.g. for other services using the token)
+GITHUB_RATE_LIMIT_RESERVE = int(os.getenv("GITHUB_RATE_LIMIT_RESERVE", "0"))
+# First wait after a secondary rate limit without Retry-After; doubles each time
+GITHUB_SECONDARY_BACKOFF = float(os.getenv("GITHUB_SECONDARY_BACKOFF", "60"))
+# Quota state unused for this long is dropped (GitHub's windows are an hour)
+GITHUB_QUOTA_TTL = float(os.getenv("GITHUB_QUOTA_TTL", "3600"))
+
+RATE_LIMIT_WAIT_SECONDS = histogram("github_rate_limit_wait_seconds", "Time GitHub requests were held for their credential's quota")
+RATE_LIMITED = counter("github_rate_limited_total", "Rate-limited GitHub responses, and requests refused locally", ("source",))
+
+_limiter: Optional["GitHubRateLimiter"] = None
+
+T = TypeVar("T")
+
+
+@dataclass
+class CredentialQuota:
+    """Rate limit state for one credential, as last reported by GitHub"""
+    key: str
+    limit: Optional[int] = None
+    remaining: Optional[int] = None
+    reset_at: Optional[float] = None
+    resource: Optional[str] = None
+    blocked_until: float = 0.0
+    secondary_backoff: float = 0.0
+    next_slot: float = 0.0
+    in_flight: int = 0
+
+    def available(self, now: float) -> Optional[int]:
+        """Requests we can still start before the reset (None when unknown)"""
+        if self.remaining is None or (self.reset_at is not None and now >= self.reset_at):
+            return None
+        return self.remaining - self.in_flight - GITHUB_RATE_LIMIT_RESERVE
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "credential": self.key,
+            "resource": self.resource,
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset_in": round(self.reset_at - now, 1) if self.reset_at else None,
+            "blocked_for": round(max(self.blocked_until - now, 0), 1),
+            "in_flight": self.in_flight,
+        }
+
+
+def credential_key(authorization: Optional[str]) -> str:
+    """Stable, non-reversible id for a credential (anonymous requests share one bucket)"""
+    if not authorization:
+        return "anonymous"
+    return hashlib.sha256(authorization.encode()).hexdigest()[:12]
+
+
+def _header_int(response: httpx.Response, name: str) -> Optional[int]:
+    try:
+        return int(response.headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    try:
+        return max(float(response.headers["Retry-After"]), 0.0)
+    except (KeyError, ValueError):
+        return None
+
+
+def is_rate_limited(response: httpx.Response) -> bool:
+    """403/429 caused by a primary or secondary rate limit"""
+    if response.status_code not in (403, 429):
+        return False
+    if response.status_code == 429 or "Retry-After" in response.headers:
+        return True
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        return True
+    try:
+        return "rate limit" in response.text.lower()
+    except httpx.ResponseNotRead:
+        return False
+
+
+class GitHubRateLimiter:
+    """
+    Per-credential scheduler fed by X-RateLimit-* and Retry-After headers.
+
+    Before a request it waits while the credential is blocked (secondary
+    limit or exhausted quota), and once quota runs low it spaces requests
+    evenly until the reset instead of spending the rest in one burst.
+    Quotas live in a SharedState store and every change to one is a single
+    atomic update, so with a shared SHARED_STATE all worker processes book
+    against the same quota.
+    """
+
+    def __init__(self, max_wait: float = GITHUB_RATE_LIMIT_MAX_WAIT, store: Optional[SharedState] = None):
+        self.max_wait = max_wait
+        self._store = store or open_shared_state("github_quota", ttl=GITHUB_QUOTA_TTL)
+        self._keys: Set[str] = set()
+
+    async def quota(self, key: str) -> CredentialQuota:
+        data = await self._store.aget(key)
+        return CredentialQuota(**data) if data else CredentialQuota(key=key)
+
+    async def _change(self, key: str, change: Callable[[CredentialQuota], T]) -> T:
+        """Apply change to the credential's quota in one atomic update and return what it returned"""
+        self._keys.add(key)
+        outcome = None
+
+        def apply(data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            nonlocal outcome
+            quota = CredentialQuota(**data) if data else CredentialQuota(key=key)
+            outcome = change(quota)
+            return asdict(quota)
+
+        await self._store.aupdate(key, apply)
+        return outcome
+
+    def delay_for(self, quota: CredentialQuota, now: float) -> float:
+        """Seconds to hold the next request for this credential"""
+        if quota.blocked_until > now:
+            return quota.blocked_until - now
+        available = quota.available(now)
+        if available is None:
+            return 0.0
+        if available <= 0:
+            return max((quota.reset_at or now) - now, 0.0)
+        if self._pacing(quota, available):
+            return max(quota.next_slot - now, 0.0)
+        return 0.0
+
+    @staticmethod
+    def _pacing(quota: CredentialQuota, available: Optional[int]) -> bool:
+        return bool(quota.limit and quota.reset_at and available and available < quota.limit * GITHUB_RATE_LIMIT_PACE_BELOW)
+
+    async def acquire(self, key: str) -> bool:
+        """Wait for a slot; False when the wait would exceed max_wait"""
+        def book(quota: CredentialQuota) -> Optional[float]:
+            now = time.time()
+            delay = self.delay_for(quota, now)
+            if delay > self.max_wait:
+                return None
+            available = quota.available(now)
+            if self._pacing(quota, available):
+                # Book the following slot so concurrent callers queue behind this one
+                quota.next_slot = max(quota.next_slot, now + delay) + (quota.reset_at - now) / available
+            quota.in_flight += 1
+            return delay
+
+        delay = await self._change(key, book)
+        if delay is None:
+            RATE_LIMITED.inc(source="local")
+            return False
+        if delay > 0:
+            logger.info("Holding GitHub request for %.1fs", delay, extra={"credential": key})
+            RATE_LIMIT_WAIT_SECONDS.observe(delay)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                # The slot was booked above; a caller that gives up must hand it back
+                await self.release(key)
+                raise
+        return True
+
+    async def release(self, key: str) -> None:
+        def finish(quota: CredentialQuota) -> None:
+            quota.in_flight = max(quota.in_flight - 1, 0)
+
+        await self._change(key, finish)
+
+    async def record(self, key: str, response: httpx.Response) -> Optional[float]:
+        """
+        Update the credential from response headers. For a rate-limited
+        response, return how long to wait before retrying.
+        """
+        remaining = _header_int(response, "X-RateLimit-Remaining")
+        limited = is_rate_limited(response)
+
+        def apply(quota: CredentialQuota) -> Optional[float]:
+            now = time.time()
+            if remaining is not None:
+                quota.remaining = remaining
+                quota.limit = _header_int(response, "X-RateLimit-Limit") or quota.limit
+                reset = _header_int(response, "X-RateLimit-Reset")
+                quota.reset_at = float(reset) if reset is not None else quota.reset_at
+                quota.resource = response.headers.get("X-RateLimit-Resource", quota.resource)
+
+            if not limited:
+                quota.secondary_backoff = 0.0
+                return None
+
+            wait = retry_after_seconds(response)
+            if wait is None and remaining == 0 and quota.reset_at:
+                # Primary limit: nothing left until the window resets
+                wait = max(quota.reset_at - now, 1.0)
+            if wait is None:
+                # Secondary limit without Retry-After: back off exponentially
+                quota.secondary_backoff = quota.secondary_backoff * 2 if quota.secondary_backoff else GITHUB_SECONDARY_BACKOFF
+                wait = quota.secondary_backoff
+            quota.blocked_until = max(quota.blocked_until, now + wait)
+            return wait
+
+        wait = await self._change(key, apply)
+        if wait is not None:
+            RATE_LIMITED.inc(source="github")
+            logger.warning("GitHub rate limit hit (%s), blocked for %.0fs", response.status_code, wait, extra={"credential": key})
+        return wait
+
+    async def report(self) -> List[Dict[str, Any]]:
+        """Quotas of the credentials this process has used"""
+        quotas = [await self.quota(key) for key in sorted(self._keys)]
+        now = time.time()
+        return [quota.to_dict(now) for quota in quotas]
+
+
+def get_github_rate_limiter() -> GitHubRateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = GitHubRateLimiter()
+    return _limiter
+
+
+class RateLimitTransport(httpx.AsyncBaseTransport):
+    """
+    Route every GitHub request through the rate limiter for its credential.
+
+    A rate-limited GET is retried once the block lifts if that is within
+    max_wait; otherwise the 403/429 is returned for the caller to report.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: Optional[GitHubRateLimiter] = None, retries: int = 2):
+        self._transport = transport
+        self._limiter = limiter
+        self.retries = retries
+
+    @property
+    def limiter(self) -> GitHubRateLimiter:
+        return self._limiter or get_github_rate_limiter()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = credential_key(request.headers.get("Authorization"))
+        limiter = self.limiter
+        attempt = 0
+        while True:
+            if not await limiter.acquire(key):
+                return _limited_response(request, await limiter.quota(key))
+            try:
+                response = await self._transport.handle_async_request(request)
+            finally:
+                await limiter.release(key)
+
+            if response.status_code in (403, 429):
+                # Small error bodies; needed to recognise secondary limits
+                await response.aread()
+            wait = await limiter.record(key, response)
+            if wait is None or request.method != "GET" or attempt >= self.retries or wait > limiter.max_wait:
+                return response
+            await response.aclose()
+            attempt += 1
+
+
+def _limited_response(request: httpx.Request, quota: CredentialQuota) -> httpx.Response:
+    """Local 429 for requests that would have to wait longer than max_wait"""
+    retry_after = max(quota.blocked_until, quota.reset_at or 0) - time.time()
+    return httpx.Response(
+        429,
+        headers={"Retry-After": str(max(int(retry_after), 1)), "X-RateLimit-Remaining": str(max(quota.remaining or 0, 0))},
+        json={"message": "API rate limit exceeded (held back by the worker)"},
+        request=request,
+    )
@@ -0,0 +1,103 @@
+# raw_content.py
+import codecs
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from readme.fetcher import TRUNCATED, fetch_concurrently
+from readme.github_client import auth_headers, get_github_client
+
+logger = logging.getLogger(__name__)
+
+# Media type that makes the contents and blobs APIs return the file bytes
+# instead of base64 inside JSON
+GITHUB_RAW_ACCEPT = "application/vnd.github.raw"
+
+# Only this much of each file is downloaded; prompts use a small part of it anyway
+GITHUB_CONTENT_READ_BYTES = int(os.getenv("GITHUB_CONTENT_READ_BYTES", str(64 * 1024)))
+# Files listed above this size (lockfiles, bundles, generated code) are not fetched
+GITHUB_CONTENT_SKIP_BYTES = int(os.getenv("GITHUB_CONTENT_SKIP_BYTES", str(512 * 1024)))
+
+# Share of undecodable or control characters above which content is treated as binary
+_BINARY_RATIO = 0.05
+_TEXT_CONTROLS = {"\n", "\r", "\t", "\f", "\b"}
+
+
+def _looks_binary(text: str) -> bool:
+    if not text:
+        return False
+    sample = text[:4096]
+    bad = sum(1 for c in sample if c == "\ufffd" or (ord(c) < 32 and c not in _TEXT_CONTROLS))
+    return bad / len(sample) > _BINARY_RATIO
+
+
+def decode_text(data: bytes) -> Optional[str]:
+    """
+    Decode file bytes that may have been cut off at an arbitrary byte.
+
+    Handles UTF-8 (with or without BOM) and UTF-16 with a BOM, falls back to
+    cp1252 for legacy 8-bit text and returns None for binary content.
+    """
+    if data.startswith(codecs.BOM_UTF16_LE) or data.startswith(codecs.BOM_UTF16_BE):
+        # Drop a dangling odd byte left by truncation
+        text = data[: len(data) - len(data) % 2].decode("utf-16", errors="replace")
+        return None if _looks_binary(text) else text
+
+    if b"\x00" in data[:8192]:
+        return None
+
+    # A final multi-byte character split by the byte budget is dropped, not replaced
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    text = decoder.decode(data, final=False)
+    if not _looks_binary(text):
+        return text
+
+    text = data.decode("cp1252", errors="replace")
+    return None if _looks_binary(text) else text
+
+
+def _parse_raw(key: str, res: httpx.Response) -> Optional[str]:
+    if res.status_code != 200:
+        return None
+    text = decode_text(res.content)
+    if text is None:
+        logger.debug("Skipping %s: not a text file", key)
+        return None
+    if res.extensions.get(TRUNCATED):
+        logger.debug("Read only the first %d bytes of %s", len(res.content), key)
+    return text or None
+
+
+async def fetch_raw_files(
+    requests: List[Tuple[str, str]],
+    github_token: Optional[str] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    sizes: Optional[Dict[str, int]] = None,
+    quota: Optional[int] = None,
+    max_bytes: int = GITHUB_CONTENT_READ_BYTES,
+) -> Dict[str, str]:
+    """
+    Fetch (key, url) file contents as raw bytes, reading at most max_bytes of
+    each, and return {key: text} in request order.
+
+    Keys whose listed size (from `sizes`) is above GITHUB_CONTENT_SKIP_BYTES
+    are skipped without a request; binary files are dropped after decoding.
+    """
+    if sizes:
+        skipped = [key for key, _ in requests if sizes.get(key, 0) > GITHUB_CONTENT_SKIP_BYTES]
+        if skipped:
+            logger.info("Skipping large files: %s", ", ".join(skipped))
+        requests = [(key, url) for key, url in requests if key not in skipped]
+
+    headers = auth_headers(github_token)
+    headers["Accept"] = GITHUB_RAW_ACCEPT
+    return await fetch_concurrently(
+        client or get_github_client(),
+        requests,
+        _parse_raw,
+        headers=headers,
+        quota=quota,
+        max_bytes=max_bytes,
+    )
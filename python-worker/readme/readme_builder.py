@@ -1,74 +1,185 @@
 # readme_builder.py
+import asyncio
+import logging
+import time
+from typing import Optional
+from core.tracing import STAGE_SECONDS, stage
+from llm.tokens import CreditBudget
 from models import ReadmeRequest
-from readme.github_service import fetch_repo_metadata, fetch_important_files, normalize_github_metadata, extract_code_snippets
-from readme.openai_service import generate_readme_from_context
-from readme.analysis_service import analyze_repository
+from readme.openai_service import (
+    build_readme_messages,
+    generate_readme_from_context,
+    generate_readme_sections,
+    plan_readme_sections,
+    resolve_readme_mode,
+    stream_readme_from_context,
+    stream_readme_sections,
+)
+from readme.pipeline import ProgressFn, RepoContext, collect_repo_context, analyze_repo_context, prepare_repo_analysis, report_stage
 
-async def generate_readme(req: ReadmeRequest):
-    # Use the GitHub token from the request, fallback to env if not provided
-    github_token = req.github_token
-    
-    print(f"GitHub token received: {'Yes' if github_token else 'No'}")
-    if github_token:
-        print(f"Token length: {len(github_token)}")
-        print(f"Token preview: {github_token[:20]}...")
-    
-    # 1. Fetch repo metadata
-    raw_metadata = await fetch_repo_metadata(req.github_repo, github_token)
-    print("Metadata fetched!!!!!!!!!!")
-    
-    # Normalize metadata
-    normalized_metadata = normalize_github_metadata(raw_metadata)
-    print("Metadata normalized!!!!!!!!!!")
-    
-    # 2. Fetch important files
-    files = await fetch_important_files(req.github_repo, github_token)
-    print("Files fetched!!!!!!!!!!!!!!")
-    
-    # Extract code snippets
-    code_snippets = await extract_code_snippets(req.github_repo, files, github_token)
-    print("Code snippets extracted!!!!!!!!!!")
-    
-    # Analyze repository (for shards page feedback)
-    analysis_result = await analyze_repository(normalized_metadata, files)
-    print("Repository analysis completed!!!!!!!!!!")
-    
-    # 3. Build context for OpenAI (for README generation)
-    context = {
-        'repo_meta': raw_metadata,
-        'files': files,
+logger = logging.getLogger(__name__)
+
+def build_readme_context(req: ReadmeRequest, ctx: RepoContext) -> dict:
+    """Prompt context for README generation"""
+    return {
+        'repo_meta': ctx.raw_metadata,
+        'files': ctx.files,
         'user_input': {
             'description': req.user_input.description,
             'features': req.user_input.features
         },
         'metadata': req.metadata.dict(),
-        'code_snippets': code_snippets,
-        'github_token': github_token,
+        'code_snippets': ctx.code_snippets,
+        'github_token': ctx.github_token,
         'github_url': req.github_repo,
-        'clone_url': raw_metadata.get('clone_url', req.github_repo)
+        'clone_url': ctx.raw_metadata.get('clone_url', req.github_repo)
     }
-    print("Context built with code snippets!!!!!!!!!")
+
+async def plan_readme_calls(req: ReadmeRequest, ctx: RepoContext, context: dict, budget: CreditBudget):
+    """
+    Build every prompt for this request and reserve credits for them up front,
+    so an unaffordable request fails before any model call. The analysis gets
+    its estimated share and the README gets whatever is left.
+
+    The README call is ("single", messages) or ("sections", [(title, messages)]).
+    """
+    analysis_plan = None
+    if req.include_analysis:
+        prepared = await prepare_repo_analysis(ctx)
+        analysis_plan = (prepared, budget.reserve("analysis", prepared[0], exact=True))
+    if resolve_readme_mode(req.readme_mode) == "sections":
+        sections = plan_readme_sections(context)
+        readme_call = ("sections", sections)
+        # Every section prompt repeats the repository context, so all are reserved
+        readme_messages = [message for _, messages in sections for message in messages]
+    else:
+        readme_messages = build_readme_messages(context)
+        readme_call = ("single", readme_messages)
+    readme_reservation = budget.reserve("readme", readme_messages)
+    return readme_call, readme_reservation, analysis_plan
+
+async def write_readme(context: dict, readme_call, max_tokens):
+    mode, plan = readme_call
+    with stage("generation", mode=mode):
+        if mode == "sections":
+            return await generate_readme_sections(context, plan, max_tokens)
+        return await generate_readme_from_context(context, plan, max_tokens)
+
+def stream_readme_call(context: dict, readme_call, max_tokens):
+    mode, plan = readme_call
+    if mode == "sections":
+        return stream_readme_sections(context, plan, max_tokens)
+    return stream_readme_from_context(context, plan, max_tokens)
+
+async def generate_readme(req: ReadmeRequest, ctx: Optional[RepoContext] = None, progress: ProgressFn = None, user_credits: Optional[int] = None, budget: Optional[CreditBudget] = None):
+    # Use the GitHub token from the request, fallback to env if not provided
+    github_token = req.github_token
+    logger.debug("README requested", extra={"repo": req.github_repo, "github_token": bool(github_token)})
+    
+    # 1-2. Collect metadata, files and snippets once; analysis reuses the same context
+    if ctx is None:
+        ctx = await collect_repo_context(req.github_repo, github_token, progress=progress, source=req.repo_source)
+    
+    # 3. Build context for OpenAI (for README generation)
+    context = build_readme_context(req, ctx)
+    # A batch passes one budget shared by all of its repositories
+    budget = budget or CreditBudget(user_credits)
+    with stage("plan"):
+        readme_call, readme_reservation, analysis_plan = await plan_readme_calls(req, ctx, context, budget)
     
-    # 4. Generate README with OpenAI
-    openai_result = await generate_readme_from_context(context)
-    print("OpenAI result received!!!!!!!!!!!!!!!!")
+    # 4. Generate README with OpenAI, with the optional analysis running in parallel
+    analysis_result = None
+    if analysis_plan is not None:
+        report_stage(progress, "analysis")
+    report_stage(progress, "generation")
+    try:
+        if analysis_plan is not None:
+            prepared, analysis_reservation = analysis_plan
+            openai_result, analysis_result = await asyncio.gather(
+                write_readme(context, readme_call, readme_reservation.max_tokens),
+                analyze_repo_context(ctx, prepared, analysis_reservation.max_tokens),
+            )
+        else:
+            openai_result = await write_readme(context, readme_call, readme_reservation.max_tokens)
+    except BaseException:
+        budget.settle(readme_reservation, 0)
+        if analysis_plan is not None:
+            budget.settle(analysis_plan[1], 0)
+        raise
+    budget.settle(readme_reservation, openai_result.get("used_credits", 0))
+    if analysis_plan is not None:
+        budget.settle(analysis_plan[1], analysis_result.get("used_credits", 0) if analysis_result else 0)
+    
+    if openai_result.get("error"):
+        analysis_credits = analysis_result.get("used_credits", 0) if analysis_result else 0
+        return {**openai_result, "used_credits": openai_result.get("used_credits", 0) + analysis_credits}
     
     # Extract the actual readme content and used credits from OpenAI response
     readme_content = openai_result.get("readme")
     used_credits = openai_result.get("used_credits", 0)
+    if analysis_result:
+        used_credits += analysis_result.get("used_credits", 0)
     
     # Validate the readme content
     if not readme_content or not isinstance(readme_content, dict) or readme_content.get("type") != "doc":
-        print(f"Invalid readme structure: {readme_content}")
+        logger.error("Invalid README structure generated", extra={"repo": req.github_repo, "type": type(readme_content).__name__})
         return {"error": "Invalid README structure generated by OpenAI"}
     
-    print("Readme content validated successfully!!!!!!!!!")
-    
     # Return both README and analysis for different use cases
     return {
         "readme": readme_content,  # Direct TipTap JSON, not nested
         "used_credits": used_credits,
         "analysis": analysis_result,
-        "normalized_metadata": normalized_metadata,
-        "code_snippets_used": bool(code_snippets and code_snippets != "No code snippets could be extracted")
-    }
\ No newline at end of file
+        "normalized_metadata": ctx.normalized_metadata,
+        "code_snippets_used": ctx.has_code_snippets
+    }
+
+async def stream_readme(req: ReadmeRequest, user_credits: Optional[int] = None):
+    """
+    Streaming counterpart of generate_readme.
+
+    Yields (event, data) pairs: "stage" while collecting context, "node" for
+    each finished top-level TipTap node, "analysis" when requested, then "done".
+    """
+    yield "stage", {"stage": "context"}
+    ctx = await collect_repo_context(req.github_repo, req.github_token, source=req.repo_source)
+    context = build_readme_context(req, ctx)
+    with stage("plan"):
+        readme_call, readme_reservation, analysis_plan = await plan_readme_calls(req, ctx, context, CreditBudget(user_credits))
+    
+    analysis_task = None
+    if analysis_plan is not None:
+        prepared, analysis_reservation = analysis_plan
+        analysis_task = asyncio.create_task(analyze_repo_context(ctx, prepared, analysis_reservation.max_tokens))
+    
+    try:
+        yield "stage", {"stage": "generation"}
+        result = None
+        # Timed by hand: a span can't stay current across this generator's yields
+        started = time.perf_counter()
+        try:
+            async for event, data in stream_readme_call(context, readme_call, readme_reservation.max_tokens):
+                if event == "done":
+                    result = data
+                else:
+                    yield event, data
+                if event == "error":
+                    return
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="generation", outcome="ok" if result else "error")
+        
+        used_credits = result["used_credits"]
+        if analysis_task is not None:
+            analysis_result = await analysis_task
+            used_credits += analysis_result.get("used_credits", 0)
+            yield "analysis", analysis_result
+        
+        yield "done", {
+            "readme": result["readme"],
+            "used_credits": used_credits,
+            "code_snippets_used": ctx.has_code_snippets,
+            "success": True
+        }
+    finally:
+        if analysis_task is not None and not analysis_task.done():
+            analysis_task.cancel()
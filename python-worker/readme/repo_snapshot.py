@@ -0,0 +1,180 @@
+# repo_snapshot.py
+import logging
+import os
+import tarfile
+import tempfile
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+
+from readme.github_client import GITHUB_API_URL, auth_headers, get_github_client
+from readme.raw_content import GITHUB_CONTENT_READ_BYTES, decode_text, fetch_raw_files
+
+logger = logging.getLogger(__name__)
+
+# Up to this many blobs are pulled one API call each (in parallel); above it
+# the whole tree is downloaded once as a tarball and the blobs read from it.
+SNAPSHOT_BLOB_LIMIT = int(os.getenv("SNAPSHOT_BLOB_LIMIT", "4"))
+SNAPSHOT_MAX_ARCHIVE_BYTES = int(os.getenv("SNAPSHOT_MAX_ARCHIVE_BYTES", str(50 * 1024 * 1024)))
+SNAPSHOT_MAX_FILE_BYTES = int(os.getenv("SNAPSHOT_MAX_FILE_BYTES", str(1024 * 1024)))
+
+
+@dataclass
+class RepoEntry:
+    path: str
+    sha: str
+    size: int
+
+
+@dataclass
+class RepoSnapshot:
+    """In-memory index of one commit: the full file tree plus selected file contents"""
+    owner: str
+    repo: str
+    ref: str
+    tree_sha: str
+    entries: Dict[str, RepoEntry]
+    truncated: bool = False
+    contents: Dict[str, str] = field(default_factory=dict)
+
+    def root_files(self) -> List[str]:
+        return [path for path in self.entries if "/" not in path]
+
+    def has(self, path: str) -> bool:
+        return path in self.entries
+
+    def read(self, path: str) -> Optional[str]:
+        return self.contents.get(path)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RepoSnapshot":
+        data = dict(data)
+        data["entries"] = {path: RepoEntry(**entry) for path, entry in data["entries"].items()}
+        return cls(**data)
+
+
+async def fetch_repo_snapshot(
+    owner: str,
+    repo: str,
+    ref: str,
+    github_token: Optional[str] = None,
+    client: Optional[httpx.AsyncClient] = None,
+) -> RepoSnapshot:
+    """List the whole repository with a single recursive git/trees call"""
+    client = client or get_github_client()
+    res = await client.get(
+        f"{GITHUB_API_URL}/repos/{owner}/{repo}/git/trees/{ref}",
+        params={"recursive": "1"},
+        headers=auth_headers(github_token),
+    )
+    res.raise_for_status()
+    tree = res.json()
+
+    if tree.get("truncated"):
+        logger.warning("Tree listing for %s/%s was truncated by GitHub", owner, repo)
+
+    entries = {
+        item["path"]: RepoEntry(path=item["path"], sha=item["sha"], size=item.get("size", 0))
+        for item in tree.get("tree", [])
+        if item.get("type") == "blob"
+    }
+    return RepoSnapshot(
+        owner=owner,
+        repo=repo,
+        ref=ref,
+        tree_sha=tree.get("sha", ""),
+        entries=entries,
+        truncated=bool(tree.get("truncated")),
+    )
+
+
+async def load_snapshot_contents(
+    snapshot: RepoSnapshot,
+    paths: Iterable[str],
+    github_token: Optional[str] = None,
+    client: Optional[httpx.AsyncClient] = None,
+) -> RepoSnapshot:
+    """Fill snapshot.contents for the requested paths that exist in the tree"""
+    client = client or get_github_client()
+    wanted = [
+        path for path in dict.fromkeys(paths)
+        if path in snapshot.entries
+        and path not in snapshot.contents
+        and snapshot.entries[path].size <= SNAPSHOT_MAX_FILE_BYTES
+    ]
+    if not wanted:
+        return snapshot
+
+    if len(wanted) > SNAPSHOT_BLOB_LIMIT:
+        try:
+            snapshot.contents.update(await _load_from_tarball(snapshot, wanted, github_token, client))
+            return snapshot
+        except Exception as e:
+            logger.warning("Tarball download failed for %s/%s, falling back to blobs: %s", snapshot.owner, snapshot.repo, e)
+
+    snapshot.contents.update(await _load_from_blobs(snapshot, wanted, github_token, client))
+    return snapshot
+
+
+async def _load_from_blobs(
+    snapshot: RepoSnapshot,
+    paths: List[str],
+    github_token: Optional[str],
+    client: httpx.AsyncClient,
+) -> Dict[str, str]:
+    return await fetch_raw_files(
+        [
+            (path, f"{GITHUB_API_URL}/repos/{snapshot.owner}/{snapshot.repo}/git/blobs/{snapshot.entries[path].sha}")
+            for path in paths
+        ],
+        github_token,
+        client,
+    )
+
+
+async def _load_from_tarball(
+    snapshot: RepoSnapshot,
+    paths: List[str],
+    github_token: Optional[str],
+    client: httpx.AsyncClient,
+) -> Dict[str, str]:
+    """Stream the commit tarball to a temp file and read only the wanted members"""
+    wanted = set(paths)
+    contents: Dict[str, str] = {}
+
+    with tempfile.TemporaryFile() as archive:
+        received = 0
+        async with client.stream(
+            "GET",
+            f"{GITHUB_API_URL}/repos/{snapshot.owner}/{snapshot.repo}/tarball/{snapshot.ref}",
+            headers=auth_headers(github_token),
+            follow_redirects=True,
+        ) as res:
+            res.raise_for_status()
+            async for chunk in res.aiter_bytes():
+                received += len(chunk)
+                if received > SNAPSHOT_MAX_ARCHIVE_BYTES:
+                    raise ValueError(f"archive larger than {SNAPSHOT_MAX_ARCHIVE_BYTES} bytes")
+                archive.write(chunk)
+
+        archive.seek(0)
+        with tarfile.open(fileobj=archive, mode="r:gz") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                # Members are prefixed with "<owner>-<repo>-<short sha>/"
+                _, _, path = member.name.partition("/")
+                if path not in wanted:
+                    continue
+                extracted = tar.extractfile(member)
+                # Same per-file byte budget as the raw API reads
+                text = decode_text(extracted.read(GITHUB_CONTENT_READ_BYTES)) if extracted is not None else None
+                if text is not None:
+                    contents[path] = text
+
+    return contents
+
@@ -0,0 +1,163 @@
+# routes.py
+import json
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from core.api import insufficient_credits_response, model_busy_response, truncated_response, verify_api_key
+from core.sse import SSE_HEADERS, sse_event
+from llm.scheduler import ModelBusyError
+from llm.tokens import InsufficientCreditsError
+from models import ReadmeBatchRequest, ReadmeRequest
+from readme.batch import BATCH_MAX_REPOS, generate_readme_batch
+from readme.github_service import GitHubRateLimitError
+from readme.pipeline import collect_repo_context, shared_repo_analysis
+from readme.rate_limit import get_github_rate_limiter
+from readme.readme_builder import generate_readme, stream_readme
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+def github_rate_limited_response(e: GitHubRateLimitError):
+    """429 when GitHub's rate limit, not the repository, stopped the request"""
+    headers = {"Retry-After": str(int(e.retry_after))} if e.retry_after is not None else None
+    return JSONResponse(
+        status_code=429,
+        content={
+            "error": "github_rate_limited",
+            "message": str(e),
+            "retry_after": e.retry_after
+        },
+        headers=headers
+    )
+
+@router.post("/readme-builder")
+async def readme_builder(req: ReadmeRequest, request: Request, auth=Depends(verify_api_key)):
+    try:
+        # Get user credits from headers
+        user_credits = int(request.headers.get("X-User-Credits", 0))
+        
+        if user_credits <= 0:
+            return JSONResponse(
+                status_code=402,
+                content={
+                    "error": "insufficient_credits",
+                    "message": "Not enough AI credits"
+                }
+            )
+        
+        result = await generate_readme(req, user_credits=user_credits)
+        
+        # Check if generation was successful
+        if "error" in result:
+            if result["error"] == "insufficient_credits":
+                return truncated_response(result.get("used_credits", 0))
+            else:
+                raise HTTPException(status_code=500, detail=result["error"])
+        
+        # Extract the readme content and used credits
+        readme_content = result.get("readme")
+        used_credits = result.get("used_credits", 0)
+        
+        # Validate the readme content structure
+        if not isinstance(readme_content, dict) or readme_content.get("type") != "doc":
+            logger.error("Invalid README structure", extra={"repo": req.github_repo})
+            raise HTTPException(status_code=500, detail="Invalid README structure generated")
+        
+        # Return the direct TipTap JSON structure without nesting
+        response = {
+            "readme": readme_content,  # This is the direct TipTap JSON
+            "used_credits": used_credits,
+            "success": True
+        }
+        if req.include_analysis:
+            response["analysis"] = result.get("analysis")
+        return response
+        
+    except HTTPException:
+        raise
+    except InsufficientCreditsError as e:
+        return insufficient_credits_response(e)
+    except ModelBusyError as e:
+        return model_busy_response(e)
+    except GitHubRateLimitError as e:
+        return github_rate_limited_response(e)
+    except Exception as e:
+        logger.exception("Error in readme builder")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/readme-builder/stream")
+async def readme_builder_stream(req: ReadmeRequest, request: Request, auth=Depends(verify_api_key)):
+    user_credits = int(request.headers.get("X-User-Credits", 0))
+    
+    if user_credits <= 0:
+        return JSONResponse(
+            status_code=402,
+            content={
+                "error": "insufficient_credits",
+                "message": "Not enough AI credits"
+            }
+        )
+    
+    async def events():
+        try:
+            async for event, data in stream_readme(req, user_credits):
+                yield sse_event(event, data)
+        except InsufficientCreditsError as e:
+            yield sse_event("error", {"error": "insufficient_credits", "message": str(e), "required_credits": e.required})
+        except ModelBusyError:
+            yield sse_event("error", {"error": "model_busy", "message": "The AI service is busy, please try again shortly"})
+        except GitHubRateLimitError as e:
+            yield sse_event("error", {"error": "github_rate_limited", "message": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            logger.exception("Error in readme builder stream")
+            yield sse_event("error", {"error": "generation_failed", "message": str(e)})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.post("/readme-builder/batch")
+async def readme_builder_batch(batch: ReadmeBatchRequest, request: Request, auth=Depends(verify_api_key)):
+    user_credits = int(request.headers.get("X-User-Credits", 0))
+    
+    if user_credits <= 0:
+        return JSONResponse(
+            status_code=402,
+            content={
+                "error": "insufficient_credits",
+                "message": "Not enough AI credits"
+            }
+        )
+    if not batch.requests:
+        raise HTTPException(status_code=400, detail="No repositories in batch")
+    if len(batch.requests) > BATCH_MAX_REPOS:
+        raise HTTPException(status_code=400, detail=f"A batch can contain at most {BATCH_MAX_REPOS} repositories")
+    
+    # One JSON object per line as each repository finishes, then a summary line
+    async def lines():
+        async for line in generate_readme_batch(batch.requests, user_credits):
+            yield json.dumps(line) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=SSE_HEADERS)
+
+@router.post("/repository-analysis")
+async def repository_analysis(req: ReadmeRequest, auth=Depends(verify_api_key)):
+    try:
+        ctx = await collect_repo_context(req.github_repo, req.github_token, source=req.repo_source)
+        analysis_result = await shared_repo_analysis(ctx)
+        return {
+            "analysis": analysis_result,
+            "metadata": ctx.normalized_metadata,
+            "success": True
+        }
+    except GitHubRateLimitError as e:
+        return github_rate_limited_response(e)
+    except Exception as e:
+        logger.exception("Error in repository analysis")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/github/rate-limit")
+async def github_rate_limit(auth=Depends(verify_api_key)):
+    """Last known GitHub quota per credential (credentials are hashed)"""
+    return {"credentials": await get_github_rate_limiter().report()}
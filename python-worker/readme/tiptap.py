@@ -0,0 +1,381 @@
+# tiptap.py
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# The subset of TipTap the README prompt allows
+NODE_TYPES = {
+    "doc": "doc",
+    "paragraph": "paragraph",
+    "heading": "heading",
+    "bulletlist": "bulletList",
+    "unorderedlist": "bulletList",
+    "orderedlist": "bulletList",
+    "listitem": "listItem",
+    "codeblock": "codeBlock",
+    "text": "text",
+}
+MARK_TYPES = {
+    "bold": "bold",
+    "strong": "bold",
+    "italic": "italic",
+    "em": "italic",
+    "code": "code",
+    "inlinecode": "code",
+    "underline": "underline",
+}
+REQUIRED_SECTIONS = ["Overview", "Features", "Installation", "Usage", "Code Explanation"]
+DEFAULT_CODE_LANGUAGE = "plaintext"
+
+# Stands in for content that could not be repaired until sections are split
+_LOST = "__lost__"
+_NODE_START = re.compile(r'\{\s*"type"')
+_EMOJI_AND_PUNCT = re.compile(r"[^\w\s]")
+
+
+def _canonical(kind: Any, table: Dict[str, str]) -> Optional[str]:
+    """Map "bullet_list", "Bullet-List", "bulletlist" etc. to the TipTap name"""
+    if not isinstance(kind, str):
+        return None
+    return table.get(re.sub(r"[_\-\s]", "", kind).lower())
+
+
+@dataclass
+class Section:
+    """A top-level heading and the nodes up to the next heading, as [start, end) of doc content"""
+    title: str
+    level: int
+    start: int
+    end: int
+    broken: bool = False
+
+
+@dataclass
+class TiptapReport:
+    fixes: List[str] = field(default_factory=list)
+    sections: List[Section] = field(default_factory=list)
+    # The JSON itself was invalid and nodes were recovered from the text
+    salvaged: bool = False
+
+    @property
+    def broken_sections(self) -> List[Section]:
+        return [s for s in self.sections if s.broken]
+
+    def missing_sections(self) -> List[str]:
+        """Required sections with no heading; only meaningful for salvaged output"""
+        titles = [heading_key(s.title) for s in self.sections]
+        return [name for name in REQUIRED_SECTIONS if not any(heading_key(name) in t for t in titles)]
+
+
+def heading_key(title: str) -> str:
+    return " ".join(_EMOJI_AND_PUNCT.sub(" ", title).lower().split())
+
+
+def node_text(node: Any) -> str:
+    """Concatenated text of a node and its descendants"""
+    if isinstance(node, str):
+        return node
+    if isinstance(node, list):
+        return "".join(node_text(n) for n in node)
+    if not isinstance(node, dict):
+        return ""
+    if isinstance(node.get("text"), str):
+        return node["text"]
+    return node_text(node.get("content") or [])
+
+
+class _Normalizer:
+    """One pass over the tree; every repair is noted in `fixes`"""
+
+    def __init__(self):
+        self.fixes: List[str] = []
+        self.lost = False
+
+    def fix(self, message: str) -> None:
+        self.fixes.append(message)
+
+    def marks(self, marks: Any) -> List[Dict[str, str]]:
+        result = []
+        for mark in marks if isinstance(marks, list) else []:
+            kind = _canonical(mark.get("type") if isinstance(mark, dict) else mark, MARK_TYPES)
+            if kind is None:
+                self.fix(f"dropped unsupported mark {mark!r}")
+            elif {"type": kind} not in result:
+                if not isinstance(mark, dict) or mark.get("type") != kind:
+                    self.fix(f"renamed mark {mark!r} to {kind}")
+                result.append({"type": kind})
+        return result
+
+    def inline(self, children: Any) -> List[Dict[str, Any]]:
+        """Text nodes for a paragraph or heading, flattening anything nested"""
+        result = []
+        for child in children if isinstance(children, list) else [children]:
+            if isinstance(child, str):
+                if child:
+                    self.fix("wrapped a bare string in a text node")
+                    result.append({"type": "text", "text": child})
+                continue
+            if not isinstance(child, dict):
+                if child is not None:
+                    self.lost = True
+                continue
+            kind = _canonical(child.get("type"), NODE_TYPES)
+            if kind == "text" or (kind is None and isinstance(child.get("text"), str)):
+                text = child.get("text")
+                if not isinstance(text, str) or not text:
+                    self.fix("dropped an empty text node")
+                    continue
+                node = {"type": "text", "text": text}
+                marks = self.marks(child.get("marks"))
+                if marks:
+                    node["marks"] = marks
+                result.append(node)
+            elif isinstance(child.get("content"), list):
+                self.fix(f"flattened a nested {child.get('type')} into inline text")
+                result.extend(self.inline(child["content"]))
+            else:
+                self.lost = True
+        return result
+
+    def paragraph(self, content: Any, attrs: Any = None) -> Optional[Dict[str, Any]]:
+        inline = self.inline(content)
+        if not inline:
+            self.fix("dropped an empty paragraph")
+            return None
+        align = attrs.get("textAlign") if isinstance(attrs, dict) else None
+        if not align:
+            self.fix("added paragraph attrs")
+        return {"type": "paragraph", "attrs": {"textAlign": align or "left"}, "content": inline}
+
+    def heading(self, node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        inline = self.inline(node.get("content") or ([node["text"]] if isinstance(node.get("text"), str) else []))
+        if not inline:
+            self.fix("dropped an empty heading")
+            return None
+        attrs = node.get("attrs") if isinstance(node.get("attrs"), dict) else {}
+        try:
+            level = min(max(int(attrs.get("level", node.get("level"))), 1), 6)
+        except (TypeError, ValueError):
+            self.fix("added a missing heading level")
+            level = 2
+        align = attrs.get("textAlign")
+        if not align:
+            self.fix("added heading textAlign")
+        return {"type": "heading", "attrs": {"level": level, "textAlign": align or "left"}, "content": inline}
+
+    def code_block(self, node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        code = node_text(node.get("content") or node.get("text") or [])
+        if not code.strip():
+            self.fix("dropped an empty code block")
+            return None
+        attrs = node.get("attrs") if isinstance(node.get("attrs"), dict) else {}
+        language = attrs.get("language") or node.get("language")
+        if not language:
+            self.fix("added a code block language")
+        return {
+            "type": "codeBlock",
+            "attrs": {"language": language or DEFAULT_CODE_LANGUAGE},
+            "content": [{"type": "text", "text": code}],
+        }
+
+    def list_item(self, node: Any) -> Optional[Dict[str, Any]]:
+        if isinstance(node, dict) and _canonical(node.get("type"), NODE_TYPES) == "listItem":
+            children = node.get("content") or []
+        else:
+            self.fix("wrapped a list entry in a listItem")
+            children = [node]
+        blocks = self.blocks(children)
+        if not blocks:
+            self.fix("dropped an empty list item")
+            return None
+        return {"type": "listItem", "content": blocks}
+
+    def bullet_list(self, items: Any) -> Optional[Dict[str, Any]]:
+        result = [item for item in (self.list_item(i) for i in (items if isinstance(items, list) else [])) if item]
+        if not result:
+            self.fix("dropped an empty list")
+            return None
+        return {"type": "bulletList", "content": result}
+
+    def blocks(self, children: Any, top_level: bool = False) -> List[Dict[str, Any]]:
+        """
+        Block nodes for a doc or list item. Stray text becomes a paragraph and
+        stray list items a list; at the top level, anything that could not be
+        repaired leaves a marker so its section can be regenerated.
+        """
+        result: List[Dict[str, Any]] = []
+        pending_inline: List[Any] = []
+        pending_items: List[Any] = []
+
+        def flush_inline():
+            if pending_inline:
+                self.fix("wrapped bare text in a paragraph")
+                paragraph = self.paragraph(list(pending_inline))
+                if paragraph:
+                    result.append(paragraph)
+                pending_inline.clear()
+
+        def flush_items():
+            if pending_items:
+                self.fix("wrapped stray list items in a bulletList")
+                bullet_list = self.bullet_list(list(pending_items))
+                if bullet_list:
+                    result.append(bullet_list)
+                pending_items.clear()
+
+        def mark_lost():
+            # One marker per stretch of unrepairable content
+            if top_level and self.lost:
+                result.append({"type": _LOST})
+                self.lost = False
+
+        for child in children if isinstance(children, list) else [children]:
+            kind = _canonical(child.get("type"), NODE_TYPES) if isinstance(child, dict) else None
+            if isinstance(child, str) or kind == "text":
+                flush_items()
+                pending_inline.append(child)
+                continue
+            if kind == "listItem":
+                flush_inline()
+                pending_items.append(child)
+                continue
+            flush_inline()
+            flush_items()
+            if isinstance(child, dict) and child.get("type") != kind and kind is not None:
+                self.fix(f"renamed node type {child.get('type')} to {kind}")
+
+            node = None
+            if kind == "paragraph":
+                node = self.paragraph(child.get("content"), child.get("attrs"))
+            elif kind == "heading":
+                node = self.heading(child)
+            elif kind == "codeBlock":
+                node = self.code_block(child)
+            elif kind == "bulletList":
+                node = self.bullet_list(child.get("content"))
+            elif kind == "doc" or (isinstance(child, dict) and isinstance(child.get("content"), list)):
+                # Unsupported containers (blockquote, nested docs): keep their children
+                if kind != "doc":
+                    self.fix(f"unwrapped unsupported node {child.get('type')}")
+                result.extend(self.blocks(child["content"] if isinstance(child.get("content"), list) else []))
+            elif isinstance(child, dict) and isinstance(child.get("text"), str):
+                self.fix(f"turned unsupported node {child.get('type')} into a paragraph")
+                node = self.paragraph(child["text"])
+            elif isinstance(child, list):
+                result.extend(self.blocks(child))
+            elif child is not None:
+                self.lost = True
+            if node:
+                result.append(node)
+            mark_lost()
+        flush_inline()
+        flush_items()
+        mark_lost()
+        return result
+
+
+def salvage_nodes(raw: str) -> List[Any]:
+    """
+    Top-level nodes from a doc that is not valid JSON (a stray comma, an
+    unescaped quote, a cut-off tail). Unreadable stretches become markers.
+    """
+    start = raw.find("[")
+    if start < 0:
+        return [{"type": _LOST}]
+    decoder = json.JSONDecoder()
+    nodes: List[Any] = []
+    i = start + 1
+    while i < len(raw):
+        while i < len(raw) and raw[i] in " \t\r\n,":
+            i += 1
+        if i >= len(raw) or raw[i] == "]":
+            break
+        try:
+            node, i = decoder.raw_decode(raw, i)
+            nodes.append(node)
+        except json.JSONDecodeError:
+            match = _NODE_START.search(raw, i + 1)
+            if not match:
+                break
+            nodes.append({"type": _LOST})
+            i = match.start()
+    # A broken tail is usually a cut-off last section, which then shows up
+    # as missing rather than breaking the section before it
+    while nodes and nodes[-1] == {"type": _LOST}:
+        nodes.pop()
+    return nodes
+
+
+def parse_tiptap(raw: str) -> Tuple[Any, bool]:
+    """(parsed document, salvaged) for raw model output"""
+    try:
+        return json.loads(raw), False
+    except json.JSONDecodeError:
+        return {"type": "doc", "content": salvage_nodes(raw)}, True
+
+
+def split_sections(nodes: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Section]]:
+    """Drop markers and split content into heading sections, flagging broken or empty ones"""
+    content: List[Dict[str, Any]] = []
+    sections: List[Section] = []
+    preamble_broken = False
+    for node in nodes:
+        if node.get("type") == _LOST:
+            if sections:
+                sections[-1].broken = True
+            else:
+                preamble_broken = True
+            continue
+        if node.get("type") == "heading":
+            if sections:
+                sections[-1].end = len(content)
+            sections.append(Section(node_text(node), node["attrs"]["level"], len(content), len(content) + 1))
+        content.append(node)
+    if sections:
+        sections[-1].end = len(content)
+    for i, section in enumerate(sections):
+        following = sections[i + 1] if i + 1 < len(sections) else None
+        # A title heading directly followed by its subsections is not empty
+        if section.end - section.start == 1 and (following is None or following.level <= section.level):
+            section.broken = True
+    if preamble_broken:
+        end = sections[0].start if sections else len(content)
+        sections.insert(0, Section("Introduction", 2, 0, end, broken=True))
+    return content, sections
+
+
+def normalize_doc(data: Any) -> Tuple[Dict[str, Any], TiptapReport]:
+    """
+    Coerce model output into the allowed TipTap subset in one pass.
+
+    Fixable defects (snake_case types, missing attrs, empty nodes, bare text)
+    are repaired in place; content that could not be repaired marks its
+    section as broken in the returned report.
+    """
+    normalizer = _Normalizer()
+    if isinstance(data, list):
+        normalizer.fix("wrapped a bare node list in a doc")
+        children = data
+    elif isinstance(data, dict) and isinstance(data.get("content"), list) and _canonical(data.get("type"), NODE_TYPES) in ("doc", None):
+        if data.get("type") != "doc":
+            normalizer.fix("set the root type to doc")
+        children = data["content"]
+    elif isinstance(data, dict) and data.get("type"):
+        normalizer.fix("wrapped a single node in a doc")
+        children = [data]
+    else:
+        children = [{"type": _LOST}]
+
+    content, sections = split_sections(normalizer.blocks(children, top_level=True))
+    return {"type": "doc", "content": content}, TiptapReport(fixes=normalizer.fixes, sections=sections)
+
+
+def normalize_nodes(nodes: List[Any]) -> List[Dict[str, Any]]:
+    """Normalized top-level nodes (used while streaming); unrepairable ones are dropped"""
+    content, _ = split_sections(_Normalizer().blocks(nodes, top_level=True))
+    return content
+
+
+def replace_section(content: List[Dict[str, Any]], section: Section, nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return content[: section.start] + nodes + content[section.end:]
@@ -0,0 +1,67 @@
+# routes.py
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from core.api import insufficient_credits_response, model_busy_response, service, truncated_response, verify_api_key
+from llm.scheduler import ModelBusyError
+from llm.tokens import InsufficientCreditsError
+from stackgenerator.stack_generator import StackGenerator, get_stack_generator
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+class StackGeneratorRequest(BaseModel):
+    project_type: str
+    requirements: str
+    preferences: str
+    use_cache: bool = True
+
+@router.post("/stack-generator")
+async def stack_generator_endpoint(
+    req: StackGeneratorRequest,
+    request: Request,
+    generator: StackGenerator = Depends(service(get_stack_generator)),
+    auth=Depends(verify_api_key)
+):
+    try:
+        user_credits = int(request.headers.get("X-User-Credits", 0))
+        
+        if user_credits <= 0:
+            return JSONResponse(
+                status_code=402,
+                content={
+                    "error": "insufficient_credits",
+                    "message": "Not enough AI credits"
+                }
+            )
+        
+        result = await generator.generate_stack_recommendation(
+            req.project_type,
+            req.requirements,
+            req.preferences,
+            req.use_cache,
+            user_credits
+        )
+        
+        used_credits = result["used_tokens"]
+        
+        if result.get("error") == "insufficient_credits" or used_credits > user_credits:
+            return truncated_response(used_credits)
+            
+        return {
+            "recommendation": result["recommendation"],
+            "used_credits": used_credits,
+            "cache_hit": result.get("cache_hit", False),
+            "success": True
+        }
+    except InsufficientCreditsError as e:
+        return insufficient_credits_response(e)
+    except ModelBusyError as e:
+        return model_busy_response(e)
+    except Exception as e:
+        logger.exception("Error in stack generator")
+        raise HTTPException(status_code=500, detail=str(e))
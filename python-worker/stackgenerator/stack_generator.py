@@ -1,8 +1,9 @@
 from fastapi import HTTPException
 from pydantic import BaseModel
-from openai import OpenAI
-import os
-from typing import Dict, Any
+from llm.response_cache import cached_chat_completion, is_cache_hit
+from llm.scheduler import PRIORITY_INTERACTIVE, ModelBusyError
+from llm.tokens import CreditBudget
+from typing import Dict, Any, Optional
 import json
 
 class StackRequest(BaseModel):
@@ -10,14 +11,10 @@ class StackRequest(BaseModel):
     requirements: str
     preferences: str
 
-class StackGenerator:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-    def generate_stack_recommendation(self, project_type: str, requirements: str, preferences: str) -> Dict[str, Any]:
-        """Generate a comprehensive tech stack recommendation using OpenAI"""
-        
-        prompt = f"""
+# Static prompt parts, built once at import; requests only fill in the fields
+STACK_SYSTEM_MESSAGE = {"role": "system", "content": "You are an expert full-stack developer specializing in modern web technologies. Provide detailed, practical tech stack recommendations."}
+
+STACK_PROMPT_TEMPLATE = """
             You are an expert developer and modern stack architect. Recommend a **practical and production-ready technology stack** for this project:
 
             Project Type: {project_type}
@@ -46,27 +43,56 @@ class StackGenerator:
             }}
             """
 
+_stack_generator: Optional["StackGenerator"] = None
+
+class StackGenerator:
+    """Stateless; one instance serves every request (see get_stack_generator)"""
+
+    async def generate_stack_recommendation(self, project_type: str, requirements: str, preferences: str, use_cache: bool = True, user_credits: Optional[int] = None) -> Dict[str, Any]:
+        """Generate a comprehensive tech stack recommendation using OpenAI"""
+        
+        messages = [
+            STACK_SYSTEM_MESSAGE,
+            {"role": "user", "content": STACK_PROMPT_TEMPLATE.format(project_type=project_type, requirements=requirements, preferences=preferences)}
+        ]
+        # Checked before the try so an unaffordable request surfaces as 402, not 500
+        reservation = CreditBudget(user_credits).reserve("stack", messages)
         
         try:
-            response = self.client.chat.completions.create(
+            response = await cached_chat_completion(
                 model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an expert full-stack developer specializing in modern web technologies. Provide detailed, practical tech stack recommendations."},
-                    {"role": "user", "content": prompt}
-                ],
+                priority=PRIORITY_INTERACTIVE,
+                messages=messages,
                 temperature=0.7,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                use_cache=use_cache,
+                **reservation.as_kwargs()
             )
             
             content = response.choices[0].message.content
             
+            # Truncated at the credit-derived max_tokens, so the JSON is incomplete
+            if response.choices[0].finish_reason == "length":
+                return {
+                    "error": "insufficient_credits",
+                    "used_tokens": response.usage.total_tokens if response.usage else 0
+                }
+            
             # Return both the recommendation and token usage
             return {
                 "recommendation": json.loads(content),
-                "used_tokens": response.usage.total_tokens if response.usage else 0
+                "used_tokens": response.usage.total_tokens if response.usage else 0,
+                "cache_hit": is_cache_hit(response)
             }
             
+        except ModelBusyError:
+            # Still throttled after the scheduler's retries; answered with a 503
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"OpenAI API error: {str(e)}")
 
-stack_generator = StackGenerator()
\ No newline at end of file
+def get_stack_generator() -> StackGenerator:
+    global _stack_generator
+    if _stack_generator is None:
+        _stack_generator = StackGenerator()
+    return _stack_generator
@@ -0,0 +1,6 @@
+# conftest.py
+import os
+import sys
+
+# Tests import the worker's packages the way main.py does, from python-worker/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
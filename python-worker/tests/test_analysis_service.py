@@ -0,0 +1,38 @@
+# test_analysis_service.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from readme import analysis_service
+
+
+def completion(content, finish_reason="stop", total_tokens=120):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(finish_reason=finish_reason, message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(total_tokens=total_tokens),
+    )
+
+
+@pytest.mark.parametrize("response, error", [
+    (completion('{"overall', finish_reason="length"), "insufficient_credits"),
+    (completion(""), "Empty response from analysis service"),
+    (completion("not json"), "Analysis failed"),
+])
+def test_errors_after_the_completion_bill_its_tokens(monkeypatch, response, error):
+    async def chat_completion(**kwargs):
+        return response
+
+    monkeypatch.setattr(analysis_service, "chat_completion", chat_completion)
+    result = asyncio.run(analysis_service.run_analysis([], {}, [], {}))
+    assert result["error"].startswith(error)
+    assert result["used_credits"] == 120
+
+
+def test_failed_call_bills_nothing(monkeypatch):
+    async def chat_completion(**kwargs):
+        raise RuntimeError("connection reset")
+
+    monkeypatch.setattr(analysis_service, "chat_completion", chat_completion)
+    result = asyncio.run(analysis_service.run_analysis([], {}, [], {}))
+    assert result == {"error": "Analysis failed: connection reset", "used_credits": 0}
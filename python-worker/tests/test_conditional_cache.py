@@ -0,0 +1,50 @@
+# test_conditional_cache.py
+import asyncio
+
+import httpx
+
+from core.cache import MemoryCache
+from readme.conditional_cache import CACHE_STATUS_HEADER, ConditionalRequestTransport
+
+URL = "https://api.github.com/repos/o/r"
+
+
+def test_not_modified_is_served_from_the_store():
+    seen = []
+
+    def handler(request):
+        seen.append(dict(request.headers))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={"X-RateLimit-Remaining": "41"})
+        return httpx.Response(200, headers={"ETag": '"v1"', "X-RateLimit-Remaining": "42"}, json={"name": "r"})
+
+    async def main():
+        transport = ConditionalRequestTransport(httpx.MockTransport(handler), store=MemoryCache())
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.get(URL), await client.get(URL)
+
+    first, second = asyncio.run(main())
+    assert first.json() == second.json() == {"name": "r"}
+    assert "if-none-match" not in seen[0]
+    assert seen[1]["if-none-match"] == '"v1"'
+    assert second.status_code == 200
+    assert second.headers[CACHE_STATUS_HEADER] == "revalidated"
+    # Rate limit headers come from the 304, not the stored response
+    assert second.headers["X-RateLimit-Remaining"] == "41"
+
+
+def test_credentials_do_not_share_entries():
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("If-None-Match"))
+        return httpx.Response(200, headers={"ETag": '"v1"'}, json={})
+
+    async def main():
+        transport = ConditionalRequestTransport(httpx.MockTransport(handler), store=MemoryCache())
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.get(URL, headers={"Authorization": "token a"})
+            await client.get(URL, headers={"Authorization": "token b"})
+
+    asyncio.run(main())
+    assert seen == [None, None]
@@ -0,0 +1,101 @@
+# test_jobs.py
+import asyncio
+import time
+
+import pytest
+
+from core.shared_state import LocalState
+from jobs.queue import JobFailed, JobQueue
+from jobs.store import FAILED, RUNNING, SUCCEEDED, Job, SQLiteJobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+async def echo(payload, secrets, progress):
+    progress("working")
+    await asyncio.sleep(0)
+    return {"echo": payload["value"], "token": secrets.get("github_token")}
+
+
+async def fail(payload, secrets, progress):
+    raise JobFailed("out of credits", {"used_credits": 3})
+
+
+def test_job_runs_and_streams_its_events(store):
+    async def main():
+        queue = JobQueue(store, workers=1, claims=LocalState())
+        queue.register("echo", echo)
+        await queue.start()
+        job = await queue.submit("echo", {"value": 1}, secrets={"github_token": "t"})
+        events = [event async for event, _ in queue.events(job.id)]
+        await queue.stop()
+        return job.id, events
+
+    job_id, events = asyncio.run(main())
+    assert events[0] == "status" and events[-1] == "done"
+    saved = store.get(job_id)
+    assert saved.status == SUCCEEDED
+    assert saved.stage == "working"
+    assert saved.result == {"echo": 1, "token": "t"}
+    # Secrets are never written to the store
+    assert saved.payload == {"value": 1}
+
+
+def test_failed_job_keeps_its_result(store):
+    async def main():
+        queue = JobQueue(store, workers=1, claims=LocalState())
+        queue.register("fail", fail)
+        await queue.start()
+        job = await queue.submit("fail", {})
+        async for event, data in queue.events(job.id):
+            last = data
+        await queue.stop()
+        return last
+
+    done = asyncio.run(main())
+    assert done["status"] == FAILED
+    assert done["error"] == "out of credits"
+    assert done["result"] == {"used_credits": 3}
+
+
+def test_interrupted_job_is_run_again_on_start(store):
+    store.save(Job(kind="echo", payload={"value": 2}, id="left", status=RUNNING, stage="working"))
+
+    async def main():
+        queue = JobQueue(store, workers=1, claims=LocalState())
+        queue.register("echo", echo)
+        await queue.start()
+        events = [event async for event, _ in queue.events("left")]
+        await queue.stop()
+        return events
+
+    assert asyncio.run(main())[-1] == "done"
+    assert store.get("left").result == {"echo": 2, "token": None}
+
+
+def test_job_claimed_elsewhere_is_left_alone(store):
+    claims = LocalState()
+    claims.set("held", {"owner": "another process", "renewed_at": time.time()})
+    store.save(Job(kind="echo", payload={"value": 3}, id="held", status=RUNNING))
+
+    async def main():
+        queue = JobQueue(store, workers=1, claims=claims)
+        queue.register("echo", echo)
+        await queue.start()
+        await asyncio.sleep(0.05)
+        await queue.stop()
+
+    asyncio.run(main())
+    assert store.get("held").status == RUNNING
+
+
+def test_purge_only_deletes_old_finished_jobs(store):
+    store.save(Job(kind="echo", payload={}, id="done", status=SUCCEEDED))
+    store.save(Job(kind="echo", payload={}, id="queued"))
+    assert asyncio.run(store.apurge(time.time() - 60)) == 0
+    assert asyncio.run(store.apurge(time.time() + 1)) == 1
+    assert store.get("done") is None
+    assert [job.id for job in store.unfinished()] == ["queued"]
@@ -0,0 +1,122 @@
+# test_llm_scheduler.py
+import asyncio
+import socket
+
+import httpx
+import openai
+import pytest
+
+from benchmarks import fake_openai
+from llm import scheduler
+from llm.scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, LLMScheduler, ModelBusyError, ModelLane
+
+MESSAGES = [{"role": "user", "content": "scheduler test"}]
+
+
+def rate_limit_error(retry_after_ms: str = "100") -> openai.RateLimitError:
+    request = httpx.Request("POST", "http://fake/v1/chat/completions")
+    response = httpx.Response(429, request=request, headers={"retry-after-ms": retry_after_ms})
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    """fake_openai that answers 429 beyond two requests in flight"""
+    monkeypatch.setattr(fake_openai, "FAKE_DELAY", 0.05)
+    monkeypatch.setattr(fake_openai, "FAKE_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(fake_openai, "FAKE_RETRY_AFTER_MS", 20)
+    monkeypatch.setattr(fake_openai, "fake_stats", dict.fromkeys(fake_openai.fake_stats, 0))
+    monkeypatch.setattr(scheduler, "LLM_RETRY_BASE", 0.01)
+    with fake_openai.FakeServer(port=free_port()) as server:
+        yield server
+
+
+def run_calls(server, count: int):
+    async def main():
+        client = openai.AsyncOpenAI(base_url=f"{server.url}/v1", api_key="sk-test", max_retries=0)
+        llm = LLMScheduler()
+
+        def call():
+            return llm.call(
+                "gpt-4o-mini", 100, PRIORITY_BACKGROUND,
+                lambda: client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES),
+            )
+
+        try:
+            results = await asyncio.gather(*(call() for _ in range(count)), return_exceptions=True)
+        finally:
+            await client.close()
+        return results, llm.lane("gpt-4o-mini")
+
+    return asyncio.run(main())
+
+
+def test_429s_are_retried_until_every_call_succeeds(fake_server, monkeypatch):
+    monkeypatch.setattr(scheduler, "LLM_MAX_RETRIES", 10)
+    results, lane = run_calls(fake_server, 12)
+
+    assert not [r for r in results if isinstance(r, BaseException)]
+    assert fake_openai.fake_stats["throttled"] > 0
+    assert fake_openai.fake_stats["completed"] == 12
+    # The 429s cut the concurrency limit
+    assert lane.throttled > 0
+    assert lane.limit < scheduler.LLM_CONCURRENCY_INITIAL
+
+
+def test_429s_past_the_retries_raise_model_busy(fake_server, monkeypatch):
+    monkeypatch.setattr(scheduler, "LLM_MAX_RETRIES", 0)
+    results, _ = run_calls(fake_server, 12)
+
+    assert any(isinstance(r, ModelBusyError) for r in results)
+    assert not [r for r in results if isinstance(r, BaseException) and not isinstance(r, ModelBusyError)]
+
+
+def test_aimd_halves_once_per_burst_and_grows_additively():
+    async def main():
+        lane = ModelLane("gpt-4o-mini", rpm=0, tpm=0)
+        lane.limit = 16.0
+        grants = [await lane.acquire(10, PRIORITY_BACKGROUND) for _ in range(4)]
+        for grant in grants:
+            lane.release(grant, used_tokens=0, error=rate_limit_error())
+        # Four 429s from one overload halve the limit once
+        assert lane.limit == 8.0
+        assert lane.blocked_until > 0
+
+        lane.blocked_until = 0.0
+        grant = await lane.acquire(10, PRIORITY_BACKGROUND)
+        lane.release(grant, used_tokens=10)
+        assert lane.limit == pytest.approx(8.0 + 1 / 8.0)
+
+    asyncio.run(main())
+
+
+def test_interactive_waiters_are_admitted_first():
+    async def main():
+        lane = ModelLane("gpt-4o-mini", rpm=0, tpm=0)
+        lane.limit = 1.0
+        held = await lane.acquire(10, PRIORITY_BACKGROUND)
+
+        order = []
+
+        async def wait(name, priority):
+            grant = await lane.acquire(10, priority)
+            order.append(name)
+            lane.release(grant, used_tokens=10)
+
+        waiters = [
+            asyncio.create_task(wait("background-1", PRIORITY_BACKGROUND)),
+            asyncio.create_task(wait("background-2", PRIORITY_BACKGROUND)),
+            asyncio.create_task(wait("interactive", PRIORITY_INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        lane.release(held, used_tokens=10)
+        await asyncio.gather(*waiters)
+        return order
+
+    assert asyncio.run(main()) == ["interactive", "background-1", "background-2"]
@@ -0,0 +1,108 @@
+# test_local_clone.py
+import asyncio
+import os
+import subprocess
+
+import pytest
+
+from readme import local_clone
+from readme.github_service import extract_owner_repo
+
+
+def git(*args, cwd=None):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    """Bare repository served as file://{tmp}/remotes/acme/widgets.git"""
+    work = tmp_path / "work"
+    work.mkdir()
+    git("init", "-q", "-b", "main", cwd=work)
+    (work / "README.md").write_text("# Widgets\n")
+    (work / "src").mkdir()
+    (work / "src" / "app.py").write_text("print('hello')\n")
+    (work / "big.bin").write_bytes(b"x" * 64)
+    git("add", ".", cwd=work)
+    git("-c", "user.name=t", "-c", "user.email=t@example.com", "commit", "-q", "-m", "initial", cwd=work)
+
+    bare = tmp_path / "remotes" / "acme" / "widgets.git"
+    git("clone", "-q", "--bare", str(work), str(bare))
+    git("config", "uploadpack.allowFilter", "true", cwd=bare)
+
+    monkeypatch.setattr(local_clone, "CLONE_URL_TEMPLATE", f"file://{tmp_path}/remotes/{{owner}}/{{repo}}.git")
+    monkeypatch.setattr(local_clone, "CLONE_CACHE_DIR", str(tmp_path / "clones"))
+    monkeypatch.setattr(local_clone, "_locks", {})
+    return work
+
+
+def test_remote_head_sha(remote):
+    sha = asyncio.run(local_clone.remote_head_sha("acme", "widgets"))
+    assert sha == git("rev-parse", "HEAD", cwd=remote)
+
+
+def test_remote_head_sha_missing_repo(remote):
+    assert asyncio.run(local_clone.remote_head_sha("acme", "missing")) is None
+
+
+def test_clone_snapshot_reads_only_wanted_files(remote):
+    seen = []
+
+    def wanted(paths):
+        seen.extend(paths)
+        return ["README.md", "src/app.py", "not/there.txt"]
+
+    snapshot = asyncio.run(local_clone.clone_snapshot("acme", "widgets", "main", wanted))
+
+    assert sorted(seen) == ["README.md", "big.bin", "src/app.py"]
+    assert snapshot.tree_sha == git("rev-parse", "HEAD^{tree}", cwd=remote)
+    assert snapshot.contents == {"README.md": "# Widgets\n", "src/app.py": "print('hello')\n"}
+    assert snapshot.entries["README.md"].size == len("# Widgets\n")
+    # Not checked out, so its size is unknown
+    assert snapshot.entries["big.bin"].size == 0
+
+
+def test_clone_snapshot_fetches_new_commits(remote, tmp_path):
+    asyncio.run(local_clone.clone_snapshot("acme", "widgets", "main", lambda paths: []))
+
+    (remote / "README.md").write_text("# Widgets v2\n")
+    git("-c", "user.name=t", "-c", "user.email=t@example.com", "commit", "-q", "-am", "update", cwd=remote)
+    git("push", "-q", str(tmp_path / "remotes" / "acme" / "widgets.git"), "main", cwd=remote)
+
+    snapshot = asyncio.run(local_clone.clone_snapshot("acme", "widgets", "main", lambda paths: ["README.md"]))
+    assert snapshot.contents["README.md"] == "# Widgets v2\n"
+
+
+def test_prune_cache_keeps_most_recent(remote, monkeypatch):
+    monkeypatch.setattr(local_clone, "CLONE_CACHE_MAX_REPOS", 0)
+    asyncio.run(local_clone.clone_snapshot("acme", "widgets", "main", lambda paths: []))
+    # The copy just used is kept even over the limit
+    assert os.path.isdir(local_clone._workdir("acme", "widgets"))
+
+
+@pytest.mark.parametrize("url", [
+    "https://github.com/../..",
+    "https://github.com/x/..",
+    "https://github.com/./repo",
+    "https://github.com/acme/wid gets",
+])
+def test_traversal_urls_are_refused(url):
+    with pytest.raises(ValueError):
+        extract_owner_repo(url)
+
+
+def test_clone_snapshot_refuses_paths_outside_the_cache(remote, tmp_path):
+    keep = tmp_path / "clones" / "keep"
+    keep.mkdir(parents=True)
+    for owner, repo in [("..", ".."), ("x", ".."), ("acme", "../../work")]:
+        with pytest.raises(ValueError):
+            asyncio.run(local_clone.clone_snapshot(owner, repo, "main", lambda paths: []))
+    assert keep.is_dir()
+    assert (remote / "README.md").is_file()
+
+
+def test_remove_workdir_stays_inside_the_cache(remote, tmp_path):
+    for path in [local_clone.CLONE_CACHE_DIR, str(tmp_path), os.path.join(local_clone.CLONE_CACHE_DIR, "..", "work")]:
+        with pytest.raises(ValueError):
+            local_clone._remove_workdir(path)
+    assert (remote / "README.md").is_file()
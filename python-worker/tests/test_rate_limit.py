@@ -0,0 +1,126 @@
+# test_rate_limit.py
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from core.shared_state import LocalState
+from readme.rate_limit import GITHUB_SECONDARY_BACKOFF, GitHubRateLimiter, RateLimitTransport
+
+KEY = "anonymous"
+
+
+@pytest.fixture
+def limiter():
+    return GitHubRateLimiter(max_wait=1, store=LocalState())
+
+
+def quota_headers(remaining, limit=5000, reset_in=3600):
+    return {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(int(time.time() + reset_in)),
+    }
+
+
+def secondary_limit():
+    return httpx.Response(403, json={"message": "You have exceeded a secondary rate limit"})
+
+
+def client_for(limiter, handler):
+    return httpx.AsyncClient(transport=RateLimitTransport(httpx.MockTransport(handler), limiter=limiter), base_url="https://api.github.com")
+
+
+def test_low_quota_is_spread_until_the_reset(limiter):
+    async def main():
+        await limiter.record(KEY, httpx.Response(200, headers=quota_headers(5, limit=100, reset_in=10)))
+        assert await limiter.acquire(KEY)
+        return await limiter.quota(KEY)
+
+    quota = asyncio.run(main())
+    # 5 requests left until the reset: the next one waits a fifth of the window
+    now = time.time()
+    assert limiter.delay_for(quota, now) == pytest.approx((quota.reset_at - now) / 5, abs=0.05)
+    assert quota.in_flight == 1
+
+
+def test_plenty_of_quota_is_not_paced(limiter):
+    async def main():
+        await limiter.record(KEY, httpx.Response(200, headers=quota_headers(4000)))
+        assert await limiter.acquire(KEY)
+        return await limiter.quota(KEY)
+
+    assert limiter.delay_for(asyncio.run(main()), time.time()) == 0
+
+
+def test_secondary_limit_backs_off_exponentially(limiter):
+    async def main():
+        first = await limiter.record(KEY, secondary_limit())
+        second = await limiter.record(KEY, secondary_limit())
+        await limiter.record(KEY, httpx.Response(200))
+        return first, second, await limiter.quota(KEY)
+
+    first, second, quota = asyncio.run(main())
+    assert (first, second) == (GITHUB_SECONDARY_BACKOFF, GITHUB_SECONDARY_BACKOFF * 2)
+    # A normal response resets the backoff, but not the block already in place
+    assert quota.secondary_backoff == 0
+    assert quota.blocked_until > time.time() + GITHUB_SECONDARY_BACKOFF
+
+
+def test_rate_limited_get_is_retried(limiter):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0.05"})
+        return httpx.Response(200, json={"ok": True})
+
+    async def main():
+        async with client_for(limiter, handler) as client:
+            response = await client.get("/repos/o/r")
+        return response, await limiter.quota(KEY)
+
+    response, quota = asyncio.run(main())
+    assert response.status_code == 200
+    assert len(calls) == 2
+    assert quota.in_flight == 0
+
+
+def test_long_block_is_refused_locally(limiter):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return secondary_limit()
+
+    async def main():
+        async with client_for(limiter, handler) as client:
+            first = await client.get("/repos/o/r")
+            second = await client.get("/repos/o/r")
+        return first, second
+
+    first, second = asyncio.run(main())
+    # The backoff is beyond max_wait, so GitHub's 403 comes back without a retry
+    assert first.status_code == 403
+    # ...and the next request never reaches GitHub
+    assert second.status_code == 429
+    assert int(second.headers["Retry-After"]) > 1
+    assert len(calls) == 1
+
+
+def test_cancelled_wait_hands_its_slot_back():
+    limiter = GitHubRateLimiter(max_wait=30, store=LocalState())
+
+    async def main():
+        await limiter.record(KEY, httpx.Response(429, headers={"Retry-After": "10"}))
+        held = asyncio.create_task(limiter.acquire(KEY))
+        await asyncio.sleep(0.05)
+        assert (await limiter.quota(KEY)).in_flight == 1
+        held.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await held
+        return await limiter.quota(KEY)
+
+    assert asyncio.run(main()).in_flight == 0
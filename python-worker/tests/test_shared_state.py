@@ -0,0 +1,204 @@
+# test_shared_state.py
+import asyncio
+import socket
+import threading
+import time
+import uuid
+
+import pytest
+
+from benchmarks import fake_redis
+from core import single_flight
+from core.cache import MemoryCache, MeteredCache, TieredCache
+from core.redis_state import RedisState
+from core.shared_state import SQLiteState
+from core.single_flight import SingleFlight
+from jobs.queue import JobQueue
+from jobs.store import MemoryJobStore
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    """benchmarks/fake_redis.py on its own event loop thread"""
+    port = free_port()
+    ready = threading.Event()
+
+    async def serve():
+        server = await asyncio.start_server(fake_redis.serve(fake_redis.FakeRedis()), "127.0.0.1", port)
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=asyncio.run, args=(serve(),), daemon=True).start()
+    ready.wait(5)
+    return f"redis://127.0.0.1:{port}/0"
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def open_state(request, tmp_path):
+    """Opens stores on one backend; each call is a separate client, like another worker process"""
+    name = f"test_{uuid.uuid4().hex[:8]}"
+    if request.param == "sqlite":
+        return lambda ttl=None: SQLiteState(str(tmp_path / "shared.sqlite3"), default_ttl=ttl, table=name)
+    url = request.getfixturevalue("redis_url")
+    return lambda ttl=None: RedisState(url, namespace=name, default_ttl=ttl)
+
+
+def test_update_creates_changes_and_deletes(open_state):
+    state = open_state()
+    assert state.update("k", lambda current: (current or 0) + 1) == 1
+    assert state.update("k", lambda current: (current or 0) + 1) == 2
+    assert state.get("k") == 2
+    assert state.update("k", lambda current: None) is None
+    assert state.get("k") is None
+
+
+def test_async_methods_match_blocking_ones(open_state):
+    state = open_state()
+
+    async def main():
+        await state.aset("k", {"owner": "a"})
+        assert await state.aget("k") == {"owner": "a"}
+        assert await state.aupdate("k", lambda current: {**current, "n": 1}) == {"owner": "a", "n": 1}
+        await state.adelete("k")
+        assert await state.aget("k") is None
+
+    asyncio.run(main())
+    assert state.get("k") is None
+
+
+def test_tiered_cache_reads_the_shared_tier_asynchronously(open_state):
+    writer = MeteredCache("test", TieredCache(MemoryCache(), open_state()))
+    reader_memory = MemoryCache()
+    reader = MeteredCache("test", TieredCache(reader_memory, open_state()))
+
+    async def main():
+        await writer.aset("k", {"body": "x"}, size=10)
+        assert await reader.aget("k") == {"body": "x"}
+        assert await reader.aget("missing") is None
+
+    asyncio.run(main())
+    # Hits from another process are promoted to this one's memory tier
+    assert reader_memory.get("k") == {"body": "x"}
+
+def test_concurrent_updates_are_not_lost(open_state):
+    stores = [open_state(), open_state()]
+
+    def increment(state):
+        for _ in range(25):
+            state.update("counter", lambda current: (current or 0) + 1)
+
+    threads = [threading.Thread(target=increment, args=(stores[i % 2],)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    async def increment_async():
+        await asyncio.gather(*(stores[i % 2].aupdate("counter", lambda current: (current or 0) + 1) for i in range(20)))
+
+    asyncio.run(increment_async())
+    assert stores[0].get("counter") == 120
+
+
+def test_claim_is_exclusive_until_it_expires(open_state):
+    first, second = open_state(), open_state()
+    assert first.update("lease", lambda current: current or "a", ttl=0.2) == "a"
+    assert second.update("lease", lambda current: current or "b", ttl=0.2) == "a"
+    time.sleep(0.3)
+    assert first.get("lease") is None
+    assert second.update("lease", lambda current: current or "b", ttl=0.2) == "b"
+
+
+def test_unchanged_update_keeps_expiry(open_state):
+    state = open_state()
+    state.update("lease", lambda current: "a", ttl=0.2)
+    time.sleep(0.1)
+    # Another process looking at the lease must not extend it
+    assert state.update("lease", lambda current: current or "b", ttl=10) == "a"
+    time.sleep(0.15)
+    assert state.get("lease") is None
+
+
+def test_job_claims_are_held_renewed_and_released(open_state):
+    store = MemoryJobStore()
+    first, second = (JobQueue(store, claims=open_state(ttl=0.3)) for _ in range(2))
+
+    async def main():
+        assert await first._claim("job")
+        assert not await second._claim("job")
+        await asyncio.sleep(0.2)
+        # Renewing pushes the expiry out again
+        assert await first._claim("job")
+        await asyncio.sleep(0.2)
+        assert not await second._claim("job")
+        first._local.add("job")
+        await first.stop()
+        assert await second._claim("job")
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def flights(open_state, monkeypatch):
+    """Two SingleFlight instances sharing a store, as in two worker processes"""
+    monkeypatch.setattr(single_flight, "shared_state_enabled", lambda: True)
+    monkeypatch.setattr(single_flight, "_flight_state", open_state(ttl=single_flight.SINGLE_FLIGHT_LEASE))
+    return [SingleFlight("test", dump=dict, load=dict) for _ in range(2)]
+
+
+def test_single_flight_hands_result_to_other_process(flights):
+    calls = []
+
+    async def work(name):
+        calls.append(name)
+        await asyncio.sleep(0.2)
+        return {"by": name}
+
+    async def main():
+        first = asyncio.create_task(flights[0].do("key", lambda: work("first")))
+        await asyncio.sleep(0.05)
+        return await asyncio.gather(first, flights[1].do("key", lambda: work("second")))
+
+    (first, shared_first), (second, shared_second) = asyncio.run(main())
+    assert calls == ["first"]
+    assert first == second == {"by": "first"}
+    assert (shared_first, shared_second) == (False, True)
+    assert flights[1].coalesced == 1
+
+
+def test_single_flight_runs_it_when_the_holder_fails(flights):
+    async def fail():
+        await asyncio.sleep(0.1)
+        raise RuntimeError("boom")
+
+    async def work():
+        return {"by": "second"}
+
+    async def main():
+        first = asyncio.create_task(flights[0].do("key", fail))
+        await asyncio.sleep(0.02)
+        second = await flights[1].do("key", work)
+        with pytest.raises(RuntimeError):
+            await first
+        return second
+
+    assert asyncio.run(main()) == ({"by": "second"}, False)
+
+
+def test_single_flight_takes_over_an_expired_lease(flights, monkeypatch):
+    # A process that claimed the key and died without releasing it
+    single_flight.get_flight_state().update("test:key", lambda current: "dead", ttl=0.2)
+
+    async def work():
+        return {"by": "survivor"}
+
+    started = time.monotonic()
+    assert asyncio.run(flights[0].do("key", work)) == ({"by": "survivor"}, False)
+    assert time.monotonic() - started >= 0.15
@@ -0,0 +1,36 @@
+# test_tiptap.py
+from readme.tiptap import normalize_doc, normalize_nodes
+
+
+def heading(text: str) -> dict:
+    return {"type": "heading", "attrs": {"level": 2}, "content": [{"type": "text", "text": text}]}
+
+
+def paragraph(text: str) -> dict:
+    return {"type": "paragraph", "content": [{"type": "text", "text": text}]}
+
+
+def test_unrepairable_last_node_marks_only_its_section():
+    doc, report = normalize_doc({"type": "doc", "content": [heading("Install"), paragraph("pip install"), heading("Usage"), 42]})
+
+    assert [node["type"] for node in doc["content"]] == ["heading", "paragraph", "heading"]
+    assert [(s.title, s.broken) for s in report.sections] == [("Install", False), ("Usage", True)]
+
+
+def test_unrepairable_preamble_is_reported_as_introduction():
+    doc, report = normalize_doc({"type": "doc", "content": [42, heading("Usage"), paragraph("run it")]})
+
+    assert report.sections[0].title == "Introduction" and report.sections[0].broken
+    assert not report.sections[1].broken
+
+
+def test_unrepairable_nodes_in_the_middle_mark_one_section():
+    doc, report = normalize_doc({"type": "doc", "content": [heading("Install"), 42, 43, paragraph("pip install"), heading("Usage"), paragraph("run it")]})
+
+    assert [node["type"] for node in doc["content"]] == ["heading", "paragraph", "heading", "paragraph"]
+    assert [(s.title, s.broken) for s in report.sections] == [("Install", True), ("Usage", False)]
+
+
+def test_streamed_nodes_leave_no_markers_behind():
+    nodes = normalize_nodes([heading("Usage"), 42])
+    assert [node["type"] for node in nodes] == ["heading"]
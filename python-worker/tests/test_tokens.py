@@ -0,0 +1,26 @@
+# test_tokens.py
+from llm.tokens import OUTPUT_ESTIMATES, CreditBudget
+
+MESSAGES = [{"role": "user", "content": "x" * 400}]
+
+
+def test_shared_budget_splits_remaining_between_slots():
+    budget = CreditBudget(40000, shared=True, slots=4)
+    reservations = [budget.reserve("readme", MESSAGES) for _ in range(4)]
+
+    assert all(r.max_tokens > OUTPUT_ESTIMATES["readme"] for r in reservations)
+    assert budget.remaining >= 0
+    for reservation in reservations:
+        budget.settle(reservation, 100)
+    assert budget.remaining == 40000 - 400
+    assert budget.open == 0
+
+
+def test_shared_budget_capped_by_model_output():
+    budget = CreditBudget(10_000_000, shared=True, slots=4)
+    assert budget.reserve("readme", MESSAGES).max_tokens == 16384
+
+
+def test_exact_reservation_gets_estimate():
+    budget = CreditBudget(40000, shared=True, slots=4)
+    assert budget.reserve("analysis", MESSAGES, exact=True).max_tokens == OUTPUT_ESTIMATES["analysis"]